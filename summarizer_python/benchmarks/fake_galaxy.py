@@ -0,0 +1,341 @@
+"""
+In process stand-in for the parts of a bioblend GalaxyInstance the galaxy client uses:
+histories, tools (show_tool, upload_file, run_tool), datasets, jobs and data libraries.
+
+pass it as galaxy_instance to GalaxyApi, no server is needed:
+    api = GalaxyApi(url=None, api_key=None, galaxy_instance=FakeGalaxy(latency=0.05))
+
+every request sleeps for the configured latency (outside the lock, so concurrent requests overlap),
+can fail with a bioblend ConnectionError and is counted per endpoint in requests.
+jobs go from queued to running to ok (or error) on the real clock.
+"""
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bioblend import ConnectionError
+
+from benchmarks.synthetic_data import RESULT_FORMATS, gene_names
+
+
+class FakeGalaxy:
+    """
+    :param latency: float, seconds every request takes
+    :param latency_jitter: float, seconds added at random to the latency, up to this value
+    :param job_duration: tuple: float min seconds, float max seconds a job runs
+    :param job_failure_rate: float, chance a job ends in the error state
+    :param request_failure_rate: float, chance a request raises a ConnectionError
+    :param seed: int
+    """
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, job_duration=(1.0, 5.0), job_failure_rate=0.0,
+                 request_failure_rate=0.0, seed=0) -> None:
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.job_duration = job_duration
+        self.job_failure_rate = job_failure_rate
+        self.request_failure_rate = request_failure_rate
+
+        self.requests = Counter()  # endpoint: number of requests
+        self.failed_requests = Counter()
+        self.histories_data = {}
+        self.datasets_data = {}
+        self.jobs_data = {}
+        self.libraries_data = {}
+        self.libraries_data_files = {}  # library dataset id: dict
+        self.collections_data = {}  # collection id: dict with elements: list: (identifier, dataset or collection)
+        self.run_tool_times = {}  # sample_name: time the tool was started
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+        self.histories = _Histories(self)
+        self.tools = _Tools(self)
+        self.datasets = _Datasets(self)
+        self.jobs = _Jobs(self)
+        self.libraries = _Libraries(self)
+
+    def request(self, endpoint):
+        """
+        Counts the request, waits the latency and fails some requests
+        """
+        with self._lock:
+            self.requests[endpoint] += 1
+            delay = self.latency + self._random.uniform(0, self.latency_jitter)
+            fail = self._random.random() < self.request_failure_rate
+            if fail:
+                self.failed_requests[endpoint] += 1
+
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"injected failure of {endpoint}", status_code=503)
+
+    def new_id(self):
+        with self._lock:
+            return f"{next(self._ids):016x}"
+
+    def add_dataset(self, history_id, name, state='ok'):
+        dataset = {'id': self.new_id(), 'name': name, 'history_id': history_id, 'state': state,
+                   'file_ext': 'tabular', 'deleted': False}
+        with self._lock:
+            self.datasets_data[dataset['id']] = dataset
+        return dataset
+
+    def add_job(self, tool_id, history_id, outputs, inputs=None):
+        """
+        :param outputs: dict: output name: dataset
+        :param inputs: dict: input name: dataset id
+        """
+        with self._lock:
+            duration = self._random.uniform(*self.job_duration)
+            failed = self._random.random() < self.job_failure_rate
+        now = time.time()
+        job = {'id': self.new_id(), 'tool_id': tool_id, 'history_id': history_id, 'start': now,
+               'end': now + duration, 'final_state': 'error' if failed else 'ok',
+               'outputs': {name: {'id': dataset['id'], 'src': 'hda'} for name, dataset in outputs.items()},
+               'inputs': {name: {'id': dataset_id, 'src': 'hda'} for name, dataset_id in (inputs or {}).items()}}
+        with self._lock:
+            self.jobs_data[job['id']] = job
+        return job
+
+    def add_collection(self, history_id, name, collection_type, elements):
+        collection = {'id': self.new_id(), 'name': name, 'history_id': history_id,
+                      'collection_type': collection_type, 'elements': elements}
+        with self._lock:
+            self.collections_data[collection['id']] = collection
+        return {key: value for key, value in collection.items() if key != 'elements'}
+
+    def job_state(self, job):
+        now = time.time()
+        if now >= job['end']:
+            return job['final_state']
+        if now >= job['start'] + (job['end'] - job['start']) / 10:
+            return 'running'
+        return 'queued'
+
+    def job_summary(self, job):
+        state = self.job_state(job)
+        update = job['end'] if state in ('ok', 'error') else job['start']
+        return {'id': job['id'], 'state': state, 'tool_id': job['tool_id'], 'history_id': job['history_id'],
+                'update_time': datetime.fromtimestamp(update, timezone.utc).isoformat()}
+
+
+class _Histories:
+
+    def __init__(self, galaxy) -> None:
+        self._galaxy = galaxy
+
+    def create_history(self, name=None):
+        self._galaxy.request('histories.create_history')
+        history = {'id': self._galaxy.new_id(), 'name': name, 'deleted': False}
+        self._galaxy.histories_data[history['id']] = history
+        return dict(history)
+
+    def show_history(self, history_id, **kwargs):
+        self._galaxy.request('histories.show_history')
+        return dict(self._galaxy.histories_data[history_id])
+
+    def delete_history(self, history_id, purge=False):
+        self._galaxy.request('histories.delete_history')
+        self._galaxy.histories_data[history_id]['deleted'] = True
+        return dict(self._galaxy.histories_data[history_id])
+
+    def create_dataset_collection(self, history_id, collection_description, copy_elements=True):
+        self._galaxy.request('histories.create_dataset_collection')
+        description = collection_description
+        if not isinstance(description, dict):
+            description = description.to_dict()
+        return self._galaxy.add_collection(history_id, description['name'], description['collection_type'],
+                                           self._elements(description['element_identifiers']))
+
+    def show_dataset_collection(self, history_id, dataset_collection_id):
+        self._galaxy.request('histories.show_dataset_collection')
+        collection = self._galaxy.collections_data[dataset_collection_id]
+        return {**{key: value for key, value in collection.items() if key != 'elements'},
+                'elements': self._show_elements(collection['elements'])}
+
+    def _show_elements(self, elements):
+        return [{'element_identifier': identifier, 'element_type': 'dataset_collection',
+                 'object': {'elements': self._show_elements(value)}}
+                if isinstance(value, list) else
+                {'element_identifier': identifier, 'element_type': 'hda', 'object': {'id': value}}
+                for identifier, value in elements]
+
+    def _elements(self, element_identifiers):
+        """
+        :return: list: tuple: identifier, dataset id or list of sub elements
+        """
+        elements = []
+        for element in element_identifiers:
+            if element['src'] == 'new_collection':
+                elements.append((element['name'], self._elements(element['element_identifiers'])))
+            else:
+                elements.append((element['name'], element['id']))
+        return elements
+
+    def upload_dataset_from_library(self, history_id, lib_dataset_id):
+        self._galaxy.request('histories.upload_dataset_from_library')
+        name = self._galaxy.libraries_data_files[lib_dataset_id]['name']
+        return self._galaxy.add_dataset(history_id, name)
+
+
+class _Tools:
+
+    def __init__(self, galaxy) -> None:
+        self._galaxy = galaxy
+
+    def show_tool(self, tool_id, **kwargs):
+        self._galaxy.request('tools.show_tool')
+        return {'id': tool_id, 'name': 'fake pipeline', 'version': '1.0'}
+
+    def upload_file(self, path, history_id, **kwargs):
+        self._galaxy.request('tools.upload_file')
+        dataset = self._galaxy.add_dataset(history_id, Path(path).name)
+        job = self._galaxy.add_job('upload1', history_id, {'output0': dataset})
+        return {'outputs': [dataset], 'jobs': [{'id': job['id']}]}
+
+    def run_tool(self, history_id, tool_id, tool_inputs, **kwargs):
+        """
+        Runs __UNZIP_COLLECTION__ mapped over a list:paired, any other tool runs as the stec pipeline,
+        once or mapped over the elements of the (linked) forward read list
+        """
+        self._galaxy.request('tools.run_tool')
+        if tool_id == '__UNZIP_COLLECTION__':
+            return self._unzip(history_id, tool_inputs['input']['values'][0]['id'])
+
+        sample_name = tool_inputs.get('section_input', {}).get('sample_name')
+        databases = tool_inputs.get('section_amr', {}).get('dbs_amr', ['resfinder'])
+        read_type = tool_inputs.get('section_input', {}).get('read_type', {})
+        reads = {name: read_type.get(name, {}).get('values', [{}])[0].get('id') for name in ('fastq_1', 'fastq_2')}
+
+        samples = {sample_name: reads}
+        if read_type.get('fastq_1', {}).get('batch'):
+            read_lists = {name: self._galaxy.collections_data[read_list_id]['elements']
+                          for name, read_list_id in reads.items()}
+            samples = {identifier: {name: read_list[position][1] for name, read_list in read_lists.items()}
+                       for position, (identifier, _) in enumerate(read_lists['fastq_1'])}
+
+        outputs = []
+        jobs = []
+        for sample_name, sample_reads in samples.items():
+            job_outputs = {f"{database}_report": self._galaxy.add_dataset(history_id, f"{sample_name} {database} report",
+                                                                          state='queued')
+                           for database in databases}
+            job = self._galaxy.add_job(tool_id, history_id, job_outputs, inputs=sample_reads)
+            self._galaxy.run_tool_times[sample_name] = job['start']
+            outputs.extend(job_outputs.values())
+            jobs.append({'id': job['id']})
+
+        return {'outputs': outputs, 'jobs': jobs}
+
+    def _unzip(self, history_id, collection_id):
+        collection = self._galaxy.collections_data[collection_id]
+        forward = [(identifier, pair[0][1]) for identifier, pair in collection['elements']]
+        reverse = [(identifier, pair[1][1]) for identifier, pair in collection['elements']]
+
+        jobs = [{'id': self._galaxy.add_job('__UNZIP_COLLECTION__', history_id, {})['id']}
+                for _ in collection['elements']]
+        implicit_collections = [{**self._galaxy.add_collection(history_id, f"{collection['name']} {name}", 'list',
+                                                               elements),
+                                 'output_name': name}
+                                for name, elements in (('forward', forward), ('reverse', reverse))]
+
+        return {'outputs': [], 'jobs': jobs, 'implicit_collections': implicit_collections}
+
+
+class _Datasets:
+
+    def __init__(self, galaxy) -> None:
+        self._galaxy = galaxy
+
+    def get_datasets(self, history_id=None, limit=500, offset=0, **kwargs):
+        self._galaxy.request('datasets.get_datasets')
+        datasets = [dict(dataset) for dataset in list(self._galaxy.datasets_data.values())
+                    if history_id is None or dataset['history_id'] == history_id]
+        return datasets[offset:offset + limit]
+
+    def show_dataset(self, dataset_id, **kwargs):
+        self._galaxy.request('datasets.show_dataset')
+        return dict(self._galaxy.datasets_data[dataset_id])
+
+    def download_dataset(self, dataset_id, file_path=None, use_default_filename=True, **kwargs):
+        """
+        Writes a resfinder like table with a few genes, chosen by the dataset id
+        """
+        self._galaxy.request('datasets.download_dataset')
+        delimiter, header, template = RESULT_FORMATS["WF1_resfinder"]
+        rng = random.Random(dataset_id)
+        rows = [[field.format(gene=gene, identity=f"{rng.uniform(75, 100):.2f}") for field in template]
+                for gene in rng.sample(gene_names(50), 5)]
+
+        content = "".join(delimiter.join(row) + "\n" for row in [header, *rows])
+        if file_path is None:
+            return content.encode()
+
+        with open(file_path, 'w') as fp:
+            fp.write(content)
+        return file_path
+
+
+class _Jobs:
+
+    def __init__(self, galaxy) -> None:
+        self._galaxy = galaxy
+
+    def show_job(self, job_id, full_details=False):
+        self._galaxy.request('jobs.show_job')
+        job = self._galaxy.jobs_data[job_id]
+        return {**self._galaxy.job_summary(job), 'inputs': dict(job['inputs']), 'outputs': dict(job['outputs'])}
+
+    def get_jobs(self, state=None, history_id=None, date_range_min=None, limit=500, offset=0, **kwargs):
+        self._galaxy.request('jobs.get_jobs')
+        jobs = [self._galaxy.job_summary(job) for job in list(self._galaxy.jobs_data.values())]
+        jobs = [job for job in jobs
+                if (history_id is None or job['history_id'] == history_id)
+                and (state is None or job['state'] == state)
+                and (date_range_min is None or job['update_time'][:10] >= date_range_min)]
+        jobs.sort(key=lambda job: job['update_time'], reverse=True)
+        return jobs[offset:offset + limit]
+
+
+class _Libraries:
+
+    def __init__(self, galaxy) -> None:
+        self._galaxy = galaxy
+
+    def get_libraries(self, library_id=None, name=None, **kwargs):
+        self._galaxy.request('libraries.get_libraries')
+        return [dict(library) for library in self._galaxy.libraries_data.values()
+                if (name is None or library['name'] == name) and (library_id is None or library['id'] == library_id)]
+
+    def create_library(self, name, **kwargs):
+        self._galaxy.request('libraries.create_library')
+        library = {'id': self._galaxy.new_id(), 'name': name}
+        self._galaxy.libraries_data[library['id']] = library
+        return dict(library)
+
+    def show_library(self, library_id, contents=False):
+        self._galaxy.request('libraries.show_library')
+        if not contents:
+            return dict(self._galaxy.libraries_data[library_id])
+        return [{'id': dataset_id, 'name': f"/{item['name']}", 'type': 'file'}
+                for dataset_id, item in list(self._galaxy.libraries_data_files.items())
+                if item['library_id'] == library_id]
+
+    def upload_file_from_local_path(self, library_id, file_local_path, **kwargs):
+        self._galaxy.request('libraries.upload_file_from_local_path')
+        item = {'id': self._galaxy.new_id(), 'library_id': library_id, 'name': Path(file_local_path).name}
+        self._galaxy.libraries_data_files[item['id']] = item
+        return [dict(item)]
+
+    def update_library_dataset(self, dataset_id, name=None, **kwargs):
+        self._galaxy.request('libraries.update_library_dataset')
+        if name is not None:
+            self._galaxy.libraries_data_files[dataset_id]['name'] = name
+        return dict(self._galaxy.libraries_data_files[dataset_id])
@@ -0,0 +1,134 @@
+"""
+Load test of the galaxy client and orchestrator against the in process FakeGalaxy.
+
+run from the summarizer_python directory:
+    python -m benchmarks.galaxy_load_test --samples 10 100 1000 --latency 0.05 --job-duration 1 5
+
+every scale runs the orchestrator end to end (submit, monitor, download) on a fresh fake galaxy and reports
+the submissions per second, the latency from submission to downloaded results per sample and the number of
+requests the server got. with --request-failure-rate the run is repeated on the same manifest until all
+samples are submitted, as a rerun after a crash would
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_galaxy import FakeGalaxy
+from lib.galaxy_api_client import GalaxyApi
+from lib.orchestrator import Orchestrator
+
+
+def _write_reads(directory, n_samples):
+    """
+    Writes a tiny forward and reverse read file per sample
+
+    :return: dict: sample_name: list: Path
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    samples = {}
+    for sample_number in range(n_samples):
+        sample_name = f"SRX{1000000 + sample_number}_SRR{2000000 + sample_number}"
+        samples[sample_name] = []
+        for read in (1, 2):
+            read_file = directory / f"{sample_name}_R{read}.fastq"
+            read_file.write_text(f"@{sample_name}/{read}\nACGT\n+\nIIII\n")
+            samples[sample_name].append(read_file)
+
+    return samples
+
+
+def _percentile(values, percentile):
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percentile - 1]
+
+
+def run_scale(work_dir, n_samples, args):
+    """
+    Runs the orchestrator on n_samples against a fresh fake galaxy
+
+    :return: dict, measurements
+    """
+    galaxy = FakeGalaxy(latency=args.latency, latency_jitter=args.latency_jitter,
+                        job_duration=tuple(args.job_duration), job_failure_rate=args.job_failure_rate,
+                        request_failure_rate=args.request_failure_rate, seed=n_samples)
+    api = GalaxyApi(url=None, api_key=None, galaxy_instance=galaxy,
+                    max_requests_per_second=args.requests_per_second,
+                    upload_manifest=work_dir / 'uploads.json' if args.libraries else None)
+
+    samples = _write_reads(work_dir / 'reads', n_samples)
+    done_times = {}
+
+    def sample_done(sample_name, state):
+        done_times[sample_name] = (time.time(), state)
+
+    start = time.time()
+    attempts = 0
+    states = {}
+    while attempts < args.max_attempts and (len(states) < n_samples or 'downloading' in states.values()):
+        attempts += 1
+        orchestrator = Orchestrator(galaxy_api=api, manifest_file=work_dir / 'run.sqlite',
+                                    data_dir=work_dir / 'data', workflow='WF1',
+                                    max_workers=args.workers, download_workers=args.download_workers)
+        states = orchestrator.run(samples=samples, min_interval=args.min_interval, max_interval=args.max_interval,
+                                  on_sample_done=sample_done,
+                                  cohort_name=f"cohort_{attempts}" if args.cohort else None)
+        orchestrator.close()
+    api.close()
+    wall = time.time() - start
+
+    submit_times = sorted(galaxy.run_tool_times.values())
+    submit_seconds = submit_times[-1] - start if submit_times else float('nan')
+    latencies = sorted(done_time - galaxy.run_tool_times[sample_name]
+                       for sample_name, (done_time, state) in done_times.items()
+                       if state == 'done' and sample_name in galaxy.run_tool_times)
+
+    return {'samples': n_samples,
+            'attempts': attempts,
+            'done': sum(state == 'done' for state in states.values()),
+            'failed': sum(state == 'failed' for state in states.values()),
+            'wall_seconds': round(wall, 3),
+            'submissions_per_second': round(len(submit_times) / submit_seconds, 2) if submit_times else 0,
+            'latency_p50': round(_percentile(latencies, 50), 3),
+            'latency_p95': round(_percentile(latencies, 95), 3),
+            'latency_max': round(latencies[-1], 3) if latencies else float('nan'),
+            'requests': sum(galaxy.requests.values()),
+            'failed_requests': sum(galaxy.failed_requests.values()),
+            'job_polls': galaxy.requests['jobs.get_jobs']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load tests the galaxy client against a fake galaxy")
+    parser.add_argument('--samples', type=int, nargs='+', default=[10, 100, 1000], help="number of samples")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds per request")
+    parser.add_argument('--latency-jitter', type=float, default=0.01, help="random extra seconds per request")
+    parser.add_argument('--job-duration', type=float, nargs=2, default=[1.0, 5.0], metavar=('MIN', 'MAX'),
+                        help="seconds a job runs")
+    parser.add_argument('--job-failure-rate', type=float, default=0.0, help="chance a job ends in error")
+    parser.add_argument('--request-failure-rate', type=float, default=0.0, help="chance a request fails")
+    parser.add_argument('--workers', type=int, default=8, help="samples submitted at the same time")
+    parser.add_argument('--download-workers', type=int, default=4, help="results downloaded at the same time")
+    parser.add_argument('--requests-per-second', type=float, default=None, help="client rate limit")
+    parser.add_argument('--min-interval', type=float, default=0.5, help="seconds between job polls")
+    parser.add_argument('--max-interval', type=float, default=5.0, help="longest wait between job polls")
+    parser.add_argument('--libraries', action='store_true', help="uploads the reads through a data library")
+    parser.add_argument('--cohort', action='store_true', help="submits the samples as one list:paired collection")
+    parser.add_argument('--max-attempts', type=int, default=5, help="runs on the same manifest at most")
+    args = parser.parse_args()
+
+    columns = ['samples', 'attempts', 'done', 'failed', 'wall_seconds', 'submissions_per_second',
+               'latency_p50', 'latency_p95', 'latency_max', 'requests', 'failed_requests', 'job_polls']
+    print(" ".join(f"{column:>12.12}" for column in columns))
+
+    for n_samples in args.samples:
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = run_scale(Path(work_dir), n_samples, args)
+        print(" ".join(f"{result[column]:>12}" for column in columns))
+
+
+if __name__ == '__main__':
+    main()
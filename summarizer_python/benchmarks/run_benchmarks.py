@@ -0,0 +1,146 @@
+"""
+Times the stages of the summarizer on synthetic data sets.
+
+run from the summarizer_python directory:
+    python -m benchmarks.run_benchmarks --scales 100 1000 10000
+
+every timing is appended as one json line to the results file, together with the git commit,
+so runs of different commits can be compared with --compare
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.synthetic_data import generate_dataset
+from lib.clustering import cluster_order
+from lib.exporters import export_views
+from lib.parallel_parser import parse_files
+from lib.sample_organiser import SampleOrganiser
+
+DEFAULT_RESULTS = Path(__file__).parent / 'results.jsonl'
+
+
+def _git_commit():
+    """
+    :return: str, current commit hash, None outside a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(function):
+    """
+    :param function: callable without arguments
+    :return: tuple: seconds, return value
+    """
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def run_scale(work_dir, n_samples, n_genes, hit_density, workers, export_formats):
+    """
+    Generates a data set and times every stage on it
+
+    :return: dict: stage: seconds
+    """
+    data_dir = work_dir / f'data_{n_samples}'
+    output_dir = work_dir / f'output_{n_samples}'
+
+    if not data_dir.exists():  # data sets are deterministic, reused between runs in the same work dir
+        generate_dataset(data_dir, n_samples=n_samples, n_genes=n_genes, hit_density=hit_density)
+
+    timings = {}
+    timings['index'], organiser = _timed(lambda: SampleOrganiser(data_dir=data_dir, output_dir=output_dir,
+                                                                 disk_cache=False))
+    files = list(organiser.samples)
+    timings['parse'], parsed = _timed(lambda: parse_files(files, quality_passed=organiser._quality_passed,
+                                                          quality_failed=organiser._quality_failed,
+                                                          workers=workers))
+    for file, genes in zip(files, parsed):  # every file is parsed once, the matrix is build from these hits
+        organiser._hit_cache.put(file, genes)
+    timings['matrix'], df = _timed(lambda: organiser.build_comparison(binary=False, cluster=False, typing=False,
+                                                                      remove_front_parahentis=False))
+    timings['cluster'], _ = _timed(lambda: cluster_order(df.values))
+    timings['concordance'], _ = _timed(lambda: organiser.build_concordance(remove_front_parahentis=False))
+
+    for export_format in export_formats:
+        timings[f'export_{export_format}'], _ = _timed(
+            lambda: export_views({'all': df}, output_dir=output_dir, name='comparison', fmt=export_format))
+
+    return timings
+
+
+def compare(results_file, commit):
+    """
+    Prints the timings of the commit relative to the latest other commit
+    """
+    rows = [json.loads(line) for line in open(results_file)]
+    other_commits = [row['commit'] for row in rows if row['commit'] != commit]
+    if not other_commits:
+        print("no other commit to compare with")
+        return
+
+    previous = other_commits[-1]
+    latest = {}
+    for row in rows:
+        if row['commit'] in (commit, previous):
+            latest[(row['commit'], row['samples'], row['stage'])] = row['seconds']
+
+    print(f"{'samples':>8} {'stage':<20} {previous:>10} {commit:>10} {'change':>8}")
+    for (row_commit, samples, stage), seconds in sorted(latest.items(), key=lambda item: item[0][1:]):
+        if row_commit != commit or (previous, samples, stage) not in latest:
+            continue
+        before = latest[(previous, samples, stage)]
+        print(f"{samples:>8} {stage:<20} {before:>10.3f} {seconds:>10.3f} {seconds / before - 1:>+8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks the summarizer stages on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="number of samples of the data sets")
+    parser.add_argument('--genes', type=int, default=300, help="number of distinct genes")
+    parser.add_argument('--density', type=float, default=0.02, help="chance a gene is found in a file")
+    parser.add_argument('--workers', type=int, default=None, help="parse processes, default all cores")
+    parser.add_argument('--export-formats', nargs='+', default=['csv.gz'], help="formats the export is timed for")
+    parser.add_argument('--work-dir', type=Path, default=None,
+                        help="directory for the data sets, reused between runs, default a temporary directory")
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS, help="json lines file results are added to")
+    parser.add_argument('--compare', action='store_true', help="compares with the previous commit afterwards")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        work_dir = args.work_dir or Path(temporary_dir)
+
+        for n_samples in args.scales:
+            timings = run_scale(work_dir, n_samples=n_samples, n_genes=args.genes, hit_density=args.density,
+                                workers=args.workers, export_formats=args.export_formats)
+
+            with open(args.results, 'a') as fp:
+                for stage, seconds in timings.items():
+                    print(f"{n_samples:>8} {stage:<20} {seconds:>10.3f}s")
+                    fp.write(json.dumps({'commit': commit,
+                                         'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                                         'python': platform.python_version(),
+                                         'samples': n_samples,
+                                         'genes': args.genes,
+                                         'density': args.density,
+                                         'stage': stage,
+                                         'seconds': round(seconds, 4)}) + "\n")
+
+    if args.compare:
+        compare(args.results, commit)
+
+
+if __name__ == '__main__':
+    main()
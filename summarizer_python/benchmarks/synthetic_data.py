@@ -0,0 +1,94 @@
+import random
+from pathlib import Path
+
+# workflow type of the file name: (delimiter, header, row template)
+# rows are filled in with {gene}, {identity} and {genotype}, {status} for the genotype summary.
+# every format of lib.result_parser is covered, except the quoted "Locus header
+RESULT_FORMATS = {
+    "WF1_resfinder": ("\t", ["#FILE", "Locus", "% Identity", "% Coverage", "Database"],
+                      ["sample.fasta", "{gene}", "{identity}", "100.00", "resfinder"]),
+    "WF1_card": ("\t", ["Locus", "ID", "Start", "End"],
+                 ["{gene}", "ARO:3000000", "1", "861"]),
+    "WF2": (",", ["Locus", "Identity", "Coverage"],
+            ["{gene}", "{identity}", "100"]),
+    "WF3_ncbi": ("\t", ["Protein identifier", "Contig id", "Gene symbol", "Sequence name", "Scope",
+                        "% Coverage of reference sequence", "% Identity to reference sequence", "Accession"],
+                 ["NA", "contig_1", "{gene}", "beta-lactamase", "core", "100.00", "{identity}", "WP_000000000.1"]),
+    "WF4_resfinder": ("\t", ["Resistance gene", "Allele", "% Identity", "Alignment Length/Gene Length",
+                             "Position in reference", "Contig", "Accession no."],
+                      ["{gene}", "{gene}", "{identity}", "861/861", "1..861", "contig_1", "AY458016"]),
+    "WF5": ("\t", ["Sample", "Genotype", "Quality Module"],
+            ["sample", "{genotype}", "{status}"]),
+    "WF6_card": ("\t", ["ORF_ID", "Contig", "Start", "Stop", "Best_Hit_ARO", "Best_Identities",
+                        "ARO", "Model_type", "Drug Class"],
+                 ["contig_1_1", "contig_1", "1", "861", "{gene}", "{identity}", "3000000",
+                  "protein homolog model", "cephalosporin"]),
+    "WF7": ("\t", ["Gene", "%Identity", "%Coverage"],
+            ["{gene}", "{identity}", "100.00"]),
+}
+
+
+def gene_names(n_genes):
+    """
+    Generates gene names, part with a (Bla) style prefix as in ARG-ANNOT
+
+    :param n_genes: int
+    :return: list: str
+    """
+    families = ["blaTEM", "blaCTX-M", "blaOXA", "blaSHV", "blaKPC", "aac(6')-Ib", "tet(A)", "sul", "dfrA", "mcr"]
+    genes = []
+    for number in range(n_genes):
+        gene = f"{families[number % len(families)]}-{number // len(families) + 1}"
+        if number % 7 == 0:
+            gene = f"(Bla){gene}"
+        genes.append(gene)
+
+    return genes
+
+
+def generate_dataset(directory, n_samples, n_genes=300, hit_density=0.02, missing_rate=0.05, seed=0):
+    """
+    Writes a deterministic data set in the SRXxxx_SRRyyy_<workflow>_<subtype>.tsv layout,
+    every sample gets a file of every format in RESULT_FORMATS
+
+    :param directory: Path, created when missing
+    :param n_samples: int, number of samples
+    :param n_genes: int, number of distinct genes
+    :param hit_density: float, chance a gene is found in a file
+    :param missing_rate: float, chance a sample misses a workflow file
+    :param seed: int, same seed gives the same data set
+    :return: list: Path, written files
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(seed)
+    genes = gene_names(n_genes)
+    mean_hits = max(1, round(n_genes * hit_density))
+
+    written = []
+    for sample_number in range(n_samples):
+        sample_name = f"SRX{1000000 + sample_number}_SRR{2000000 + sample_number}"
+        sample_genes = rng.sample(genes, min(n_genes, max(1, round(rng.gauss(mean_hits, mean_hits ** 0.5)))))
+
+        for workflow, (delimiter, header, template) in RESULT_FORMATS.items():
+            if rng.random() < missing_rate:
+                continue
+
+            # workflows mostly agree, a few genes are missed per workflow
+            found = [gene for gene in sample_genes if rng.random() > 0.1]
+            if workflow == "WF5":
+                rows = [[field.format(genotype=",".join(found) or "-",
+                                      status=rng.choice(["Passed", "Passed", "Failed"]))
+                         for field in template]]
+            else:
+                rows = [[field.format(gene=gene, identity=f"{rng.uniform(75, 100):.2f}") for field in template]
+                        for gene in found]
+
+            file_name = directory / f"{sample_name}_{workflow}.tsv"
+            with open(file_name, "w") as fp:
+                for row in [header, *rows]:
+                    fp.write(delimiter.join(row) + "\n")
+            written.append(file_name)
+
+    return written
@@ -0,0 +1,253 @@
+"""
+One entry point for the summarizer and the galaxy runner, run from the summarizer_python directory:
+
+    python cli.py index --data-dir results/           overview of the result files per sample
+    python cli.py parse --data-dir results/           parses new or changed files into the cache
+    python cli.py compare --data-dir results/         the overview, comparisons, concordance and hit database
+    python cli.py export --format parquet             only the comparisons and concordance, in these formats
+    python cli.py hits --database hits.sqlite         the parsed hits as a database or shard partial
+    python cli.py submit --reads-dir reads/ --result-dir results/
+    python cli.py monitor --result-dir results/       resumes a submitted run until all results are downloaded
+
+the settings fall back to environment variables (BENCHAMRKING_DATA_DIR, BENCHAMRKING_OUTPUT_DIR, GALAXY_URL,
+GALAXY_API_KEY) and then to defines.py. The summarizer flags (--identity-cutoff, --cutoffs, --parse-workers, ...)
+override the defines.py settings of the same name for the run. pandas, scipy, plotting and bioblend are only imported by the subcommands
+that use them, so a subcommand starts without paying for the others
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import defines
+
+# summarizer flag: defines.py setting it overrides
+SETTINGS = {'identity_cutoff': 'IDENTITY_CUTOFF',
+            'cutoffs': 'IDENTITY_CUTOFFS',
+            'views_by': 'COMPARISON_VIEWS_BY',
+            'hit_cache_size': 'HIT_CACHE_SIZE',
+            'parse_workers': 'PARSE_WORKERS',
+            'parse_chunksize': 'PARSE_CHUNKSIZE',
+            'export_workers': 'EXPORT_WORKERS',
+            'formats': 'EXPORT_FORMATS'}
+
+
+def _setting(environment_variable, default):
+    value = os.environ.get(environment_variable)
+    return default if value is None else value
+
+
+def _directory(value, name):
+    """
+    :return: Path, exits when the directory is still the NotImplemented placeholder of defines.py
+    """
+    if value in (None, NotImplemented, NotImplementedError):
+        raise SystemExit(f"no {name}, see python cli.py --help")
+    return Path(value)
+
+
+def _apply_settings(args):
+    """
+    Overrides the defines.py settings with the flags given, before lib imports them
+    """
+    for option, setting in SETTINGS.items():
+        value = getattr(args, option, None)
+        if value is not None:
+            setattr(defines, setting, value)
+
+
+def _organiser(args):
+    from lib.sample_organiser import SampleOrganiser
+
+    args.data_dir = _directory(args.data_dir, "data directory")
+    args.output_dir = _directory(args.output_dir, "output directory")
+    return SampleOrganiser(data_dir=args.data_dir, output_dir=args.output_dir, disk_cache=not args.no_disk_cache)
+
+
+def index(args):
+    samples = _organiser(args)
+    print(f"{len(samples.samples)} files, {len(samples.sample_names)} samples, {len(samples.sample_types)} types")
+    samples.write_out_sample_overview()
+    samples.write_report()
+
+
+def parse(args):
+    samples = _organiser(args)
+    samples.parse()
+    samples.save_cache()
+    samples.write_report()
+
+
+def compare(args):
+    from sample_summarizer import summarize
+    from lib.watcher import snapshot_files, watch
+
+    # taken before indexing, so the watch reads the files that change during the first summary
+    snapshot = snapshot_files(_directory(args.data_dir, "data directory")) if args.watch else None
+
+    samples = _organiser(args)
+    summarize(samples)
+
+    if args.watch:
+        try:
+            watch(samples, publish=summarize, interval=defines.WATCH_INTERVAL, debounce=defines.WATCH_DEBOUNCE,
+                  max_delay=defines.WATCH_MAX_DELAY, snapshot=snapshot)
+        except KeyboardInterrupt:
+            samples.save_cache()
+
+
+def export(args):
+    from sample_summarizer import write_comparisons
+
+    samples = _organiser(args)
+    write_comparisons(samples, export_formats=defines.EXPORT_FORMATS)
+    samples.save_cache()
+    samples.write_report()
+
+
+def hits(args):
+    if args.database is None and args.partial is None:
+        raise SystemExit("hits needs --database and / or --partial")
+
+    samples = _organiser(args)
+    if args.database is not None:
+        samples.write_hit_database(args.database, engine=args.engine)
+    if args.partial is not None:
+        samples.save_partial(args.partial)
+    samples.save_cache()
+    samples.write_report()
+
+
+def _run_galaxy(args, samples, timeout, cohort_name=None):
+    """
+    Runs the orchestrator on the samples, the samples already in the manifest are resumed
+
+    :return: int, exit status, 1 when samples failed
+    """
+    from lib.galaxy_api_client import GalaxyApi
+    from lib.orchestrator import Orchestrator
+
+    if not args.api_key:
+        raise SystemExit("no galaxy api key, set GALAXY_API_KEY or use --api-key")
+    args.result_dir = _directory(args.result_dir, "result directory")
+
+    galaxy_api = GalaxyApi(url=args.galaxy_url, api_key=args.api_key,
+                           max_requests_per_second=args.requests_per_second,
+                           upload_manifest=getattr(args, 'upload_manifest', None))
+    orchestrator = Orchestrator(galaxy_api=galaxy_api, manifest_file=args.manifest, data_dir=args.result_dir,
+                                workflow=args.workflow, max_workers=args.workers,
+                                download_workers=args.download_workers)
+    states = orchestrator.run(samples=samples, timeout=timeout,
+                              min_interval=args.min_interval, max_interval=args.max_interval,
+                              on_sample_done=lambda sample_name, state: print(f"{sample_name}: {state}"),
+                              cohort_name=cohort_name)
+    orchestrator.close()
+    galaxy_api.close()
+
+    waiting = [sample_name for sample_name, state in states.items() if state not in ('done', 'failed')]
+    failed = [sample_name for sample_name, state in states.items() if state == 'failed']
+    print(f"{len(states) - len(waiting) - len(failed)} samples done, {len(waiting)} running, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def submit(args):
+    from run_samples import organise_illumina_samples
+
+    reads_dir = Path(args.reads_dir)
+    samples = {sample_name: [reads_dir / read for read in reads]
+               for sample_name, reads in organise_illumina_samples(os.listdir(reads_dir)).items()}
+
+    # without --wait the run only submits, monitor picks it up
+    return _run_galaxy(args, samples, timeout=None if args.wait else 0, cohort_name=args.cohort)
+
+
+def monitor(args):
+    return _run_galaxy(args, {}, timeout=args.timeout)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="BenchAMRking summarizer and galaxy runner")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summarizer = argparse.ArgumentParser(add_help=False)
+    summarizer.add_argument('--data-dir', default=_setting('BENCHAMRKING_DATA_DIR', defines.DATA_DIR),
+                            help="result files, BENCHAMRKING_DATA_DIR or DATA_DIR")
+    summarizer.add_argument('--output-dir',
+                            default=_setting('BENCHAMRKING_OUTPUT_DIR', defines.OUTPUT_DIR),
+                            help="outputs and parse cache, BENCHAMRKING_OUTPUT_DIR or OUTPUT_DIR")
+    summarizer.add_argument('--no-disk-cache', action='store_true', help="parses every file again")
+    summarizer.add_argument('--identity-cutoff', type=float,
+                            help=f"identity a binary hit is present at, IDENTITY_CUTOFF ({defines.IDENTITY_CUTOFF})")
+    summarizer.add_argument('--cutoffs', type=float, nargs='+',
+                            help=f"cutoffs of the cutoff sweep, IDENTITY_CUTOFFS ({defines.IDENTITY_CUTOFFS})")
+    summarizer.add_argument('--views-by', choices=['workflow', 'subtype', 'sample_type'],
+                            help="also a binary comparison per workflow, subtype or sample type, COMPARISON_VIEWS_BY")
+    summarizer.add_argument('--hit-cache-size', type=int,
+                            help=f"parsed files kept in memory, HIT_CACHE_SIZE ({defines.HIT_CACHE_SIZE})")
+    summarizer.add_argument('--parse-workers', type=int,
+                            help="processes parsing files, PARSE_WORKERS (all cores)")
+    summarizer.add_argument('--parse-chunksize', type=int,
+                            help=f"files sent to a parse process at once, PARSE_CHUNKSIZE ({defines.PARSE_CHUNKSIZE})")
+    summarizer.add_argument('--export-workers', type=int,
+                            help=f"comparison files written at the same time, EXPORT_WORKERS ({defines.EXPORT_WORKERS})")
+    summarizer.add_argument('--formats', nargs='+',
+                            help=f"formats the comparisons are written in, EXPORT_FORMATS ({defines.EXPORT_FORMATS})")
+
+    subparser = subparsers.add_parser('index', parents=[summarizer], help="writes the overview of the samples")
+    subparser.set_defaults(function=index)
+
+    subparser = subparsers.add_parser('parse', parents=[summarizer], help="parses the files into the cache")
+    subparser.set_defaults(function=parse)
+
+    subparser = subparsers.add_parser('compare', parents=[summarizer], help="writes the comparisons")
+    subparser.add_argument('--watch', action='store_true', help="updates the outputs when new files land")
+    subparser.set_defaults(function=compare)
+
+    subparser = subparsers.add_parser('export', parents=[summarizer],
+                                      help="writes only the comparisons and concordance, in --formats")
+    subparser.set_defaults(function=export)
+
+    subparser = subparsers.add_parser('hits', parents=[summarizer], help="writes the parsed hits")
+    subparser.add_argument('--database', type=Path, help="hit database, see query_hits.py")
+    subparser.add_argument('--engine', default=defines.HIT_DATABASE_ENGINE, help="sqlite or duckdb")
+    subparser.add_argument('--partial', type=Path, help="shard partial, see summarize_shards.py")
+    subparser.set_defaults(function=hits)
+
+    galaxy = argparse.ArgumentParser(add_help=False)
+    galaxy.add_argument('--galaxy-url', default=_setting('GALAXY_URL', 'https://galaxy.sciensano.be'),
+                        help="GALAXY_URL")
+    galaxy.add_argument('--api-key', default=_setting('GALAXY_API_KEY', None), help="GALAXY_API_KEY")
+    galaxy.add_argument('--result-dir',
+                        default=_setting('BENCHAMRKING_DATA_DIR', defines.DATA_DIR),
+                        help="results are downloaded to, BENCHAMRKING_DATA_DIR or DATA_DIR")
+    galaxy.add_argument('--workflow', default='WF1', help="workflow part of the result file names")
+    galaxy.add_argument('--manifest', type=Path, default=Path('galaxy_run.sqlite'), help="run manifest")
+    galaxy.add_argument('--requests-per-second', type=float, default=10, help="rate limit of the galaxy server")
+    galaxy.add_argument('--workers', type=int, default=8, help="samples submitted at the same time")
+    galaxy.add_argument('--download-workers', type=int, default=4, help="results downloaded at the same time")
+    galaxy.add_argument('--min-interval', type=float, default=5, help="seconds between job polls")
+    galaxy.add_argument('--max-interval', type=float, default=120, help="longest wait between job polls")
+
+    subparser = subparsers.add_parser('submit', parents=[galaxy], help="submits the reads to galaxy")
+    subparser.add_argument('--reads-dir', required=True, help="paired illumina reads, _R1/_R2 or _1/_2")
+    subparser.add_argument('--upload-manifest', type=Path, default=Path('galaxy_uploads.json'),
+                           help="reads in it are not uploaded again")
+    subparser.add_argument('--cohort', default=None, help="submits all samples as one list:paired collection")
+    subparser.add_argument('--wait', action='store_true', help="waits for the results, else only submits")
+    subparser.set_defaults(function=submit)
+
+    subparser = subparsers.add_parser('monitor', parents=[galaxy], help="waits for and downloads the results")
+    subparser.add_argument('--timeout', type=float, default=None, help="seconds to wait, default until done")
+    subparser.set_defaults(function=monitor)
+
+    return parser
+
+
+def main():
+    args = _parser().parse_args()
+    _apply_settings(args)
+    return args.function(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
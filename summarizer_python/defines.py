@@ -4,5 +4,44 @@ OUTPUT_DIR = NotImplementedError
 GENES_TO_FILER = ['-','nan']
 IDENTITY_CUTOFF = 80
 
+NORMALISE_GENE_NAMES = False  # merges the names of the same gene over the AMR databases, eg (Bla)blaKPC-2 and blaKPC-2_1
+GENE_NAME_LOOKUP = None  # csv with the columns name and canonical, used before stripping the names, None only strips
+
 QUALITY_PASSED = 95
 QUALITY_FAILED = 50
+
+HIT_CACHE_SIZE = 100000  # max number of parsed files kept in memory until the hit store is built
+
+DISK_CACHE = True  # stores parsed files in OUTPUT_DIR/cache, reruns only parse new or changed files
+DISK_CACHE_HASH_CONTENT = False  # also validate cached files on a content hash, not only size and mtime
+
+PARSE_WORKERS = None  # number of processes parsing files, None uses all cores
+PARSE_CHUNKSIZE = 16  # number of files send to a parse process at once
+
+CLUSTER_METHOD = 'ward'  # scipy linkage method
+CLUSTER_METRIC = 'euclidean'  # scipy pdist metric, ward/centroid/median need euclidean
+CLUSTER_OPTIMAL_ORDERING = False  # reorders the dendrogram leaves so similar neighbours are adjacent, slower
+
+IDENTITY_CUTOFFS = [80, 90, 95, 98, 100]  # cutoffs compared in the cutoff sweep
+COMPARISON_VIEWS_BY = None  # also a binary comparison per 'workflow', 'subtype' or 'sample_type', None skips them
+
+# formats the comparisons are written in: csv.gz, csv, parquet, feather (a file per comparison,
+# parquet and feather keep the values numeric and the type row as metadata of the sample columns)
+# or xlsx, xlsx_stream (a workbook with a sheet per comparison, xlsx_stream writes in constant memory)
+EXPORT_FORMATS = ['csv.gz', 'xlsx']
+EXPORT_WORKERS = 4  # number of comparison files written at the same time
+
+HIT_DATABASE = 'hits.sqlite'  # all parsed hits in OUTPUT_DIR for query_hits.py, None skips it
+HIT_DATABASE_ENGINE = 'sqlite'  # sqlite or duckdb, duckdb needs to be installed
+
+CONCORDANCE_REFERENCE = None  # workflow compared to all others, eg 'WF1' as in WF1_Vs_all.csv, None compares all pairs
+CONCORDANCE_MERGE_SUBTYPES = False  # compares the workflow types (WF2) instead of the subtypes (WF2_AMR)
+
+WATCH_DATA_DIR = False  # keeps sample_summarizer.py running and updates the outputs when results land in DATA_DIR
+WATCH_INTERVAL = 2  # seconds between looking for new or changed files
+WATCH_DEBOUNCE = 5  # seconds without new files before the outputs are written again
+WATCH_MAX_DELAY = 60  # longest seconds a new file waits for the outputs while files keep arriving
+
+RUN_REPORT_SLOWEST_FILES = 20  # number of slowest files to parse listed in run_report.json
+RUN_REPORT_PROFILE = False  # profiles the run with cProfile, stats are written to run_report.prof
+RUN_REPORT_TRACE_MEMORY = False  # adds the python memory peak per stage with tracemalloc, slower
@@ -0,0 +1,177 @@
+import numpy as np
+
+# metrics computed from the bit packed rows, on presence / absence data they equal scipy's pdist
+BIT_METRICS = ['jaccard', 'dice', 'hamming', 'euclidean', 'sqeuclidean']
+
+# largest number of 64 bit words and-ed at once, bounds the memory of a chunk to 128 MB
+CHUNK_WORDS = 2 ** 24
+
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Counts the set bits of every element, np.bitwise_count on numpy 2, a byte lookup table before
+
+    :param words: numpy array uint64
+    :return: numpy array uint8, same shape
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+
+    counts = _POPCOUNT_TABLE[words.view(np.uint8)]
+    return counts.reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def is_binary(values):
+    """
+    :param values: numpy array
+    :return: bool, True when all values are 0 or 1
+    """
+    return bool(np.all((values == 0) | (values == 1)))
+
+
+def distance_from_counts(both, first, second, n_columns, metric):
+    """
+    The distance of presence / absence rows from how often they are present
+
+    :param both: numpy array int, present in both rows
+    :param first: numpy array int, present in the first row
+    :param second: numpy array int, present in the second row
+    :param n_columns: int or numpy array int, number of compared columns
+    :param metric: str, one of BIT_METRICS, hamming is the fraction of columns that differ
+    :return: numpy array float64
+    """
+    differ = (first + second - 2 * both).astype(np.float64)
+
+    if metric == 'hamming':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(n_columns > 0, differ / np.maximum(n_columns, 1), 0.0)
+    if metric == 'sqeuclidean':
+        return differ
+    if metric == 'euclidean':
+        return np.sqrt(differ)
+
+    if metric == 'jaccard':
+        total = (first + second - both).astype(np.float64)
+    elif metric == 'dice':
+        total = (first + second).astype(np.float64)
+    else:
+        raise ValueError(f"unknown metric {metric}, use one of {BIT_METRICS}")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, differ / total, 0.0)
+
+
+class BitMatrix:
+    """
+    Presence / absence matrix with every row packed into 64 bit words,
+    64 times smaller than float64 and the similarity of two rows is a popcount of their and.
+
+    :param present: numpy array, rows x columns, non zero is present
+    """
+
+    def __init__(self, present) -> None:
+        present = np.asarray(present) != 0
+        self.shape = present.shape
+
+        packed = np.packbits(present, axis=1)
+        padding = -packed.shape[1] % 8  # whole 64 bit words
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+        self.words = np.ascontiguousarray(packed).view(np.uint64)
+
+        self.counts = popcount(self.words).sum(axis=1, dtype=np.int64)  # present per row
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def _chunks(self, other):
+        """
+        :return: range: first row of every chunk, int rows per chunk
+        """
+        if other.shape[1] != self.shape[1]:
+            raise ValueError(f"matrices have {self.shape[1]} and {other.shape[1]} columns")
+
+        chunk_rows = max(1, CHUNK_WORDS // (max(1, self.words.shape[1]) * max(1, other.shape[0])))
+        return range(0, self.shape[0], chunk_rows), chunk_rows
+
+    def _intersections(self, rows, other):
+        """
+        :param rows: slice, rows of this matrix
+        :return: numpy array int64, rows x rows of other, columns present in both
+        """
+        both = self.words[rows, np.newaxis, :] & other.words[np.newaxis, :, :]
+        return popcount(both).sum(axis=2, dtype=np.int64)
+
+    def _distance(self, rows, other, metric):
+        """
+        :param rows: slice, rows of this matrix
+        :return: numpy array float64, rows x rows of other
+        """
+        both = self._intersections(rows, other)
+        return distance_from_counts(both, self.counts[rows, np.newaxis], other.counts[np.newaxis, :],
+                                    self.shape[1], metric)
+
+    def intersections(self, other=None):
+        """
+        Counts per pair of rows the columns present in both, in chunks of rows
+
+        :param other: BitMatrix, same number of columns, None uses this matrix
+        :return: numpy array int64, rows x rows of other
+        """
+        other = self if other is None else other
+        starts, chunk_rows = self._chunks(other)
+
+        intersections = np.empty((self.shape[0], other.shape[0]), dtype=np.int64)
+        for start in starts:
+            rows = slice(start, start + chunk_rows)
+            intersections[rows] = self._intersections(rows, other)
+        return intersections
+
+    def distance(self, metric='jaccard', other=None):
+        """
+        Distance of every pair of rows, equal to scipy's cdist on the boolean rows
+
+        :param metric: str, one of BIT_METRICS, hamming is the fraction of columns that differ
+        :param other: BitMatrix, None uses this matrix
+        :return: numpy array float64, rows x rows of other
+        """
+        other = self if other is None else other
+        starts, chunk_rows = self._chunks(other)
+
+        distances = np.empty((self.shape[0], other.shape[0]), dtype=np.float64)
+        for start in starts:
+            rows = slice(start, start + chunk_rows)
+            distances[rows] = self._distance(rows, other, metric)
+        return distances
+
+    def similarity(self, metric='jaccard', other=None):
+        """
+        Similarity of every pair of rows, 1 - distance. Rows without any presence are fully similar to each other
+
+        :param metric: str, jaccard, dice or hamming (fraction of columns that are the same)
+        :param other: BitMatrix, None uses this matrix
+        :return: numpy array float64, rows x rows of other
+        """
+        return 1 - self.distance(metric=metric, other=other)
+
+    def condensed_distance(self, metric='jaccard'):
+        """
+        The distances as scipy's pdist returns them, the upper triangle row by row.
+        Computed per chunk of rows, the full rows x rows matrix is never held
+
+        :param metric: str, one of BIT_METRICS
+        :return: numpy array float64, n * (n - 1) / 2 distances
+        """
+        n = self.shape[0]
+        starts, chunk_rows = self._chunks(self)
+
+        condensed = np.empty(n * (n - 1) // 2, dtype=np.float64)
+        for start in starts:
+            rows = slice(start, min(n, start + chunk_rows))
+            distances = self._distance(rows, self, metric)
+            for row in range(rows.start, rows.stop):
+                offset = row * n - row * (row + 1) // 2  # start of the row in the condensed array
+                condensed[offset:offset + n - row - 1] = distances[row - rows.start, row + 1:]
+        return condensed
@@ -0,0 +1,94 @@
+import numpy as np
+
+from lib.bit_matrix import BIT_METRICS, BitMatrix, is_binary
+
+# linkage methods that are only defined on euclidean distances
+EUCLIDEAN_METHODS = ['ward', 'centroid', 'median']
+
+
+def linkage(values, method='ward', metric='euclidean', optimal_ordering=False):
+    """
+    Computes the hierarchical clustering of the rows.
+    The distances are computed in condensed form, n * (n - 1) / 2 values instead of a full n x n matrix.
+    Presence / absence rows are bit packed and their distances counted with popcounts, same result as pdist
+
+    :param values: numpy array, rows are clustered
+    :param method: str, scipy linkage method
+    :param metric: str, scipy pdist metric
+    :param optimal_ordering: bool, reorders the leaves so neighbouring leaves are most similar, slower
+    :return: numpy array, scipy linkage matrix, None when there are less than 2 rows
+    """
+    if method in EUCLIDEAN_METHODS and metric != 'euclidean':
+        raise ValueError(f"linkage method {method} requires the euclidean metric, got {metric}")
+
+    if values.shape[0] < 2:
+        return None
+
+    from scipy.cluster import hierarchy  # scipy is only imported when clustering, it is slow to import
+    from scipy.spatial.distance import pdist
+
+    if metric in BIT_METRICS and is_binary(values):
+        distances = BitMatrix(values).condensed_distance(metric=metric)
+    else:
+        distances = pdist(values, metric=metric)
+    return hierarchy.linkage(distances, method=method, optimal_ordering=optimal_ordering)
+
+
+def leaf_order(values, method='ward', metric='euclidean', optimal_ordering=False):
+    """
+    Retrieves the order of the rows in the dendrogram
+
+    :param values: numpy array, rows are clustered
+    :param method: str, scipy linkage method
+    :param metric: str, scipy pdist metric
+    :param optimal_ordering: bool, reorders the leaves so neighbouring leaves are most similar
+    :return: numpy array, row positions in dendrogram order
+    """
+    linkage_matrix = linkage(values, method=method, metric=metric, optimal_ordering=optimal_ordering)
+    if linkage_matrix is None:
+        return np.arange(values.shape[0])
+
+    from scipy.cluster import hierarchy
+    return hierarchy.leaves_list(linkage_matrix)
+
+
+def cluster_order(values, method='ward', metric='euclidean', optimal_ordering=False):
+    """
+    Clusters the rows and the columns, without rendering any figure
+
+    :param values: numpy array, 2d
+    :param method: str, scipy linkage method
+    :param metric: str, scipy pdist metric
+    :param optimal_ordering: bool, reorders the leaves so neighbouring leaves are most similar
+    :return: tuple: numpy array row order, numpy array column order
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+
+    row_order = leaf_order(values, method=method, metric=metric, optimal_ordering=optimal_ordering)
+    col_order = leaf_order(values.T, method=method, metric=metric, optimal_ordering=optimal_ordering)
+
+    return row_order, col_order
+
+
+def plot_clustermap(dataframe, file_name, method='ward', metric='euclidean', annot=False):
+    """
+    Plots the clustered heatmap of the dataframe to a file.
+    Seaborn and matplotlib are only imported here, clustering itself does not need them.
+    The matplotlib backend is left to the caller, without a display matplotlib falls back to Agg by itself
+
+    :param dataframe: panda dataframe, numeric
+    :param file_name: Path, image to write
+    :param method: str, scipy linkage method
+    :param metric: str, scipy pdist metric
+    :param annot: bool, writes the values in the cells, slow on large matrices
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    values = np.ascontiguousarray(dataframe.values, dtype=np.float64)
+    clustered_heatmap = sns.clustermap(dataframe,
+                                       row_linkage=linkage(values, method=method, metric=metric),
+                                       col_linkage=linkage(values.T, method=method, metric=metric),
+                                       cmap='viridis', annot=annot, fmt='.1f')
+    clustered_heatmap.savefig(file_name)
+    plt.close(clustered_heatmap.figure)
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+
+def presence_cube(present, file_workflows, file_samples, n_workflows, n_samples):
+    """
+    Rearranges a gene x file presence matrix into workflow x gene x sample,
+    files of the same workflow and sample (subtypes merged into their type) are combined with or
+
+    :param present: numpy array bool, genes x files
+    :param file_workflows: numpy array int, workflow code per file
+    :param file_samples: numpy array int, sample code per file
+    :param n_workflows: int
+    :param n_samples: int
+    :return: tuple: numpy array bool, workflows x genes x samples,
+                    numpy array bool, workflows x samples, True when the workflow has a file of the sample
+    """
+    cube = np.zeros((n_workflows, present.shape[0], n_samples), dtype=bool)
+    np.logical_or.at(cube, (file_workflows, slice(None), file_samples), present.T)
+
+    has_file = np.zeros((n_workflows, n_samples), dtype=bool)
+    has_file[file_workflows, file_samples] = True
+
+    return cube, has_file
+
+
+def pair_counts(cube, has_file):
+    """
+    Counts for every pair of workflows and every gene, over the samples both workflows have a file of,
+    in how many samples both found the gene and in how many the first found it.
+    Both are batched matrix products over the samples instead of a loop over the pairs
+
+    :param cube: numpy array bool, workflows x genes x samples
+    :param has_file: numpy array bool, workflows x samples
+    :return: tuple: numpy array int both, workflows x workflows x genes,
+                    numpy array int first, workflows x workflows x genes
+    """
+    per_gene = cube.transpose(1, 0, 2).astype(np.float32)  # genes x workflows x samples, exact below 2 ** 24
+    both = np.matmul(per_gene, per_gene.transpose(0, 2, 1))  # genes x workflows x workflows
+    first = np.matmul(per_gene, has_file.T.astype(np.float32))  # found by the first, the second has a file
+
+    return (np.rint(both).astype(np.int64).transpose(1, 2, 0),
+            np.rint(first).astype(np.int64).transpose(1, 2, 0))
+
+
+def concordance_values(both, first):
+    """
+    The agreement of two workflows on a gene:
+    -1 when a sample has the gene in only one of them, 1 when they found it in the same samples, 0 when neither found it
+
+    :param both: numpy array int, workflows x workflows x genes
+    :param first: numpy array int, workflows x workflows x genes
+    :return: numpy array int8, workflows x workflows x genes
+    """
+    first_only = first - both
+    second_only = first.transpose(1, 0, 2) - both
+
+    values = np.zeros(both.shape, dtype=np.int8)
+    values[both > 0] = 1
+    values[(first_only + second_only) > 0] = -1
+    return values
+
+
+def workflow_pairs(workflows, reference=None):
+    """
+    :param workflows: list: str
+    :param reference: str, only pairs of this workflow with the others, None all pairs
+    :return: list: tuple: int first, int second, indexes in workflows
+    """
+    if reference is not None:
+        first = workflows.index(reference)
+        return [(first, second) for second in range(len(workflows)) if second != first]
+
+    return [(first, second) for first in range(len(workflows)) for second in range(first + 1, len(workflows))]
+
+
+def pair_label(first, second):
+    """
+    :return: str, eg WF1 vs WF2 AMR for WF1 and WF2_AMR
+    """
+    return f"{first} vs {second}".replace("_", " ")
+
+
+def concordance_table(values, workflows, genes, pairs):
+    """
+    :return: panda dataframe, genes x pairs with the -1/0/1 agreement, the WF1_Vs_all.csv layout
+    """
+    first, second = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+    return pd.DataFrame(values[first, second, :].T,
+                        index=pd.Index(genes, name="type"),
+                        columns=[pair_label(workflows[i], workflows[j]) for i, j in pairs])
+
+
+def concordance_counts(both, found_first, values, workflows, genes, pairs):
+    """
+    :return: panda dataframe, a row per pair and gene with the samples found by both and by only one workflow
+    """
+    first, second = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+    both_pairs = both[first, second, :]
+    first_only = found_first[first, second, :] - both_pairs
+    second_only = found_first[second, first, :] - both_pairs
+
+    return pd.DataFrame({"first": np.repeat([workflows[i] for i in first], len(genes)),
+                         "second": np.repeat([workflows[j] for j in second], len(genes)),
+                         "gene": np.tile(np.asarray(genes, dtype=object), len(pairs)),
+                         "both": both_pairs.ravel(),
+                         "first_only": first_only.ravel(),
+                         "second_only": second_only.ravel(),
+                         "value": values[first, second, :].ravel()})
+
+
+def figure4_layout(table):
+    """
+    Melts the concordance table into the AMR, WF, Value columns Figure4_script.py reads
+
+    :param table: panda dataframe, see concordance_table
+    :return: panda dataframe
+    """
+    return (table.rename_axis("AMR").reset_index()
+            .melt(id_vars="AMR", var_name="WF", value_name="Value"))
@@ -0,0 +1,133 @@
+import hashlib
+import importlib.util
+import json
+from pathlib import Path
+
+import pandas as pd
+
+# parquet when pyarrow is installed, pandas only imports it when the cache is read or written
+_CACHE_SUFFIX = '.parquet' if importlib.util.find_spec('pyarrow') is not None else '.pkl'
+
+# bump when the parsing of result files changes, invalidates all cached hits
+PARSER_VERSION = 2
+
+
+class DiskCache:
+    """
+    Persistent cache of parsed gene hits, stored as one long table (file, gene, identity)
+    so reruns only parse new or changed files.
+
+    A file is seen as unchanged when the size and modification time (and optionally the content hash)
+    are the same as when it was parsed. The whole cache is dropped when the parse settings change.
+    """
+
+    def __init__(self, cache_dir: Path, settings: dict, hash_content: bool = False) -> None:
+        self._cache_file = Path(cache_dir) / f'parsed_hits{_CACHE_SUFFIX}'
+        self._settings_file = Path(cache_dir) / 'parsed_hits_settings.json'
+        self._settings = {**settings, 'parser_version': PARSER_VERSION}
+        self._hash_content = hash_content
+
+        self._entries = {}  # str(path): (size, mtime_ns, content_hash, {gene: identity})
+        self._changed = False
+
+        self._load()
+
+    def _load(self):
+        """
+        Loads the cache from disk, when it is made with the same settings
+        """
+        if not self._cache_file.exists() or not self._settings_file.exists():
+            return
+
+        with open(self._settings_file) as fp:
+            if json.load(fp) != self._settings:
+                self._changed = True  # stale cache is overwritten on save
+                return
+
+        if _CACHE_SUFFIX == '.parquet':
+            df = pd.read_parquet(self._cache_file)
+        else:
+            df = pd.read_pickle(self._cache_file)
+
+        for path, size, mtime_ns, content_hash, gene, identity in zip(df['path'], df['size'], df['mtime_ns'],
+                                                                       df['content_hash'], df['gene'],
+                                                                       df['identity']):
+            if path not in self._entries:
+                self._entries[path] = (int(size), int(mtime_ns), content_hash, {})
+
+            if pd.notna(gene):  # files without any gene are stored with one empty row
+                self._entries[path][3][gene] = identity
+
+    def _file_key(self, file: Path):
+        """
+        Retrieves the values a file is validated on
+
+        :param file: Path
+        :return: tuple: size, mtime_ns, content hash (None when not hashing)
+        """
+        stat = file.stat()
+        content_hash = None
+        if self._hash_content:
+            content_hash = hashlib.sha1(file.read_bytes()).hexdigest()
+
+        return stat.st_size, stat.st_mtime_ns, content_hash
+
+    def get(self, file: Path):
+        """
+        Retrieves the cached genes of a file when the file did not change
+
+        :param file: Path
+        :return: dict: gene: identity, or None when not cached or changed
+        """
+        entry = self._entries.get(str(file))
+        if entry is None:
+            return None
+
+        if entry[:3] != self._file_key(file):
+            return None
+
+        return entry[3]
+
+    def put(self, file: Path, genes: dict):
+        """
+        Stores the parsed genes of a file
+
+        :param file: Path
+        :param genes: dict: gene: identity
+        """
+        self._entries[str(file)] = (*self._file_key(file), genes)
+        self._changed = True
+
+    def save(self):
+        """
+        Writes the cache to disk, entries of files that no longer exist are dropped
+        """
+        stale = [path for path in self._entries if not Path(path).exists()]
+        for path in stale:
+            del self._entries[path]
+
+        if not self._changed and not stale:
+            return
+
+        rows = {'path': [], 'size': [], 'mtime_ns': [], 'content_hash': [], 'gene': [], 'identity': []}
+        for path, (size, mtime_ns, content_hash, genes) in self._entries.items():
+            for gene, identity in (genes.items() or [(None, None)]):
+                rows['path'].append(path)
+                rows['size'].append(size)
+                rows['mtime_ns'].append(mtime_ns)
+                rows['content_hash'].append(content_hash)
+                rows['gene'].append(gene)
+                rows['identity'].append(identity)
+
+        df = pd.DataFrame(rows).astype({'size': 'int64', 'mtime_ns': 'int64', 'identity': 'float64'})
+
+        self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+        if _CACHE_SUFFIX == '.parquet':
+            df.to_parquet(self._cache_file, index=False)
+        else:
+            df.to_pickle(self._cache_file)
+
+        with open(self._settings_file, 'w') as fp:
+            json.dump(self._settings, fp)
+
+        self._changed = False
@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# format: (suffix, writer), writers write one dataframe to one file
+EXPORTERS = {}
+
+# formats writing all views as sheets of one workbook
+WORKBOOK_EXPORTERS = {}
+
+# leading rows with text about the sample columns, columnar formats store them as column metadata
+LABEL_ROWS = ("type",)
+
+
+def register_exporter(fmt, suffix):
+    """
+    Registers a writer of one dataframe per file
+
+    :param fmt: str, name of the format
+    :param suffix: str, file suffix
+    """
+    def register(writer):
+        EXPORTERS[fmt] = (suffix, writer)
+        return writer
+
+    return register
+
+
+def register_workbook_exporter(fmt, suffix):
+    """
+    Registers a writer of all dataframes as sheets in one file
+
+    :param fmt: str, name of the format
+    :param suffix: str, file suffix
+    """
+    def register(writer):
+        WORKBOOK_EXPORTERS[fmt] = (suffix, writer)
+        return writer
+
+    return register
+
+
+def _to_columnar(dataframe):
+    """
+    Prepares a dataframe for columnar formats, those need string column names, a default index
+    and one type per column. The leading LABEL_ROWS would make the sample columns text,
+    so they are split off and the values stay numeric
+
+    :param dataframe: panda dataframe
+    :return: tuple: panda dataframe, dict: column: dict: label row: value
+    """
+    n_labels = 0
+    while n_labels < len(dataframe) and dataframe.index[n_labels] in LABEL_ROWS:
+        n_labels += 1
+    labels, dataframe = dataframe.iloc[:n_labels], dataframe.iloc[n_labels:]
+
+    columns = {"": [str(index) for index in dataframe.index]}
+    for column in dataframe.columns:
+        values = dataframe[column]
+        if values.dtype == object:
+            try:
+                values = pd.to_numeric(values)
+            except (TypeError, ValueError):  # a text column
+                values = values.astype(str)
+        columns[str(column)] = values.values
+
+    column_labels = {str(column): {str(row): str(value) for row, value in labels[column].items()}
+                     for column in labels.columns}
+    return pd.DataFrame(columns), column_labels
+
+
+def _to_arrow(dataframe):
+    """
+    :param dataframe: panda dataframe
+    :return: pyarrow table, the label rows (eg type) are the metadata of the columns
+    """
+    import pyarrow as pa
+
+    values, column_labels = _to_columnar(dataframe)
+    table = pa.Table.from_pandas(values, preserve_index=False)
+    fields = [field.with_metadata(column_labels[field.name]) if column_labels.get(field.name) else field
+              for field in table.schema]
+    return pa.Table.from_arrays(table.columns, schema=pa.schema(fields, metadata=table.schema.metadata))
+
+
+@register_exporter("csv.gz", suffix=".csv.gz")
+def write_csv_gz(dataframe, file_name):
+    dataframe.to_csv(file_name, index=True, compression="gzip")
+
+
+@register_exporter("csv", suffix=".csv")
+def write_csv(dataframe, file_name):
+    dataframe.to_csv(file_name, index=True)
+
+
+@register_exporter("parquet", suffix=".parquet")
+def write_parquet(dataframe, file_name):
+    import pyarrow.parquet
+
+    pyarrow.parquet.write_table(_to_arrow(dataframe), file_name)
+
+
+@register_exporter("feather", suffix=".feather")
+def write_feather(dataframe, file_name):
+    import pyarrow.feather
+
+    pyarrow.feather.write_feather(_to_arrow(dataframe), file_name)
+
+
+@register_workbook_exporter("xlsx", suffix=".xlsx")
+def write_xlsx(views, file_name):
+    """
+    Writes the views with openpyxl, the whole workbook is kept in memory
+    """
+    with pd.ExcelWriter(file_name) as excel_writer:
+        for sheet_name, dataframe in views.items():
+            dataframe.to_excel(excel_writer, sheet_name=sheet_name, index=True)
+
+
+@register_workbook_exporter("xlsx_stream", suffix=".xlsx")
+def write_xlsx_stream(views, file_name):
+    """
+    Writes the views row by row with xlsxwriter in constant memory mode,
+    every row is flushed to disk once written
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(str(file_name), {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        for sheet_name, dataframe in views.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [dataframe.index.name or ""] + [str(column) for column in dataframe.columns])
+
+            for row_number, (index, row) in enumerate(zip(dataframe.index, dataframe.itertuples(index=False)),
+                                                      start=1):
+                worksheet.write_row(row_number, 0, [str(index), *row])
+    finally:
+        workbook.close()
+
+
+def export_views(views, output_dir, name, fmt, workers=4):
+    """
+    Writes comparison views to the output directory.
+    Per file formats write <name>_<view><suffix> for every view, concurrently.
+    Workbook formats write <name><suffix> with a sheet per view
+
+    :param views: dict: view name: panda dataframe
+    :param output_dir: Path
+    :param name: str, name of the output
+    :param fmt: str, one of EXPORTERS or WORKBOOK_EXPORTERS
+    :param workers: int, number of views written at the same time
+    :return: list: Path, written files
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if fmt in WORKBOOK_EXPORTERS:
+        suffix, writer = WORKBOOK_EXPORTERS[fmt]
+        file_name = output_dir / f"{name}{suffix}"
+        if file_name.exists():
+            file_name.unlink()  # deletes file if it exists
+
+        writer(views, file_name)
+        return [file_name]
+
+    if fmt not in EXPORTERS:
+        raise ValueError(f"export format {fmt} not implemented, "
+                         f"use one of {[*EXPORTERS, *WORKBOOK_EXPORTERS]}")
+
+    suffix, writer = EXPORTERS[fmt]
+    file_names = [output_dir / f"{name}_{view_name}{suffix}" for view_name in views]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # list() raises the first error of the writers
+        list(executor.map(writer, views.values(), file_names))
+
+    return file_names
@@ -1,103 +1,351 @@
 from bioblend import galaxy
+from bioblend.galaxy.dataset_collections import CollectionDescription, CollectionElement, HistoryDatasetElement
+from concurrent.futures import ThreadPoolExecutor
+from lib.job_monitor import JobMonitor
+from lib.upload_manager import UploadManager
 from pathlib import Path
+import threading
 import time
 
 
+class RateLimiter():
+    """
+    Spaces out the requests of all threads to at most max_per_second
+
+    :param max_per_second: float, None is unlimited
+    """
+
+    def __init__(self, max_per_second: float = None) -> None:
+        self._interval = 0 if not max_per_second else 1 / max_per_second
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
 class GalaxyApi():
 
-    def __init__(self, url: str, api_key: str) -> None:
+    def __init__(self, url: str, api_key: str, galaxy_instance=None, max_requests_per_second: float = None,
+                 upload_manifest: Path = None, upload_library: str = 'BenchAMRking reads',
+                 max_concurrent_uploads: int = 4) -> None:
         self._galaxy_url = url
         self._api_key = api_key
 
-        self.galaxy_instance = galaxy.GalaxyInstance(url=url,
-                                                     key=api_key)
+        # one instance is shared by all samples and threads
+        self.galaxy_instance = galaxy_instance
+        if self.galaxy_instance is None:
+            self.galaxy_instance = galaxy.GalaxyInstance(url=url,
+                                                         key=api_key)
+
+        self._rate_limiter = RateLimiter(max_requests_per_second)
+        self._tool_lock = threading.Lock()
+        self._read_lists_lock = threading.Lock()
+        self._read_lists = {}  # read list id: dict: read dataset id: sample name
 
-        self._history_url = None
-        self._history_id = None
         self._tool_id = None
         self._tool_name = None
-        self._library_url = None
-        self._library_id = None
-        self._dataset_ids = None
+        self._tool_version = None
+
+        # with a manifest the reads are uploaded to a data library once and linked into the histories
+        self.upload_manager = None
+        if upload_manifest is not None:
+            self.upload_manager = UploadManager(galaxy_api=self,
+                                                manifest_file=upload_manifest,
+                                                library_name=upload_library,
+                                                max_workers=max_concurrent_uploads)
 
-    def run_sample(self, sample_name: str, sample_paths: list[Path]):
+    def run_sample(self, sample_name: str, sample_paths: list[Path]) -> dict:
+        """
+        Uploads the reads of a sample to a new history and starts the STEC pipeline on them.
+        Safe to call from several threads at once.
+        When no job starts the history is deleted and ValueError or the error of the request is raised
 
-        self._create_history(sample_name)
+        :param sample_name: str, name of the history and sample
+        :param sample_paths: list: Path, the forward and reverse read
+        :return: dict: sample_name, history_id, job_ids
+        """
         self._get_stec_pipeline_tool()
 
-        for sample_path in sample_paths:
-            self._upload_dataset_to_history(sample_path=sample_path)
+        sample_paths = self._pair_reads(sample_paths)
+        history_id = self._create_history(sample_name)
+        try:
+            return self._run_sample(history_id, sample_name, sample_paths)
+        except Exception:  # no job started, the history has nothing running
+            try:  # the sample is submitted again in a new history, this one is not left behind
+                self._delete_history(history_id)
+            except Exception as error:
+                print(f"could not delete history {history_id} of sample {sample_name}: {error}")
+            raise
 
-        self._get_dataset_ids_in_history()
+    def _run_sample(self, history_id: str, sample_name: str, sample_paths: tuple) -> dict:
+        """
+        Uploads the reads into the sample history and starts the STEC pipeline on them, see run_sample
+        """
+        if self.upload_manager is not None:
+            dataset_ids = self.upload_manager.add_to_history(history_id=history_id, sample_paths=sample_paths)
+        else:
+            dataset_ids = []
+            for sample_path in sample_paths:
+                dataset_ids.append(self._upload_dataset_to_history(history_id=history_id, sample_path=sample_path))
 
-        self._run_tool(sample=sample_name)
+        result = self._run_tool(history_id=history_id, sample=sample_name, dataset_ids=dataset_ids)
 
-        # except:
-        #     raise Exception
-        #
-        # finally:
-        #     self._delete_history()
+        job_ids = [job['id'] for job in result.get('jobs', [])]
+        if not job_ids:
+            raise ValueError(f"sample {sample_name} started no jobs")
 
-    def _run_tool(self, sample: str):
+        return {'sample_name': sample_name,
+                'history_id': history_id,
+                'job_ids': job_ids}
 
-        # todo here goes it wrong, for some reason dataset[1] is used twice???? and not [0]
-        # todo: docs https://bioblend.readthedocs.io/en/latest/api_docs/galaxy/all.html#module-bioblend.galaxy.jobs
-        input = {'section_amr': {'dbs_amr': ['resfinder', 'argannot', 'card', 'ncbi-amr', 'pointfinder']},
-                 'section_input': {'detection_method': 'blast', 'read_type':
-                     {'__current_case__': 0,
-                      'fastq_1': {'values': [{'id': self._dataset_ids[0], 'src': 'hda'}]},
-                      'fastq_2': {'values': [{'id': self._dataset_ids[1], 'src': 'hda'}]},
-                      'input_type_selector': 'illumina', 'library': 'NexteraPE'}, 'sample_name': sample},
+    def run_samples(self, samples: dict, max_workers: int = 4) -> dict:
+        """
+        Submits many samples concurrently, every sample gets its own history
+
+        :param samples: dict: sample_name: list: Path, reads of the sample
+        :param max_workers: int, number of samples submitted at the same time
+        :return: dict: sample_name: result of run_sample, in the order of samples
+        """
+        self._get_stec_pipeline_tool()  # fetched once, before the threads start
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {sample_name: executor.submit(self.run_sample, sample_name, sample_paths)
+                       for sample_name, sample_paths in samples.items()}
+
+            return {sample_name: future.result() for sample_name, future in futures.items()}
+
+    def run_cohort(self, cohort_name: str, samples: dict, max_workers: int = 4) -> dict:
+        """
+        Submits all samples at once: the reads are put in one history as a list:paired collection
+        and the STEC pipeline is mapped over it, one job per sample.
+        The paired collection is split in a forward and a reverse list (__UNZIP_COLLECTION__)
+        that are linked to the two read inputs, so the reads of a sample always end up in the same job.
+        The jobs are not matched to the samples here, that costs a request per job,
+        job_sample does it once a job finished, through the read the job got
+
+        :param cohort_name: str, name of the history and collection
+        :param samples: dict: sample_name: list: Path, the two reads of the sample
+        :param max_workers: int, number of reads uploaded at the same time
+        :return: dict: cohort_name, history_id, collection_id, read_list_id: the forward reads named by sample,
+                 job_ids: list: str
+        """
+        self._get_stec_pipeline_tool()
+
+        pairs = {sample_name: self._pair_reads(sample_paths) for sample_name, sample_paths in samples.items()}
+        history_id = self._create_history(cohort_name)
+        try:
+            return self._run_cohort(history_id, cohort_name, pairs, max_workers)
+        except Exception:  # no job started, the history has nothing running
+            try:  # the cohort is submitted again in a new history, this one is not left behind
+                self._delete_history(history_id)
+            except Exception as error:
+                print(f"could not delete history {history_id} of cohort {cohort_name}: {error}")
+            raise
 
-                 'section_plasmid': {'dbs_plasmid': 'plasmid'}, 'section_qc': {'kraken': 'true'},
-                 'section_report': {'report_include_bam': 'false', 'report_include_fastq': 'false'},
-                 'section_serotype': {'serotypefinder': 'true'},
-                 'section_st': {'schemes': ['mlst-pasteur', 'mlst-warwick', 'cgmlst']},
-                 'section_virulence': {'dbs_viru': 'virulence'}}
+    def _run_cohort(self, history_id: str, cohort_name: str, pairs: dict, max_workers: int) -> dict:
+        """
+        Uploads the reads into the cohort history and maps the STEC pipeline over them, see run_cohort
 
-        result = self.galaxy_instance.tools.run_tool(tool_id=self._tool_id,
-                                                     history_id=self._history_id,
-                                                     tool_inputs=input
-                                                     )
+        :param pairs: dict: sample_name: tuple: Path forward read, Path reverse read
+        """
 
-        pass
+        if self.upload_manager is not None:
+            reads = [sample_path for pair in pairs.values() for sample_path in pair]
+            read_ids = iter(self.upload_manager.add_to_history(history_id=history_id, sample_paths=reads))
+            dataset_ids = {sample_name: [next(read_ids), next(read_ids)] for sample_name in pairs}
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {sample_name: [executor.submit(self._upload_dataset_to_history, history_id, sample_path)
+                                         for sample_path in pair]
+                           for sample_name, pair in pairs.items()}
+                dataset_ids = {sample_name: [future.result() for future in pair_futures]
+                               for sample_name, pair_futures in futures.items()}
 
-    def _upload_dataset_to_history(self, sample_path: Path):
+        elements = [CollectionElement(name=sample_name,
+                                      type='paired',
+                                      elements=[HistoryDatasetElement(name='forward', id=forward_id),
+                                                HistoryDatasetElement(name='reverse', id=reverse_id)])
+                    for sample_name, (forward_id, reverse_id) in dataset_ids.items()]
+        collection = self.call(self.galaxy_instance.histories.create_dataset_collection,
+                               history_id=history_id,
+                               collection_description=CollectionDescription(name=cohort_name,
+                                                                            type='list:paired',
+                                                                            elements=elements))
 
-        self.galaxy_instance.tools.upload_file(path=sample_path, history_id=self._history_id)
+        unzipped = self.call(self.galaxy_instance.tools.run_tool,
+                             tool_id='__UNZIP_COLLECTION__',
+                             history_id=history_id,
+                             tool_inputs={'input': {'batch': True,
+                                                    'values': [{'src': 'hdca', 'id': collection['id'],
+                                                                'map_over_type': 'paired'}]}})
+        unzipped = {collection['output_name']: collection for collection in unzipped['implicit_collections']}
+        forward_list, reverse_list = unzipped['forward'], unzipped['reverse']
 
-    def _get_dataset_ids_in_history(self):
+        result = self.call(self.galaxy_instance.tools.run_tool,
+                           tool_id=self._tool_id,
+                           history_id=history_id,
+                           tool_inputs=self._tool_inputs(
+                               sample=cohort_name,
+                               fastq_1={'batch': True, 'linked': True,
+                                        'values': [{'src': 'hdca', 'id': forward_list['id']}]},
+                               fastq_2={'batch': True, 'linked': True,
+                                        'values': [{'src': 'hdca', 'id': reverse_list['id']}]}))
 
-        data_set_ids = []
-        result = self.galaxy_instance.datasets.get_datasets(history_id=self._history_id)
-        for dataset in result:
-            data_set_ids.append(dataset['id'])
+        job_ids = [job['id'] for job in result.get('jobs', [])]
+        if not job_ids:
+            raise ValueError(f"cohort {cohort_name} started no jobs")
 
-        self._dataset_ids = data_set_ids
+        return {'cohort_name': cohort_name,
+                'history_id': history_id,
+                'collection_id': collection['id'],
+                'read_list_id': forward_list['id'],
+                'job_ids': job_ids}
 
-    def _wait_jobs_status(self, list_job_ids: list[str]):
+    def job_sample(self, history_id: str, read_list_id: str, job_id: str) -> str:
+        """
+        Finds the sample of a job mapped over a read list through the read the job got as input,
+        not through its position, a slice that did not get a job would shift all samples after it.
+        The read list is fetched once per cohort
 
-        for job in list_job_ids:
-            while True:
-                time.sleep(10)
-                job_result = self.galaxy_instance.jobs.show_job(job_id=job)
-                print(job_result)
-                if job_result['state'] == 'ok':
-                    break
+        :param history_id: str, history of the read list
+        :param read_list_id: str, id of the list with one read per sample, named by sample
+        :param job_id: str
+        :return: str, sample name, None when no input of the job is in the read list
+        """
+        with self._read_lists_lock:
+            read_samples = self._read_lists.get(read_list_id)
+        if read_samples is None:
+            read_list = self.call(self.galaxy_instance.histories.show_dataset_collection,
+                                  history_id=history_id, dataset_collection_id=read_list_id)
+            read_samples = {element['object']['id']: element['element_identifier']
+                            for element in read_list['elements']}
+            with self._read_lists_lock:
+                self._read_lists[read_list_id] = read_samples
+
+        job = self.call(self.galaxy_instance.jobs.show_job, job_id=job_id)
+        for dataset in job.get('inputs', {}).values():
+            if dataset.get('id') in read_samples:
+                return read_samples[dataset['id']]
+
+        return None
+
+    def close(self):
+        """
+        Stops the upload threads, if any
+        """
+        if self.upload_manager is not None:
+            self.upload_manager.close()
+
+    def call(self, function, **kwargs):
+        """
+        Calls the galaxy api within the rate limit
+
+        :param function: method of the galaxy instance
+        :return: the result of the function
+        """
+        self._rate_limiter.wait()
+        return function(**kwargs)
+
+    def _run_tool(self, history_id: str, sample: str, dataset_ids: list[str]) -> dict:
+        return self.call(self.galaxy_instance.tools.run_tool,
+                         tool_id=self._tool_id,
+                         history_id=history_id,
+                         tool_inputs=self._tool_inputs(sample=sample,
+                                                       fastq_1={'values': [{'id': dataset_ids[0], 'src': 'hda'}]},
+                                                       fastq_2={'values': [{'id': dataset_ids[1], 'src': 'hda'}]}))
+
+    def _tool_inputs(self, sample: str, fastq_1: dict, fastq_2: dict) -> dict:
+        """
+        :param sample: str, sample name given to the pipeline
+        :param fastq_1: dict, value of the forward read input
+        :param fastq_2: dict, value of the reverse read input
+        :return: dict, inputs of the stec pipeline
+        """
+        # todo: docs https://bioblend.readthedocs.io/en/latest/api_docs/galaxy/all.html#module-bioblend.galaxy.jobs
+        return {'section_amr': {'dbs_amr': ['resfinder', 'argannot', 'card', 'ncbi-amr', 'pointfinder']},
+                'section_input': {'detection_method': 'blast', 'read_type':
+                    {'__current_case__': 0,
+                     'fastq_1': fastq_1,
+                     'fastq_2': fastq_2,
+                     'input_type_selector': 'illumina', 'library': 'NexteraPE'}, 'sample_name': sample},
+
+                'section_plasmid': {'dbs_plasmid': 'plasmid'}, 'section_qc': {'kraken': 'true'},
+                'section_report': {'report_include_bam': 'false', 'report_include_fastq': 'false'},
+                'section_serotype': {'serotypefinder': 'true'},
+                'section_st': {'schemes': ['mlst-pasteur', 'mlst-warwick', 'cgmlst']},
+                'section_virulence': {'dbs_viru': 'virulence'}}
+
+    @staticmethod
+    def _pair_reads(sample_paths: list[Path]) -> tuple[Path, Path]:
+        """
+        Finds the forward and reverse read on the read number after the last _, eg _R1.fastq.gz or _2.fq
+
+        :param sample_paths: list: Path, the two reads of a sample
+        :return: tuple: Path forward, Path reverse
+        """
+        reads = {}
+        for sample_path in sample_paths:
+            read_number = Path(sample_path).name.rsplit('_', 1)[-1].split('.')[0].lstrip('Rr')
+            reads[read_number] = Path(sample_path)
+
+        if sorted(reads) != ['1', '2']:
+            raise ValueError(f"no forward and reverse read (_1/_R1 and _2/_R2) in {[str(path) for path in sample_paths]}")
+
+        return reads['1'], reads['2']
+
+    def _upload_dataset_to_history(self, history_id: str, sample_path: Path) -> str:
+        """
+        :return: str, id of the uploaded dataset
+        """
+        result = self.call(self.galaxy_instance.tools.upload_file, path=str(sample_path), history_id=history_id)
+        return result['outputs'][0]['id']
+
+    def wait_for_jobs(self, job_ids: list[str], on_finished=None, timeout: float = None,
+                      min_interval: float = 5, max_interval: float = 120) -> dict:
+        """
+        Waits until all jobs are finished (ok, error, deleted, ...), all jobs are polled together
+
+        :param job_ids: list: str
+        :param on_finished: function called with the job dict as soon as a job is finished
+        :param timeout: float, seconds, None waits forever
+        :param min_interval: float, seconds between polls while jobs are changing
+        :param max_interval: float, longest wait between polls
+        :return: dict: job_id: state
+        """
+        monitor = JobMonitor(galaxy_api=self, min_interval=min_interval, max_interval=max_interval)
+        monitor.add(job_ids, on_finished=on_finished)
+        return monitor.wait(timeout=timeout)
 
     def _get_stec_pipeline_tool(self):
-        result = self.galaxy_instance.tools.show_tool(
-            tool_id='pipeline_stec_1.0')
+        with self._tool_lock:
+            if self._tool_id is not None:  # only fetched once
+                return
+
+            result = self.call(self.galaxy_instance.tools.show_tool,
+                               tool_id='pipeline_stec_1.0')
 
-        self._tool_id = result['id']
-        self._tool_name = result['name']
-        self._tool_version = result['version']
+            self._tool_id = result['id']
+            self._tool_name = result['name']
+            self._tool_version = result['version']
 
-    def _create_history(self, sample_name: str, ):
-        result = self.galaxy_instance.histories.create_history(name=sample_name)
-        self._history_url = result['url']
-        self._history_id = result['id']
+    def _create_history(self, sample_name: str) -> str:
+        """
+        :return: str, id of the new history
+        """
+        result = self.call(self.galaxy_instance.histories.create_history, name=sample_name)
+        return result['id']
 
-    def _delete_history(self):
-        result = self.galaxy_instance.histories.delete_history(history_id=self._history_id,
-                                                               purge=True)
+    def _delete_history(self, history_id: str):
+        self.call(self.galaxy_instance.histories.delete_history,
+                  history_id=history_id,
+                  purge=True)
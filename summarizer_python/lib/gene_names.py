@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PREFIX_PATTERN = r'^\([^)]*\)'  # leading (something), eg (Bla)blaTEM-1 of ARG-ANNOT
+ALLELE_SUFFIX_PATTERN = r'_\d+$'  # trailing allele number, eg blaKPC-2_1 of ResFinder
+
+
+class GeneNormaliser:
+    """
+    Maps the gene names of the AMR databases to one canonical name, so the same gene found by
+    different workflows ends up in the same row.
+    A name is looked up in the lookup table, else its prefix and allele number are stripped and
+    the stripped name is looked up again. Names are normalised once with vectorized string operations
+    over all new names at once, the result is kept for the next call.
+
+    :param lookup: dict: name: canonical name, None only strips
+    :param strip_prefix: bool, removes the leading (something)
+    :param strip_allele: bool, removes the trailing _number
+    """
+
+    def __init__(self, lookup=None, strip_prefix=True, strip_allele=True) -> None:
+        self.lookup = dict(lookup or {})
+        self.strip_prefix = strip_prefix
+        self.strip_allele = strip_allele
+        self._names = {}  # name: canonical name, of all names normalised so far
+
+    @classmethod
+    def from_file(cls, lookup_file, strip_prefix=True, strip_allele=True):
+        """
+        :param lookup_file: str or Path, csv or tsv with the columns name and canonical
+        :return: GeneNormaliser
+        """
+        lookup_file = Path(lookup_file)
+        separator = '\t' if lookup_file.suffix in ('.tsv', '.tab') else ','
+        table = pd.read_csv(lookup_file, sep=separator, usecols=['name', 'canonical'], dtype=str).dropna()
+
+        return cls(lookup=dict(zip(table['name'], table['canonical'])),
+                   strip_prefix=strip_prefix, strip_allele=strip_allele)
+
+    def normalise(self, genes):
+        """
+        :param genes: list: str, gene names
+        :return: list: str, canonical name per gene
+        """
+        new = pd.Series(list(dict.fromkeys(gene for gene in genes if gene not in self._names)), dtype=object)
+        if len(new):
+            stripped = new.astype(str)
+            if self.strip_prefix:
+                stripped = stripped.str.replace(PREFIX_PATTERN, '', regex=True)
+            if self.strip_allele:
+                stripped = stripped.str.replace(ALLELE_SUFFIX_PATTERN, '', regex=True)
+
+            canonical = new.map(self.lookup).fillna(stripped.map(self.lookup)).fillna(stripped)
+            self._names.update(zip(new, canonical))
+
+        return [self._names[gene] for gene in genes]
+
+    def codes(self, genes, canonical_genes=0):
+        """
+        Groups the genes by their canonical name.
+        Normalising is not idempotent, eg (Bla)blaOXA-48_1_2 becomes blaOXA-48_1 and then blaOXA-48,
+        so names that are canonical already are kept as they are
+
+        :param genes: list: str, gene names
+        :param canonical_genes: int, the first genes are canonical names already
+        :return: tuple: list: str sorted canonical names, numpy array int32 position of the canonical name per gene
+        """
+        canonical = np.array(list(genes[:canonical_genes]) + self.normalise(genes[canonical_genes:]), dtype=object)
+        if not len(canonical):
+            return [], np.zeros(0, dtype=np.int32)
+
+        names, positions = np.unique(canonical, return_inverse=True)
+        return list(names), positions.astype(np.int32)
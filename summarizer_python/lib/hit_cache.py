@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from pathlib import Path
+
+
+class HitCache:
+    """
+    Keeps the parsed gene: identity result of every file in memory,
+    so a file is only parsed once until the SampleOrganiser built its hit store from them.
+
+    The cache is bound by the number of files, the least recently used file is evicted first.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+
+        self._max_entries = max_entries
+        self._hits = OrderedDict()
+
+    def get(self, file: Path):
+        """
+        Retrieves the parsed genes of a file
+
+        :param file: Path, file the genes are parsed from
+        :return: dict: gene: identity, or None when the file is not cached
+        """
+        try:
+            self._hits.move_to_end(file)
+        except KeyError:
+            return None
+
+        return self._hits[file]
+
+    def put(self, file: Path, genes: dict):
+        """
+        Stores the parsed genes of a file, evicts the least recently used file when full
+
+        :param file: Path, file the genes are parsed from
+        :param genes: dict: gene: identity
+        """
+        self._hits[file] = genes
+        self._hits.move_to_end(file)
+
+        while len(self._hits) > self._max_entries:
+            self._hits.popitem(last=False)
+
+    def discard(self, file: Path):
+        """
+        Removes a file from the cache, if present
+        """
+        self._hits.pop(file, None)
+
+    def clear(self):
+        self._hits.clear()
+
+    def __contains__(self, file: Path) -> bool:
+        return file in self._hits
+
+    def __len__(self) -> int:
+        return len(self._hits)
@@ -0,0 +1,182 @@
+from pathlib import Path
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sample_id INTEGER PRIMARY KEY,
+    sample_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workflows (
+    workflow_id INTEGER PRIMARY KEY,
+    sample_type TEXT NOT NULL,
+    workflow TEXT NOT NULL,
+    subtype TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    sample_id INTEGER NOT NULL REFERENCES samples(sample_id),
+    workflow_id INTEGER NOT NULL REFERENCES workflows(workflow_id)
+);
+CREATE TABLE IF NOT EXISTS genes (
+    gene_id INTEGER PRIMARY KEY,
+    gene TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hits (
+    file_id INTEGER NOT NULL REFERENCES files(file_id),
+    gene_id INTEGER NOT NULL REFERENCES genes(gene_id),
+    identity REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hits_gene ON hits(gene_id);
+CREATE INDEX IF NOT EXISTS hits_file ON hits(file_id);
+CREATE VIEW IF NOT EXISTS hit_view AS
+    SELECT files.file_name, samples.sample_name, workflows.sample_type, workflows.workflow, workflows.subtype,
+           genes.gene, hits.identity
+    FROM hits
+    JOIN files ON files.file_id = hits.file_id
+    JOIN samples ON samples.sample_id = files.sample_id
+    JOIN workflows ON workflows.workflow_id = files.workflow_id
+    JOIN genes ON genes.gene_id = hits.gene_id;
+"""
+
+TABLES = ['hits', 'files', 'genes', 'workflows', 'samples']  # in the order they are emptied
+ENGINES = ['sqlite', 'duckdb']
+
+
+class HitDatabase():
+    """
+    Embedded database of the parsed hits, for questions the comparisons do not answer.
+    Samples, workflow types, genes and files are tables of their own, the hits refer to them by id,
+    hit_view joins them back into one row per hit.
+    sqlite is always available, duckdb is faster on large aggregations when it is installed
+
+    :param database_file: Path, created when missing
+    :param engine: str, sqlite or duckdb
+    """
+
+    def __init__(self, database_file: Path, engine: str = 'sqlite') -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}, use one of {ENGINES}")
+
+        Path(database_file).parent.mkdir(parents=True, exist_ok=True)
+        self.engine = engine
+        if engine == 'duckdb':
+            import duckdb
+            self._connection = duckdb.connect(str(database_file))
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self._connection.execute(statement)
+        else:
+            self._connection = sqlite3.connect(database_file)
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def load(self, hit_store, genes_to_filter=()):
+        """
+        Replaces the content of the database with the hit store, files without hits included
+
+        :param hit_store: HitStore
+        :param genes_to_filter: list: str, genes left out, eg GENES_TO_FILER
+        """
+        sample_types = list(hit_store.sample_types)
+        workflows = [sample_type.rsplit("_", maxsplit=1) for sample_type in sample_types]
+
+        keep = ~np.isin(hit_store.hit_genes, hit_store.gene_codes(genes_to_filter))
+        tables = {
+            'samples': pd.DataFrame({'sample_id': np.arange(len(hit_store.sample_names)),
+                                     'sample_name': hit_store.sample_names}),
+            'workflows': pd.DataFrame({'workflow_id': np.arange(len(sample_types)),
+                                       'sample_type': sample_types,
+                                       'workflow': [workflow[0] for workflow in workflows],
+                                       'subtype': [workflow[1] if len(workflow) > 1 else None
+                                                   for workflow in workflows]}),
+            'files': pd.DataFrame({'file_id': np.arange(len(hit_store.file_names)),
+                                   'file_name': hit_store.file_names,
+                                   'sample_id': hit_store.file_samples,
+                                   'workflow_id': hit_store.file_types}),
+            'genes': pd.DataFrame({'gene_id': np.arange(len(hit_store.genes)),
+                                   'gene': [str(gene) for gene in hit_store.genes]}),
+            'hits': pd.DataFrame({'file_id': hit_store.hit_files[keep],
+                                  'gene_id': hit_store.hit_genes[keep],
+                                  # a hit without identity is 0, the same as in the identity matrix
+                                  'identity': np.nan_to_num(hit_store.hit_identities[keep], nan=0.0)}),
+        }
+
+        for table in TABLES:
+            self._connection.execute(f"DELETE FROM {table}")
+        for table in reversed(TABLES):
+            self._insert(table, tables[table])
+        if self.engine == 'sqlite':  # duckdb commits every statement
+            self._connection.commit()
+
+    def _insert(self, table, dataframe):
+        if self.engine == 'duckdb':
+            self._connection.register('_rows', dataframe)
+            self._connection.execute(f"INSERT INTO {table} SELECT * FROM _rows")
+            self._connection.unregister('_rows')
+            return
+
+        placeholders = ", ".join("?" * len(dataframe.columns))
+        rows = dataframe.astype(object).where(dataframe.notna(), None).itertuples(index=False, name=None)
+        self._connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        """
+        :param sql: str, query on the tables or on hit_view, ? for the params
+        :param params: tuple, values of the ? in the query
+        :return: panda dataframe
+        """
+        cursor = self._connection.execute(sql, tuple(params))
+        return pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+
+    def genes_only_in(self, sample_type: str, cutoff: float = 0) -> pd.DataFrame:
+        """
+        The genes found by this workflow (type with subtype, eg WF2_AMR) and by no other
+
+        :param cutoff: identity a hit is found at
+        :return: panda dataframe, gene, samples found in, mean identity
+        """
+        return self.query("""
+            SELECT gene, COUNT(DISTINCT sample_name) AS samples, AVG(identity) AS mean_identity
+            FROM hit_view
+            WHERE identity >= ?
+            GROUP BY gene
+            HAVING COUNT(DISTINCT sample_type) = 1 AND MIN(sample_type) = ?
+            ORDER BY samples DESC, gene
+        """, (cutoff, sample_type))
+
+    def identity_distribution(self, bin_width: float = 5) -> pd.DataFrame:
+        """
+        The number of hits per workflow type and identity bin
+
+        :param bin_width: float, identity bins start at a multiple of it
+        :return: panda dataframe, sample_type, identity bin, hits
+        """
+        # a cast truncates in sqlite but rounds in duckdb
+        identity_bin = "FLOOR(identity / ?)" if self.engine == 'duckdb' else "CAST(identity / ? AS INTEGER)"
+        return self.query(f"""
+            SELECT sample_type, {identity_bin} * ? AS identity_bin, COUNT(*) AS hits
+            FROM hit_view
+            GROUP BY sample_type, identity_bin
+            ORDER BY sample_type, identity_bin
+        """, (bin_width, bin_width))
+
+    def gene_prevalence(self, cutoff: float = 0) -> pd.DataFrame:
+        """
+        The number of samples each workflow type found each gene in
+
+        :param cutoff: identity a hit is found at
+        :return: panda dataframe, gene, sample_type, samples
+        """
+        return self.query("""
+            SELECT gene, sample_type, COUNT(DISTINCT sample_name) AS samples
+            FROM hit_view
+            WHERE identity >= ?
+            GROUP BY gene, sample_type
+            ORDER BY gene, sample_type
+        """, (cutoff,))
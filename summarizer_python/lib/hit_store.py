@@ -0,0 +1,423 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class HitStore:
+    """
+    Long format store of all gene hits.
+    Files, samples, workflow types and genes are stored once and referred to by an integer code,
+    every hit is one (file, gene, identity) row. Memory scales with the number of hits,
+    the gene x sample matrices are only build when asked for.
+    """
+
+    def __init__(self) -> None:
+        self.file_names = []
+        self.sample_names = []
+        self.sample_types = []
+        self.genes = []
+
+        self._file_index = {}
+        self._sample_index = {}
+        self._type_index = {}
+        self._gene_index = {}
+        self._canonical_genes = 0  # the first genes are merged by normalise_genes already
+
+        # per file
+        self._file_sample = array('i')
+        self._file_type = array('i')
+
+        # per hit
+        self._hit_file = array('i')
+        self._hit_gene = array('i')
+        self._hit_identity = array('d')
+
+        self._arrays = None
+
+    @classmethod
+    def _code(cls, index, labels, value):
+        """
+        Retrieves the code of a value, adds the value when it is new
+
+        :param index: dict: value: code
+        :param labels: list: values, position is the code
+        :param value: str
+        :return: int: code
+        """
+        code = index.get(value)
+        if code is None:
+            code = len(labels)
+            index[value] = code
+            labels.append(value)
+
+        return code
+
+    def add_file(self, file_name, sample_name, sample_type, genes):
+        """
+        Adds the hits of one file
+
+        :param file_name: str, name of the file, used as column name
+        :param sample_name: str, eq SRX6855211_SRR10127028
+        :param sample_type: str, workflow type with subtype
+        :param genes: dict: gene: identity
+        :return: int: code of the file
+        """
+        if file_name in self._file_index:
+            raise ValueError(f"file {file_name} is already in the hit store")
+
+        file_code = self._code(self._file_index, self.file_names, file_name)
+        self._file_sample.append(self._code(self._sample_index, self.sample_names, sample_name))
+        self._file_type.append(self._code(self._type_index, self.sample_types, sample_type))
+
+        for gene, identity in genes.items():
+            self._hit_file.append(file_code)
+            self._hit_gene.append(self._code(self._gene_index, self.genes, gene))
+            self._hit_identity.append(identity)
+
+        self._arrays = None
+        return file_code
+
+    def update_files(self, files):
+        """
+        Adds new files and replaces the hits of files already in the store, in one pass over the hits
+
+        :param files: list: tuple: file_name, sample_name, sample_type, dict: gene: identity
+        :return: list: int, codes of the files
+        """
+        replaced = [self._file_index[file_name] for file_name, *_ in files if file_name in self._file_index]
+        if replaced:
+            keep = ~np.isin(self.hit_files, replaced)
+            self._hit_file = array('i', self.hit_files[keep].tolist())
+            self._hit_gene = array('i', self.hit_genes[keep].tolist())
+            self._hit_identity = array('d', self.hit_identities[keep].tolist())
+            self._arrays = None
+
+        file_codes = []
+        for file_name, sample_name, sample_type, genes in files:
+            file_code = self._file_index.get(file_name)
+            if file_code is None:
+                file_codes.append(self.add_file(file_name, sample_name, sample_type, genes))
+                continue
+
+            for gene, identity in genes.items():
+                self._hit_file.append(file_code)
+                self._hit_gene.append(self._code(self._gene_index, self.genes, gene))
+                self._hit_identity.append(identity)
+            file_codes.append(file_code)
+
+        self._arrays = None
+        return file_codes
+
+    def normalise_genes(self, normaliser):
+        """
+        Merges the genes with the same canonical name into one gene, in place.
+        A file hitting more genes of one canonical name keeps the highest identity.
+        The original names keep referring to their merged gene, files added later can be normalised again,
+        only their new genes are normalised then
+
+        :param normaliser: GeneNormaliser
+        :return: int, number of genes removed by merging
+        """
+        n_genes = len(self.genes)
+        names, mapping = normaliser.codes(self.genes, canonical_genes=self._canonical_genes)
+        if len(names) == n_genes and all(name == gene for name, gene in zip(names, self.genes)):
+            self._canonical_genes = n_genes
+            return 0
+
+        hit_file = self.hit_files
+        hit_gene = mapping[self.hit_genes]
+        hit_identity = self.hit_identities
+
+        # keeps the highest identity per file and merged gene
+        order = np.lexsort((-hit_identity, hit_gene, hit_file))
+        hit_file, hit_gene, hit_identity = hit_file[order], hit_gene[order], hit_identity[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (hit_file[1:] != hit_file[:-1]) | (hit_gene[1:] != hit_gene[:-1])
+
+        self._hit_file = array('i', hit_file[first].tolist())
+        self._hit_gene = array('i', hit_gene[first].tolist())
+        self._hit_identity = array('d', hit_identity[first].tolist())
+
+        self._gene_index = {gene: int(mapping[code]) for gene, code in self._gene_index.items()}
+        self._gene_index.update((name, code) for code, name in enumerate(names))
+        self.genes = names
+        self._canonical_genes = len(names)
+
+        self._arrays = None
+        return n_genes - len(names)
+
+    def to_arrays(self):
+        """
+        :return: dict: name: numpy array, the labels as unicode arrays and the codes, see from_arrays
+        """
+        arrays = {name: np.array([str(label) for label in labels], dtype=str)
+                  for name, labels in [('file_names', self.file_names), ('sample_names', self.sample_names),
+                                       ('sample_types', self.sample_types), ('genes', self.genes)]}
+        arrays.update(self._get_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Builds a hit store from its labels and codes without adding the files one by one
+
+        :param arrays: dict: name: numpy array, as to_arrays returns them
+        :return: HitStore
+        """
+        hit_store = cls()
+        for name, index in [('file_names', '_file_index'), ('sample_names', '_sample_index'),
+                            ('sample_types', '_type_index'), ('genes', '_gene_index')]:
+            labels = [str(label) for label in arrays[name]]
+            setattr(hit_store, name, labels)
+            setattr(hit_store, index, {label: code for code, label in enumerate(labels)})
+
+        hit_store._file_sample = array('i', np.asarray(arrays['file_sample'], dtype=np.int32).tolist())
+        hit_store._file_type = array('i', np.asarray(arrays['file_type'], dtype=np.int32).tolist())
+        hit_store._hit_file = array('i', np.asarray(arrays['hit_file'], dtype=np.int32).tolist())
+        hit_store._hit_gene = array('i', np.asarray(arrays['hit_gene'], dtype=np.int32).tolist())
+        hit_store._hit_identity = array('d', np.asarray(arrays['hit_identity'], dtype=np.float64).tolist())
+        return hit_store
+
+    @classmethod
+    def merge(cls, hit_stores, file_order):
+        """
+        Combines hit stores of different files into one, vectorized per store.
+        The files are put in file_order and the samples, types and genes coded in the order they first
+        appear, so the result equals a hit store the files were added to one by one in that order
+
+        :param hit_stores: list: HitStore, no file may be in more than one
+        :param file_order: list: str, the file names in the order of the merged store, files not in it are left out
+        :return: HitStore
+        """
+        position = {file_name: code for code, file_name in enumerate(file_order)}
+        if len(position) != len(file_order):
+            raise ValueError("file_order has duplicate files")
+
+        parts = {name: [] for name in ['file_sample', 'file_type', 'hit_file', 'hit_gene', 'hit_identity']}
+        labels = {'sample_names': [], 'sample_types': [], 'genes': []}
+        offsets = dict.fromkeys(labels, 0)
+        n_files = len(file_order)
+        file_sample = np.full(n_files, -1, dtype=np.int64)
+        file_type = np.full(n_files, -1, dtype=np.int64)
+
+        for hit_store in hit_stores:
+            # codes of this store in the merged order, -1 when the file is left out
+            file_positions = np.array([position.get(file_name, -1) for file_name in hit_store.file_names],
+                                      dtype=np.int64)
+            kept = file_positions >= 0
+            if (file_sample[file_positions[kept]] >= 0).any():
+                raise ValueError("a file is in more than one hit store")
+
+            file_sample[file_positions[kept]] = hit_store.file_samples[kept] + offsets['sample_names']
+            file_type[file_positions[kept]] = hit_store.file_types[kept] + offsets['sample_types']
+
+            hit_kept = kept[hit_store.hit_files]
+            parts['hit_file'].append(file_positions[hit_store.hit_files[hit_kept]])
+            parts['hit_gene'].append(hit_store.hit_genes[hit_kept] + offsets['genes'])
+            parts['hit_identity'].append(hit_store.hit_identities[hit_kept])
+
+            for name in labels:
+                labels[name].extend(getattr(hit_store, name))
+                offsets[name] += len(getattr(hit_store, name))
+
+        if (file_sample < 0).any():
+            missing = [file_order[code] for code in np.flatnonzero(file_sample < 0)]
+            raise ValueError(f"files not in any hit store: {missing[:5]}")
+
+        hit_file = np.concatenate(parts['hit_file']) if hit_stores else np.zeros(0, dtype=np.int64)
+        hit_gene = np.concatenate(parts['hit_gene']) if hit_stores else np.zeros(0, dtype=np.int64)
+        hit_identity = np.concatenate(parts['hit_identity']) if hit_stores else np.zeros(0, dtype=np.float64)
+
+        # the hits in file order, a file keeps the order of its genes
+        order = np.argsort(hit_file, kind='stable')
+        hit_file, hit_gene, hit_identity = hit_file[order], hit_gene[order], hit_identity[order]
+
+        arrays = {'file_names': np.array(file_order, dtype=str), 'hit_file': hit_file, 'hit_identity': hit_identity}
+        for name, codes, code_name in [('sample_names', file_sample, 'file_sample'),
+                                       ('sample_types', file_type, 'file_type'),
+                                       ('genes', hit_gene, 'hit_gene')]:
+            arrays[name], arrays[code_name] = cls._first_seen_codes(np.array(labels[name], dtype=str)[codes])
+
+        return cls.from_arrays(arrays)
+
+    @classmethod
+    def _first_seen_codes(cls, values):
+        """
+        :param values: numpy array: labels
+        :return: tuple: numpy array labels in the order they first appear, numpy array code per value
+        """
+        if not len(values):
+            return values, np.zeros(0, dtype=np.int32)
+
+        labels, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        codes = np.empty(len(labels), dtype=np.int32)
+        codes[order] = np.arange(len(labels), dtype=np.int32)
+        return labels[order], codes[inverse]
+
+    def _get_arrays(self):
+        """
+        :return: dict: name: numpy array, of the per file and per hit columns
+        """
+        if self._arrays is None:
+            self._arrays = {'file_sample': np.array(self._file_sample, dtype=np.int32),
+                            'file_type': np.array(self._file_type, dtype=np.int32),
+                            'hit_file': np.array(self._hit_file, dtype=np.int32),
+                            'hit_gene': np.array(self._hit_gene, dtype=np.int32),
+                            'hit_identity': np.array(self._hit_identity, dtype=np.float64)}
+        return self._arrays
+
+    @property
+    def file_samples(self):
+        """
+        :return: numpy array: sample code per file
+        """
+        return self._get_arrays()['file_sample']
+
+    @property
+    def file_types(self):
+        """
+        :return: numpy array: sample type code per file
+        """
+        return self._get_arrays()['file_type']
+
+    @property
+    def hit_files(self):
+        return self._get_arrays()['hit_file']
+
+    @property
+    def hit_genes(self):
+        return self._get_arrays()['hit_gene']
+
+    @property
+    def hit_identities(self):
+        return self._get_arrays()['hit_identity']
+
+    def gene_codes(self, genes):
+        """
+        :param genes: list: str, genes, unknown genes are skipped
+        :return: numpy array: codes of the genes
+        """
+        return np.array([self._gene_index[gene] for gene in genes if gene in self._gene_index], dtype=np.int32)
+
+    def hit_counts(self, excluded_gene_codes=None):
+        """
+        :param excluded_gene_codes: numpy array: codes of genes not counted, eg the '-' placeholder
+        :return: numpy array: number of hits per file
+        """
+        hit_files = self.hit_files
+        if excluded_gene_codes is not None:
+            hit_files = hit_files[~np.isin(self.hit_genes, excluded_gene_codes)]
+        return np.bincount(hit_files, minlength=len(self.file_names))
+
+    def genes_of_files(self, file_codes):
+        """
+        :param file_codes: numpy array: codes of the files
+        :return: numpy array: sorted codes of the genes hit in the files
+        """
+        return np.unique(self.hit_genes[np.isin(self.hit_files, file_codes)])
+
+    def to_long(self):
+        """
+        Converts the hits to a long format dataframe with categorical columns
+
+        :return: panda dataframe, columns: file, sample, workflow_type, gene, identity
+        """
+        hit_files = self.hit_files
+        return pd.DataFrame({
+            'file': pd.Categorical.from_codes(hit_files, categories=self.file_names),
+            'sample': pd.Categorical.from_codes(self.file_samples[hit_files], categories=self.sample_names),
+            'workflow_type': pd.Categorical.from_codes(self.file_types[hit_files], categories=self.sample_types),
+            'gene': pd.Categorical.from_codes(self.hit_genes, categories=self.genes),
+            'identity': self.hit_identities})
+
+    def _positions(self, file_codes, gene_codes):
+        """
+        Maps the hits to their position in a gene x file matrix
+
+        :param file_codes: numpy array: codes of the files, the column order
+        :param gene_codes: numpy array: codes of the genes, the row order
+        :return: tuple: numpy array rows, numpy array columns, numpy array bool hits in the matrix
+        """
+        file_codes = np.asarray(file_codes, dtype=np.int32)
+        gene_codes = np.asarray(gene_codes, dtype=np.int32)
+
+        # maps the codes to the matrix positions, -1 is not selected
+        column = np.full(len(self.file_names), -1, dtype=np.int64)
+        column[file_codes] = np.arange(len(file_codes))
+        row = np.full(len(self.genes), -1, dtype=np.int64)
+        row[gene_codes] = np.arange(len(gene_codes))
+
+        hit_columns = column[self.hit_files]
+        hit_rows = row[self.hit_genes]
+        selected = (hit_columns >= 0) & (hit_rows >= 0)
+
+        return hit_rows[selected], hit_columns[selected], selected
+
+    def matrix(self, file_codes, gene_codes, as_sparse=False):
+        """
+        Pivots the hits of the files into a gene x file matrix in one vectorized step,
+        genes not hit in a file and hits without an identity are 0
+
+        :param file_codes: numpy array: codes of the files, the column order
+        :param gene_codes: numpy array: codes of the genes, the row order
+        :param as_sparse: bool, returns a scipy csr matrix instead of a dense numpy array
+        :return: numpy array or scipy csr matrix, genes x files
+        """
+        rows, columns, selected = self._positions(file_codes, gene_codes)
+        shape = (len(gene_codes), len(file_codes))
+        identities = np.nan_to_num(self.hit_identities[selected], nan=0.0)  # a hit without identity counts as 0
+
+        if as_sparse:
+            from scipy import sparse
+            return sparse.csr_matrix((identities, (rows, columns)), shape=shape)
+
+        values = np.zeros(shape, dtype=np.float64)
+        values[rows, columns] = identities
+        return values
+
+    def hit_matrix(self, file_codes, gene_codes):
+        """
+        The gene x file matrix of the genes hit in a file, whatever the identity of the hit
+
+        :param file_codes: numpy array: codes of the files, the column order
+        :param gene_codes: numpy array: codes of the genes, the row order
+        :return: numpy array bool, genes x files
+        """
+        rows, columns, _ = self._positions(file_codes, gene_codes)
+
+        hits = np.zeros((len(gene_codes), len(file_codes)), dtype=bool)
+        hits[rows, columns] = True
+        return hits
+
+    def binary_matrices(self, file_codes, gene_codes, cutoffs):
+        """
+        Builds the present / absent gene x file matrix for every identity cutoff at once,
+        by broadcasting the identities of the hits against all cutoffs
+
+        :param file_codes: numpy array: codes of the files, the column order
+        :param gene_codes: numpy array: codes of the genes, the row order
+        :param cutoffs: list: identity cutoffs, a hit at or above the cutoff is present
+        :return: numpy array bool, cutoffs x genes x files
+        """
+        rows, columns, selected = self._positions(file_codes, gene_codes)
+        cutoffs = np.asarray(cutoffs, dtype=np.float64)
+
+        present = self.hit_identities[selected][np.newaxis, :] >= cutoffs[:, np.newaxis]
+
+        matrices = np.zeros((len(cutoffs), len(gene_codes), len(file_codes)), dtype=bool)
+        matrices[:, rows, columns] = present
+        return matrices
+
+    def to_frame(self, file_codes, gene_codes):
+        """
+        Builds the gene x file dataframe, rows are genes, columns are file names
+
+        :param file_codes: numpy array: codes of the files, the column order
+        :param gene_codes: numpy array: codes of the genes, the row order
+        :return: panda dataframe
+        """
+        return pd.DataFrame(self.matrix(file_codes, gene_codes),
+                            index=[self.genes[code] for code in gene_codes],
+                            columns=[self.file_names[code] for code in file_codes])
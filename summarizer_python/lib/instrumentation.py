@@ -0,0 +1,151 @@
+import cProfile
+import heapq
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource  # unix only
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # optional, peak memory on windows
+except ImportError:
+    psutil = None
+
+
+def _peak_rss_mb(children=False):
+    """
+    :param children: bool, the peak of the largest finished child process (eg a parse worker) instead of this one
+    :return: float, peak resident memory in MB, None when the platform does not tell
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':  # bytes on macOS, kilobytes on linux
+            return round(peak / 1024 ** 2, 1)
+        return round(peak / 1024, 1)
+
+    if psutil is not None and not children:
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)  # windows
+        if peak is not None:
+            return round(peak / 1024 ** 2, 1)
+
+    return None
+
+
+class RunReport:
+    """
+    Records the wall time, cpu time and peak memory per stage of a run
+    and the slowest files to parse, written out as a json report.
+
+    :param slowest_files: int, number of slowest files kept
+    :param profile: bool, runs cProfile over the whole run, written next to the report
+    :param trace_memory: bool, traces the python memory peak per stage with tracemalloc, slower
+    """
+
+    def __init__(self, slowest_files=20, profile=False, trace_memory=False) -> None:
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._slowest_files_count = slowest_files
+        self._slowest_files = []  # heap of (seconds, file)
+        self._files_parsed = 0
+        self._parse_seconds = 0.0
+
+        self.stages = []
+
+        self._profiler = None
+        if profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the code in the with block
+
+        :param name: str, name of the stage, a name can be used more than once
+        """
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {'stage': name,
+                      'wall_seconds': round(time.perf_counter() - start, 4),
+                      'cpu_seconds': round(time.process_time() - start_cpu, 4),
+                      'peak_rss_mb': _peak_rss_mb(),
+                      'peak_rss_children_mb': _peak_rss_mb(children=True)}
+            if self._trace_memory:
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+
+            self.stages.append(record)
+
+    def record_file(self, file, seconds):
+        """
+        Records the parse time of a file, only the slowest files are kept
+
+        :param file: Path
+        :param seconds: float
+        """
+        self._files_parsed += 1
+        self._parse_seconds += seconds
+
+        item = (seconds, str(file))
+        if len(self._slowest_files) < self._slowest_files_count:
+            heapq.heappush(self._slowest_files, item)
+        else:
+            heapq.heappushpop(self._slowest_files, item)
+
+    def to_dict(self):
+        """
+        :return: dict, the report
+        """
+        return {'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'pid': os.getpid(),
+                'wall_seconds': round(time.perf_counter() - self._start, 4),
+                'cpu_seconds': round(time.process_time() - self._start_cpu, 4),
+                'peak_rss_mb': _peak_rss_mb(),
+                'peak_rss_children_mb': _peak_rss_mb(children=True),
+                'stages': self.stages,
+                'files_parsed': self._files_parsed,
+                'parse_seconds': round(self._parse_seconds, 4),
+                'slowest_files': [{'file': file, 'seconds': round(seconds, 4)}
+                                  for seconds, file in sorted(self._slowest_files, reverse=True)]}
+
+    def write(self, file_name):
+        """
+        Writes the report as json, with profiling the cProfile stats are written to <file_name>.prof
+        and the top functions are added to the report
+
+        :param file_name: Path
+        """
+        file_name = Path(file_name)
+        file_name.parent.mkdir(parents=True, exist_ok=True)
+        report = self.to_dict()
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(file_name.with_suffix('.prof'))
+
+            stats_text = io.StringIO()
+            pstats.Stats(self._profiler, stream=stats_text).sort_stats('cumulative').print_stats(30)
+            report['profile_top'] = stats_text.getvalue().splitlines()
+            self._profiler.enable()
+
+        with open(file_name, 'w') as fp:
+            json.dump(report, fp, indent=2)
@@ -0,0 +1,156 @@
+from bioblend import ConnectionError
+from datetime import datetime, timezone
+import threading
+import time
+
+# paused jobs wait on a failed input, they only run again when a user resumes them
+TERMINAL_STATES = ('ok', 'error', 'deleted', 'failed', 'skipped', 'paused')
+
+
+class JobMonitor():
+    """
+    Follows many Galaxy jobs at once with one job listing per polling cycle.
+
+    The polling interval starts at min_interval, is multiplied by backoff after every cycle
+    in which no job changed state (up to max_interval) and drops back to min_interval as soon as one did.
+    A job is finished in one of the TERMINAL_STATES, its callback is called right away,
+    so the next step of a sample can start without waiting for the other samples.
+
+    :param galaxy_api: GalaxyApi, its instance and rate limit are used
+    :param min_interval: float, seconds between polls while jobs are changing
+    :param max_interval: float, longest wait between polls
+    :param backoff: float, factor the interval grows with when nothing changed
+    :param page_size: int, jobs per listing request
+    :param sleep: function used to wait, replaceable for tests
+    """
+
+    def __init__(self, galaxy_api, min_interval: float = 5, max_interval: float = 120, backoff: float = 2.0,
+                 page_size: int = 500, sleep=time.sleep) -> None:
+        self._galaxy_api = galaxy_api
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._page_size = page_size
+        self._sleep = sleep
+
+        self._lock = threading.Lock()
+        self._pending = {}  # job_id: callback
+        self._unseen = set()  # jobs not seen in a listing yet
+        self._since = None  # oldest date a pending job was added
+        self.states = {}  # job_id: last known state
+        self.polls = 0
+
+    def add(self, job_ids: list[str], on_finished=None):
+        """
+        Starts following jobs, can be called while wait is running.
+        A finished job added again is reported again
+
+        :param job_ids: list: str
+        :param on_finished: function called with the job dict when a job reaches a terminal state
+        """
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        with self._lock:
+            for job_id in job_ids:
+                self._pending[job_id] = on_finished
+                self._unseen.add(job_id)
+                self.states[job_id] = 'new'
+            if self._since is None or today < self._since:
+                self._since = today
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout: float = None) -> dict:
+        """
+        Polls until all jobs are finished or the timeout passed.
+        A poll failing on a connection error is tried again after the next interval
+
+        :param timeout: float, seconds, None waits forever
+        :return: dict: job_id: state, jobs that did not finish keep their last known state
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self._min_interval
+
+        while self.pending():
+            try:
+                changed = self._poll()
+            except ConnectionError as error:  # the next poll tries again
+                print(f"job poll failed: {error}")
+                changed = 0
+
+            if changed:
+                interval = self._min_interval
+            else:
+                interval = min(interval * self._backoff, self._max_interval)
+
+            if not self.pending():
+                break
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                interval = min(interval, remaining)
+
+            self._sleep(interval)
+
+        return dict(self.states)
+
+    def _poll(self) -> int:
+        """
+        Updates the states of the pending jobs from the job listing.
+        Jobs not in the listing at their first poll (finished before the date filter) are asked for once
+
+        :return: int, number of jobs that changed state
+        """
+        with self._lock:
+            since = self._since
+            unseen = set(self._unseen)
+
+        self.polls += 1
+        jobs = {job['id']: job for job in self._list_jobs(since)}
+
+        galaxy_instance = self._galaxy_api.galaxy_instance
+        for job_id in unseen - jobs.keys():
+            jobs[job_id] = self._galaxy_api.call(galaxy_instance.jobs.show_job, job_id=job_id)
+
+        changed = 0
+        finished = []
+        with self._lock:
+            self._unseen -= unseen
+            for job_id, job in jobs.items():
+                if job_id not in self._pending or self.states.get(job_id) == job['state']:
+                    continue
+
+                changed += 1
+                self.states[job_id] = job['state']
+                if job['state'] in TERMINAL_STATES:
+                    finished.append((self._pending.pop(job_id), job))
+
+        for on_finished, job in finished:  # outside the lock, callbacks may add jobs
+            if on_finished is not None:
+                on_finished(job)
+
+        return changed
+
+    def _list_jobs(self, since: str) -> list[dict]:
+        """
+        Lists the jobs updated since the date, newest first, page by page
+
+        :param since: str, YYYY-MM-DD
+        :return: list: dict, job summaries
+        """
+        galaxy_instance = self._galaxy_api.galaxy_instance
+
+        jobs = []
+        offset = 0
+        while True:
+            page = self._galaxy_api.call(galaxy_instance.jobs.get_jobs,
+                                         date_range_min=since,
+                                         limit=self._page_size,
+                                         offset=offset)
+            jobs.extend(page)
+            if len(page) < self._page_size:
+                return jobs
+            offset += self._page_size
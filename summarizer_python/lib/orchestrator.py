@@ -0,0 +1,257 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import shutil
+import threading
+
+from lib.job_monitor import JobMonitor, TERMINAL_STATES
+from lib.run_manifest import RunManifest, SUBMITTED, DOWNLOADING, DONE, FAILED
+
+# amr databases of the stec pipeline: subtype in the result file names
+OUTPUT_SUBTYPES = {'resfinder': 'resfinder',
+                   'argannot': 'argannot',
+                   'card': 'card',
+                   'ncbi': 'ncbi',
+                   'pointfinder': 'pointfinder'}
+
+
+class Orchestrator():
+    """
+    Runs samples end to end: submits them, follows their jobs and downloads the amr results
+    into data_dir as <sample>_<workflow>_<subtype>.tsv, the layout the SampleOrganiser reads.
+
+    Progress is kept in a sqlite RunManifest. A rerun with the same manifest does not submit
+    samples again, only follows their unfinished jobs and downloads what is missing.
+
+    :param galaxy_api: GalaxyApi
+    :param manifest_file: Path, sqlite manifest of the run
+    :param data_dir: Path, directory the results are written to
+    :param workflow: str, workflow part of the result file names, eg WF1
+    :param output_subtypes: dict: str found in the output name: subtype, outputs without a match are skipped
+    :param max_workers: int, number of samples submitted at the same time
+    :param download_workers: int, number of results downloaded at the same time
+    """
+
+    def __init__(self, galaxy_api, manifest_file: Path, data_dir: Path, workflow: str,
+                 output_subtypes: dict = None, max_workers: int = 4, download_workers: int = 4) -> None:
+        self._galaxy_api = galaxy_api
+        self._manifest = RunManifest(manifest_file)
+        self._partial_dir = Path(manifest_file).parent / 'partial_downloads'  # outside data_dir, never indexed
+        self._data_dir = Path(data_dir)
+        self._workflow = workflow
+        self._output_subtypes = OUTPUT_SUBTYPES if output_subtypes is None else output_subtypes
+        self._max_workers = max_workers
+        self._download_executor = ThreadPoolExecutor(max_workers=download_workers)
+
+        self._lock = threading.Lock()
+        self._downloads = []  # (sample_name, future)
+        self._job_samples = {}  # job_id: sample_name
+        self._cohort_jobs = {}  # job_id: (history_id, read_list_id), cohort jobs without a sample yet
+        self._monitor = None
+        self._on_sample_done = None
+
+    def run(self, samples: dict, timeout: float = None, min_interval: float = 5, max_interval: float = 120,
+            on_sample_done=None, cohort_name: str = None) -> dict:
+        """
+        Submits the samples not in the manifest yet, waits for all jobs and downloads the results
+
+        :param samples: dict: sample_name: list: Path, reads of the sample
+        :param timeout: float, seconds to wait for the jobs, None waits forever
+        :param min_interval: float, seconds between job polls while jobs are changing
+        :param max_interval: float, longest wait between job polls
+        :param on_sample_done: function called with the sample name and state when a sample is done or failed
+        :param cohort_name: str, submits the new samples together as one list:paired collection in a history
+                            of this name, None submits every sample in its own history
+        :return: dict: sample_name: state, for all samples in the manifest
+        """
+        self._on_sample_done = on_sample_done
+        self._data_dir.mkdir(parents=True, exist_ok=True)
+        self._partial_dir.mkdir(parents=True, exist_ok=True)
+
+        known_samples = self._manifest.samples()
+        new_samples = {sample_name: sample_paths for sample_name, sample_paths in samples.items()
+                       if sample_name not in known_samples}
+        if cohort_name is not None:
+            self._submit_cohort(cohort_name, new_samples)
+        else:
+            self._submit(new_samples)
+
+        self._job_samples = self._manifest.job_samples()
+
+        monitor = JobMonitor(galaxy_api=self._galaxy_api, min_interval=min_interval, max_interval=max_interval)
+        self._monitor = monitor
+        self._cohort_jobs = self._manifest.cohort_jobs()
+        monitor.add(list(self._cohort_jobs), on_finished=self._cohort_job_finished)
+        for sample_name, state in self._manifest.samples().items():
+            if state == SUBMITTED:
+                pending = [job_id for job_id, job_state in self._manifest.jobs(sample_name).items()
+                           if job_state not in TERMINAL_STATES]
+                monitor.add(pending, on_finished=self._job_finished)
+                self._check_sample(sample_name)  # all jobs finished before an interruption
+            elif state == DOWNLOADING:
+                self._start_download(sample_name)
+
+        monitor.wait(timeout=timeout)
+
+        for sample_name, future in list(self._downloads):
+            if future.exception() is not None:
+                print(f"{sample_name}: download failed, continued on the next run: {future.exception()}")
+
+        return self._manifest.samples()
+
+    def close(self):
+        self._download_executor.shutdown()
+        self._manifest.close()
+
+    def _submit(self, samples: dict):
+        """
+        Submits the samples concurrently, every submitted sample is recorded right away.
+        A sample that fails to submit is not recorded, so the next run submits it again
+        """
+        if not samples:
+            return
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self._galaxy_api.run_sample, sample_name, sample_paths): sample_name
+                       for sample_name, sample_paths in samples.items()}
+
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    print(f"{futures[future]}: submission failed, submitted again on the next run: "
+                          f"{future.exception()}")
+                    continue
+
+                result = future.result()
+                self._manifest.add_sample(sample_name=result['sample_name'],
+                                          history_id=result['history_id'],
+                                          job_ids=result['job_ids'])
+
+    def _submit_cohort(self, cohort_name: str, samples: dict):
+        """
+        Submits the samples as one cohort, all samples share the history.
+        When the cohort fails to submit no sample is recorded, so the next run submits them again.
+        The jobs get their sample once they finished, see _cohort_job_finished
+        """
+        if not samples:
+            return
+
+        try:
+            result = self._galaxy_api.run_cohort(cohort_name=cohort_name, samples=samples,
+                                                 max_workers=self._max_workers)
+        except Exception as error:
+            print(f"{cohort_name}: submission failed, submitted again on the next run: {error}")
+            return
+
+        self._manifest.add_cohort(history_id=result['history_id'], read_list_id=result['read_list_id'],
+                                  sample_names=list(samples), job_ids=result['job_ids'])
+
+    def _cohort_job_finished(self, job: dict):
+        """
+        Finds the sample of a finished cohort job, a lookup that fails is tried again at the next poll.
+        Once all jobs of the cohort have their sample, the samples that did not get a job are forgotten,
+        so the next run submits them again
+        """
+        history_id, read_list_id = self._cohort_jobs[job['id']]
+        try:
+            sample_name = self._galaxy_api.job_sample(history_id, read_list_id, job['id'])
+        except Exception as error:
+            print(f"job {job['id']}: sample lookup failed, tried again: {error}")
+            self._monitor.add([job['id']], on_finished=self._cohort_job_finished)
+            return
+
+        self._manifest.assign_job(job['id'], sample_name, job['state'])
+        del self._cohort_jobs[job['id']]
+        if sample_name is None:
+            print(f"job {job['id']}: no read of the cohort as input, skipped")
+        else:
+            self._job_samples[job['id']] = sample_name
+
+        if not self._manifest.cohort_jobs(history_id):
+            for sample_without_job in self._manifest.samples_without_jobs(history_id):
+                print(f"{sample_without_job}: no job in its cohort, submitted again on the next run")
+                self._manifest.remove_sample(sample_without_job)
+
+        if sample_name is not None:
+            self._check_sample(sample_name)
+
+    def _job_finished(self, job: dict):
+        self._manifest.set_job_state(job['id'], job['state'])
+        self._check_sample(self._job_samples[job['id']])
+
+    def _check_sample(self, sample_name: str):
+        """
+        Starts the download of a sample when all its jobs are ok, fails it when a job did not end ok
+        """
+        job_states = self._manifest.jobs(sample_name).values()
+        if not job_states:  # a cohort sample whose job did not finish yet
+            return
+        if not all(state in TERMINAL_STATES for state in job_states):
+            return
+
+        if all(state == 'ok' for state in job_states):
+            self._manifest.set_sample_state(sample_name, DOWNLOADING)
+            self._start_download(sample_name)
+        else:
+            self._sample_done(sample_name, FAILED)
+
+    def _start_download(self, sample_name: str):
+        with self._lock:
+            self._downloads.append((sample_name, self._download_executor.submit(self._download_sample, sample_name)))
+
+    def _download_sample(self, sample_name: str):
+        """
+        Downloads the amr outputs of all jobs of the sample that are not downloaded yet.
+        When a download fails the sample stays downloading, the next run continues it
+        """
+        galaxy_instance = self._galaxy_api.galaxy_instance
+        downloaded = self._manifest.downloads(sample_name)
+        file_names = set(downloaded.values())
+
+        for job_id in self._manifest.jobs(sample_name):
+            job = self._galaxy_api.call(galaxy_instance.jobs.show_job, job_id=job_id)
+
+            for output_name, output in job.get('outputs', {}).items():
+                if output['id'] in downloaded:
+                    continue
+
+                dataset = self._galaxy_api.call(galaxy_instance.datasets.show_dataset, dataset_id=output['id'])
+                subtype = self._get_subtype(f"{output_name} {dataset.get('name', '')}")
+                if subtype is None:
+                    continue
+
+                file_name = self._data_dir / f"{sample_name}_{self._workflow}_{subtype}.tsv"
+                if str(file_name) in file_names:  # the first output of a subtype is kept
+                    continue
+
+                file_names.add(str(file_name))
+                self._download_dataset(output['id'], file_name)
+                self._manifest.add_download(output['id'], sample_name, file_name, file_name.stat().st_size)
+
+        self._sample_done(sample_name, DONE)
+
+    def _download_dataset(self, dataset_id: str, file_name: Path):
+        """
+        Streams the dataset to a temporary file outside the data directory, moved in when complete
+        so a half downloaded file is never read as a result
+        """
+        temporary_file = self._partial_dir / f"{dataset_id}.part"
+        self._galaxy_api.call(self._galaxy_api.galaxy_instance.datasets.download_dataset,
+                              dataset_id=dataset_id,
+                              file_path=str(temporary_file),
+                              use_default_filename=False)
+        shutil.move(temporary_file, file_name)
+
+    def _get_subtype(self, output_name: str) -> str:
+        """
+        :param output_name: str, name of the output and dataset
+        :return: str, subtype of the first matching key, None without a match
+        """
+        output_name = output_name.lower()
+        for key, subtype in self._output_subtypes.items():
+            if key in output_name:
+                return subtype
+        return None
+
+    def _sample_done(self, sample_name: str, state: str):
+        self._manifest.set_sample_state(sample_name, state)
+        if self._on_sample_done is not None:
+            self._on_sample_done(sample_name, state)
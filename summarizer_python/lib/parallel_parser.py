@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lib.result_parser import extract_genes_from_file
+
+
+def _timed_extract(file, quality_passed, quality_failed):
+    """
+    Parses a file and measures how long it took
+
+    :return: tuple: dict: gene: identity, float seconds
+    """
+    start = time.perf_counter()
+    genes = extract_genes_from_file(file, quality_passed=quality_passed, quality_failed=quality_failed)
+    return genes, time.perf_counter() - start
+
+
+def parse_files(files, quality_passed, quality_failed, workers=None, chunksize=16, with_times=False):
+    """
+    Parses the files over a process pool.
+    The workers only send back the gene: identity dicts, not the data frames.
+    The results are in the same order as the files, independent of which worker finishes first
+
+    :param files: list: Path, files to parse
+    :param quality_passed: identity given to genes of a passed quality module
+    :param quality_failed: identity given to genes of a failed quality module
+    :param workers: int, number of processes, None uses all cores
+    :param chunksize: int, number of files send to a worker at once
+    :param with_times: bool, returns (genes, parse seconds) per file
+    :return: list: dict: gene: identity, one per file
+    """
+    files = list(files)
+    parse = partial(_timed_extract if with_times else extract_genes_from_file,
+                    quality_passed=quality_passed, quality_failed=quality_failed)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+
+    if workers <= 1 or len(files) <= chunksize:  # not worth starting a pool
+        return [parse(file) for file in files]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse, files, chunksize=chunksize))
@@ -0,0 +1,190 @@
+import io
+
+import pandas as pd
+
+DELIMITERS = ['\t', ',', ';']
+
+
+class ResultParser:
+    """
+    Parses the result table of one tool format.
+    Only the columns needed are read from the file.
+
+    :param name: str, name of the format
+    :param gene_column: str, column with the gene names
+    :param identity_column: str, column with the identities, None when the format has no identity
+    :param required_columns: list: str, extra columns that identify the format
+    """
+
+    def __init__(self, name, gene_column, identity_column=None, required_columns=()):
+        self.name = name
+        self.gene_column = gene_column
+        self.identity_column = identity_column
+        self.required_columns = list(required_columns)
+
+    @property
+    def usecols(self):
+        """
+        :return: list: str, columns loaded from the file
+        """
+        if self.identity_column is None:
+            return [self.gene_column]
+        return [self.gene_column, self.identity_column]
+
+    @property
+    def dtype(self):
+        """
+        :return: dict: column: dtype, of the loaded columns
+        """
+        dtype = {self.gene_column: str}
+        if self.identity_column is not None:
+            dtype[self.identity_column] = 'float64'
+        return dtype
+
+    @property
+    def nrows(self):
+        """
+        :return: int, number of rows to read, None reads all
+        """
+        return None
+
+    def matches(self, columns):
+        """
+        Checks if the header belongs to this format
+
+        :param columns: list: str, column names of the header
+        :return: bool
+        """
+        return all(column in columns for column in [*self.usecols, *self.required_columns])
+
+    def to_genes(self, df, quality_passed, quality_failed):
+        """
+        Converts the loaded columns to the genes
+
+        :param df: panda dataframe, with the usecols
+        :param quality_passed: identity given to genes without an identity
+        :param quality_failed: identity given to genes of a failed quality module
+        :return: dict: gene: identity
+        """
+        genes = df[self.gene_column]
+        if self.identity_column is None:
+            return dict(zip(genes, [quality_passed] * len(genes)))
+
+        return dict(zip(genes, df[self.identity_column]))
+
+
+class QualityModuleParser(ResultParser):
+    """
+    Parses a summary with one comma separated genotype,
+    the identity depends on if the quality module passed or failed
+    """
+
+    @property
+    def dtype(self):
+        return {self.gene_column: str, self.identity_column: str}
+
+    @property
+    def nrows(self):
+        return 1  # only the first row is used
+
+    def to_genes(self, df, quality_passed, quality_failed):
+        status = df[self.identity_column][0]
+
+        data = {}
+        for gene in str(df[self.gene_column][0]).split(","):
+            if status == "Passed":
+                data[gene] = quality_passed
+            elif status == "Failed":
+                data[gene] = quality_failed
+            else:
+                raise NotImplementedError(f"quality module status {status}")
+
+        return data
+
+
+# formats are matched in order, the first match is used
+PARSERS = []
+
+
+def register_parser(parser):
+    """
+    Adds a format to the registry, formats registered earlier take precedence
+
+    :param parser: ResultParser
+    :return: ResultParser
+    """
+    PARSERS.append(parser)
+    return parser
+
+
+register_parser(ResultParser("abricate", gene_column="Locus", identity_column="% Identity"))
+register_parser(ResultParser("locus_id", gene_column="Locus", required_columns=["ID"]))
+register_parser(ResultParser("locus_identity", gene_column="Locus", identity_column="Identity"))
+register_parser(ResultParser("quoted_locus", gene_column='"Locus'))
+register_parser(ResultParser("amrfinder", gene_column="Gene symbol",
+                             identity_column="% Identity to reference sequence"))
+register_parser(ResultParser("resfinder", gene_column="Allele", identity_column="% Identity"))
+register_parser(QualityModuleParser("genotype", gene_column="Genotype", identity_column="Quality Module"))
+register_parser(ResultParser("rgi", gene_column="Best_Hit_ARO", identity_column="Best_Identities"))
+register_parser(ResultParser("gene_identity", gene_column="Gene", identity_column="%Identity"))
+
+
+def find_delimiter(header):
+    """
+    Finds the delimiter of the header line, the most occurring of DELIMITERS
+    :param header: str: first line of the file
+    :return: str: delimiter
+    """
+    counts = {delimiter: header.count(delimiter) for delimiter in DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    if counts[delimiter] == 0:
+        return "\t"
+
+    return delimiter
+
+
+def find_parser(columns):
+    """
+    Finds the registered format of a header
+
+    :param columns: list: str, column names of the header
+    :return: ResultParser, None when no format matches
+    """
+    for parser in PARSERS:
+        if parser.matches(columns):
+            return parser
+
+    return None
+
+
+def extract_genes_from_file(file, quality_passed, quality_failed):
+    """
+    Estracts the genes and identities present from a csv file.
+    The header line identifies the format, after that only the needed columns are read.
+    :param file: str: path to file
+    :param quality_passed: identity given to genes without an identity, or of a passed quality module
+    :param quality_failed: identity given to genes of a failed quality module
+    :return: dict: gene: identity
+    """
+    with open(file) as fp:
+        header = fp.readline()
+
+    delimiter = find_delimiter(header)
+    columns = list(pd.read_csv(io.StringIO(header), sep=delimiter, nrows=0).columns)
+
+    parser = find_parser(columns)
+    if parser is None:
+        raise ValueError(f"Correct column names not found in {file}"
+                         f"{columns}")
+
+    df = pd.read_csv(file,
+                     on_bad_lines='skip',
+                     sep=delimiter,
+                     usecols=parser.usecols,
+                     dtype=parser.dtype,
+                     nrows=parser.nrows)
+
+    data = parser.to_genes(df, quality_passed=quality_passed, quality_failed=quality_failed)
+
+    # normalise so parsed and cached results are the same
+    return {str(gene): float(identity) for gene, identity in data.items()}
@@ -0,0 +1,167 @@
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sample_name TEXT PRIMARY KEY,
+    history_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    sample_name TEXT NOT NULL REFERENCES samples(sample_name),
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cohort_jobs (
+    job_id TEXT PRIMARY KEY,
+    history_id TEXT NOT NULL,
+    read_list_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS downloads (
+    dataset_id TEXT PRIMARY KEY,
+    sample_name TEXT NOT NULL REFERENCES samples(sample_name),
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+# sample states
+SUBMITTED = 'submitted'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class RunManifest():
+    """
+    Local sqlite record of a galaxy run: the submitted samples, their jobs and the downloaded results.
+    Every change is committed right away, so an interrupted run can resume from it.
+    Safe to use from several threads
+
+    :param manifest_file: Path, sqlite database, created when missing
+    """
+
+    def __init__(self, manifest_file: Path) -> None:
+        Path(manifest_file).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(manifest_file, check_same_thread=False)
+        # a commit per change, wal without a sync per commit keeps that cheap and survives a crash of the run
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def add_sample(self, sample_name: str, history_id: str, job_ids: list[str]):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)",
+                                     (sample_name, history_id, SUBMITTED, time.time()))
+            self._connection.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, 'new')",
+                                         [(job_id, sample_name) for job_id in job_ids])
+
+    def add_cohort(self, history_id: str, read_list_id: str, sample_names: list[str], job_ids: list[str]):
+        """
+        Records the samples of a cohort and its jobs, the jobs get their sample with assign_job
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)",
+                                         [(sample_name, history_id, SUBMITTED, time.time())
+                                          for sample_name in sample_names])
+            self._connection.executemany("INSERT OR REPLACE INTO cohort_jobs VALUES (?, ?, ?)",
+                                         [(job_id, history_id, read_list_id) for job_id in job_ids])
+
+    def cohort_jobs(self, history_id: str = None) -> dict:
+        """
+        :param history_id: str, only the jobs of this cohort, None for all
+        :return: dict: job_id: tuple: history_id, read_list_id, of the cohort jobs without a sample yet
+        """
+        query = "SELECT job_id, history_id, read_list_id FROM cohort_jobs"
+        parameters = ()
+        if history_id is not None:
+            query += " WHERE history_id = ?"
+            parameters = (history_id,)
+
+        with self._lock:
+            return {job_id: (history_id, read_list_id)
+                    for job_id, history_id, read_list_id in self._connection.execute(query, parameters)}
+
+    def assign_job(self, job_id: str, sample_name: str, state: str):
+        """
+        Moves a cohort job to its sample, a job without a sample (None) is only forgotten
+        """
+        with self._lock, self._connection:
+            if sample_name is not None:
+                self._connection.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)", (job_id, sample_name, state))
+            self._connection.execute("DELETE FROM cohort_jobs WHERE job_id = ?", (job_id,))
+
+    def remove_sample(self, sample_name: str):
+        """
+        Forgets a sample, the next run submits it again
+        """
+        with self._lock, self._connection:
+            for table in ('downloads', 'jobs', 'samples'):
+                self._connection.execute(f"DELETE FROM {table} WHERE sample_name = ?", (sample_name,))
+
+    def samples_without_jobs(self, history_id: str) -> list[str]:
+        """
+        :return: list: str, samples of the history without a job
+        """
+        with self._lock:
+            return [sample_name for sample_name, in self._connection.execute(
+                "SELECT sample_name FROM samples WHERE history_id = ? "
+                "AND sample_name NOT IN (SELECT sample_name FROM jobs)", (history_id,))]
+
+    def set_sample_state(self, sample_name: str, state: str):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE samples SET state = ?, updated = ? WHERE sample_name = ?",
+                                     (state, time.time(), sample_name))
+
+    def set_job_state(self, job_id: str, state: str):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE jobs SET state = ? WHERE job_id = ?", (state, job_id))
+
+    def add_download(self, dataset_id: str, sample_name: str, file_name: Path, size: int):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?)",
+                                     (dataset_id, sample_name, str(file_name), size))
+
+    def samples(self, state: str = None) -> dict:
+        """
+        :param state: str, only samples in this state, None for all
+        :return: dict: sample_name: state
+        """
+        query = "SELECT sample_name, state FROM samples"
+        parameters = ()
+        if state is not None:
+            query += " WHERE state = ?"
+            parameters = (state,)
+
+        with self._lock:
+            return dict(self._connection.execute(query, parameters).fetchall())
+
+    def jobs(self, sample_name: str) -> dict:
+        """
+        :return: dict: job_id: state
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT job_id, state FROM jobs WHERE sample_name = ?",
+                                                 (sample_name,)).fetchall())
+
+    def job_samples(self) -> dict:
+        """
+        :return: dict: job_id: sample_name
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT job_id, sample_name FROM jobs").fetchall())
+
+    def downloads(self, sample_name: str) -> dict:
+        """
+        :return: dict: dataset_id: file_name
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT dataset_id, file_name FROM downloads WHERE sample_name = ?",
+                                                 (sample_name,)).fetchall())
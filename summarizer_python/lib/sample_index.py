@@ -0,0 +1,138 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def extract_sample_name(file_name):
+    """
+    Extracts the sample name,
+    Eq SRX6855211_SRR10127028
+
+    :param file_name: str, name of the file (path.name)
+    :return: str
+    """
+    name_parts = file_name.split("_")
+    return f"{name_parts[0]}_{name_parts[1]}"
+
+
+def get_sample_type(file_name, sample_name):
+    """
+    retrieves the sample type.
+    uses the sample name to filter correctly
+    :param file_name: name of sample (path.name)
+    :param sample_name: first name of the sample
+    :return: str
+    """
+    return file_name.replace(sample_name, '')[1:].split(".")[0]
+
+
+def scan_files(directory):
+    """
+    Retrieves all files below the directory in one os.scandir pass,
+    the file types come from the directory entries so no stat per file is needed
+
+    :param directory: Path
+    :return: list: Path, sorted
+    """
+    files = []
+    directories = [str(directory)]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file():  # we do  not need any directory's
+                    files.append(entry.path)
+
+    return [Path(file) for file in sorted(files)]
+
+
+class SampleIndex:
+    """
+    Index of the result files, every file name is parsed once into a sample name and sample type.
+    Samples and types are stored as codes per file, the overview is counted from the codes.
+
+    :param files: list: Path, result files
+    """
+
+    def __init__(self, files) -> None:
+        self.files = list(files)
+
+        sample_names = []
+        sample_types = []
+        for file in self.files:
+            sample_name = extract_sample_name(file.name)
+            sample_names.append(sample_name)
+            sample_types.append(get_sample_type(file.name, sample_name))
+
+        self.sample_names, file_samples = np.unique(np.array(sample_names, dtype=object), return_inverse=True)
+        self.sample_types, file_types = np.unique(np.array(sample_types, dtype=object), return_inverse=True)
+        self.sample_names = list(self.sample_names)
+        self.sample_types = list(self.sample_types)
+        self.file_samples = file_samples.astype(np.int32)
+        self.file_types = file_types.astype(np.int32)
+
+        self.corrected_types, self.subtypes = self._get_subtypes()
+
+    @classmethod
+    def from_directory(cls, directory):
+        """
+        Indexes all files below the directory
+
+        :param directory: Path
+        :return: SampleIndex
+        """
+        return cls(scan_files(directory))
+
+    def _get_subtypes(self):
+        """
+        corrects the found types in subtyps when needed
+
+        :return: tuple: list corrected types, dict: type: list subtypes
+        """
+        corrected_types = []
+        subtype_dict = {}
+
+        for sample_type in self.sample_types:
+            if "_" in sample_type:  # meaning it has a subtype?
+                corrected_type, subtype = sample_type.rsplit("_", maxsplit=1)
+
+                if corrected_type not in subtype_dict.keys():
+                    subtype_dict[corrected_type] = []  # starts creating subtype dictionary
+
+                subtype_dict[corrected_type].append(subtype)  # adds subtype to dict
+            else:
+                corrected_types.append(sample_type)
+
+        corrected_types.extend(subtype_dict.keys())  # adds the correct types to the list
+
+        return corrected_types, subtype_dict
+
+    def organise_samples(self):
+        """
+        organises the sample paths based on sample name and sample type
+
+        :return: dict, {[sample_name][type]: path, None when the sample misses the type
+        """
+        data_dict = {sample: dict.fromkeys(self.sample_types) for sample in self.sample_names}
+
+        for file, sample_code, type_code in zip(self.files, self.file_samples, self.file_types):
+            data_dict[self.sample_names[sample_code]][self.sample_types[type_code]] = file
+
+        return data_dict
+
+    def overview(self):
+        """
+        Counts which sample has which type
+
+        :return: panda dataframe, types x samples with 1 when present, and a sum column. sorted on the sum
+        """
+        presence = np.zeros((len(self.sample_types), len(self.sample_names)), dtype=np.int64)
+        presence[self.file_types, self.file_samples] = 1
+
+        dataframe = pd.DataFrame(presence, index=self.sample_types, columns=self.sample_names)
+        dataframe["sum"] = presence.sum(axis=1)
+
+        return dataframe.sort_values(by="sum", ascending=False, kind="stable")
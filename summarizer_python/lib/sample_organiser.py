@@ -1,118 +1,297 @@
-import copy
-
-import matplotlib.pyplot as plt
-
-from defines import DATA_DIR, OUTPUT_DIR, GENES_TO_FILER, IDENTITY_CUTOFF, QUALITY_PASSED, QUALITY_FAILED
+from defines import DATA_DIR, OUTPUT_DIR, GENES_TO_FILER, IDENTITY_CUTOFF, QUALITY_PASSED, QUALITY_FAILED, \
+    HIT_CACHE_SIZE, DISK_CACHE, DISK_CACHE_HASH_CONTENT, PARSE_WORKERS, PARSE_CHUNKSIZE, \
+    CLUSTER_METHOD, CLUSTER_METRIC, CLUSTER_OPTIMAL_ORDERING, RUN_REPORT_SLOWEST_FILES, RUN_REPORT_PROFILE, \
+    RUN_REPORT_TRACE_MEMORY, NORMALISE_GENE_NAMES, GENE_NAME_LOOKUP
+from lib.bit_matrix import BitMatrix, distance_from_counts, is_binary
+from lib.clustering import cluster_order, plot_clustermap
+from lib.concordance import presence_cube, pair_counts, concordance_values, workflow_pairs, concordance_table, \
+    concordance_counts, figure4_layout
+from lib.disk_cache import DiskCache
+from lib.gene_names import GeneNormaliser, PREFIX_PATTERN
+from lib.hit_cache import HitCache
+from lib.hit_database import HitDatabase
+from lib.hit_store import HitStore
+from lib.instrumentation import RunReport
+from lib.parallel_parser import parse_files
+from lib.result_parser import extract_genes_from_file
+from lib.sample_index import SampleIndex
+from lib.sharding import read_partial, write_partial
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import csv
 
 
 class SampleOrganiser:
-    def __init__(self):
-        self.sample_dir = self._validate_dir(Path(DATA_DIR))
-        self.samples = self._load_all_samples()
-        self.sample_names = sorted(self._get_sample_names())
-        self.sample_types = sorted(self._get_all_sample_types())
-
-        self.corrected_types, self.subtypes = self._get_subtypes()
-        self.sample_sub_types = self._get_subtypes()
-        self.organised_samples = self._organise_samples()
-        self.overview_samples = self._generate_overview()
-
+    def __init__(self, data_dir=DATA_DIR, output_dir=OUTPUT_DIR, disk_cache=DISK_CACHE, report=None, files=None):
+        """
+        Indexes all result files in the data directory
+
+        :param data_dir: str or Path, directory with all samples, defaults to DATA_DIR
+        :param output_dir: str or Path, directory the outputs and cache are written to, defaults to OUTPUT_DIR
+        :param disk_cache: bool, keeps the parsed files in output_dir/cache, defaults to DISK_CACHE
+        :param report: RunReport, records the time and memory per stage, defaults to one set by the
+                       RUN_REPORT_* settings in defines.py
+        :param files: list: Path, only indexes these files instead of all files in the data directory, eg a shard
+        """
+        self.output_dir = Path(output_dir)
+        self.report = report
+        if self.report is None:
+            self.report = RunReport(slowest_files=RUN_REPORT_SLOWEST_FILES,
+                                    profile=RUN_REPORT_PROFILE,
+                                    trace_memory=RUN_REPORT_TRACE_MEMORY)
         self.identity_cutoff = IDENTITY_CUTOFF
         self._quality_failed = QUALITY_FAILED
         self._quality_passed = QUALITY_PASSED
+        self._hit_cache = HitCache(max_entries=HIT_CACHE_SIZE)
+        self._disk_cache = None
+        if disk_cache:
+            self._disk_cache = DiskCache(cache_dir=self.output_dir / 'cache',
+                                         settings={'identity_cutoff': IDENTITY_CUTOFF,
+                                                   'quality_passed': QUALITY_PASSED,
+                                                   'quality_failed': QUALITY_FAILED},
+                                         hash_content=DISK_CACHE_HASH_CONTENT)
+        self._hit_store = None
+        self._gene_normaliser = None
+        if NORMALISE_GENE_NAMES:
+            self._gene_normaliser = GeneNormaliser() if GENE_NAME_LOOKUP is None else \
+                GeneNormaliser.from_file(GENE_NAME_LOOKUP)
+
+        self._files = files
+        self.sample_dir = None if data_dir is None else Path(data_dir)
+        if files is None:
+            self._validate_dir(self.sample_dir)
+        self._index_samples()
+
+    def _index_samples(self):
+        """
+        Indexes the files in the sample directory and organises them per sample and type
+        """
+        with self.report.stage("index"):
+            if self._files is None:
+                self.sample_index = SampleIndex.from_directory(self.sample_dir)
+            else:
+                self.sample_index = SampleIndex(sorted(self._files))
+        self.samples = self.sample_index.files
+        self.sample_names = self.sample_index.sample_names
+        self.sample_types = self.sample_index.sample_types
+
+        self.corrected_types, self.subtypes = self.sample_index.corrected_types, self.sample_index.subtypes
+        with self.report.stage("organise"):
+            self.organised_samples = self.sample_index.organise_samples()
+            self.overview_samples = self.sample_index.overview()
+
+    def update(self, changed_files, removed_files=()):
+        """
+        Brings the index, overview and hit store up to date with new, changed and removed files.
+        Only the changed files are parsed and added to the index, the sample directory is not scanned again,
+        so files that are still being written stay out until they are reported.
+        A file that fails to parse is left out of the index, the other files of the batch are still added.
+        Only the hits of the changed files are replaced in the hit store,
+        a removed or failed file rebuilds the hit store from the disk cache
+
+        :param changed_files: list: Path, new or changed files
+        :param removed_files: list: Path, files that no longer exist
+        :return: list: Path, changed files that failed to parse
+        """
+        changed_files = [Path(file) for file in changed_files]
+        removed_files = [Path(file) for file in removed_files]
+        for file in [*changed_files, *removed_files]:
+            self._hit_cache.discard(file)
+
+        failed = []
+        with self.report.stage("parse"):
+            for file in changed_files:
+                try:
+                    self._get_genes(file)
+                except Exception as error:  # eg a half written file, read again when it changes
+                    print(f"could not parse {file}: {error}")
+                    failed.append(file)
+
+        files = set(self.samples).union(changed_files).difference(removed_files, failed)
+        self._files = sorted(files)
+        self._index_samples()
+
+        if self._hit_store is None:
+            return failed
+        if removed_files or any(file.name in self._hit_store.file_names for file in failed):
+            self._hit_store = None
+            return failed
+
+        with self.report.stage("update_hit_store"):
+            indexed = {file: (sample_name, sample_type)
+                       for sample_name, files in self.organised_samples.items()
+                       for sample_type, file in files.items() if file is not None}
+            self._hit_store.update_files([(file.name, *indexed[file], self._get_genes(file))
+                                          for file in changed_files if file in indexed])
+
+            if self._gene_normaliser is not None:
+                self._hit_store.normalise_genes(self._gene_normaliser)
+        self._hit_cache.clear()
+
+        return failed
 
-    def _get_subtypes(self):
+    @classmethod
+    def from_partials(cls, partial_files, output_dir=OUTPUT_DIR, report=None):
         """
-        corrects the found types in subtyps when needed
+        Combines the partials of all shards into one organiser, as if all files were indexed and parsed together.
+        The result files themselves are not needed.
+        The shards normalise the gene names already (NORMALISE_GENE_NAMES), the merge keeps their names
 
-        :return:
+        :param partial_files: list: Path, written by save_partial
+        :param output_dir: str or Path, directory the outputs are written to
+        :param report: RunReport, see __init__
+        :return: SampleOrganiser
         """
-        corrected_types = copy.deepcopy(self.sample_types)  # makes a deep copy from the sample types attribute
-        subtype_dict = {}
+        hit_stores = []
+        files = []
+        for partial_file in partial_files:
+            hit_store, file_names = read_partial(partial_file)
+            hit_stores.append(hit_store)
+            files.extend(Path(file_name) for file_name in file_names)
 
-        for sample_type in self.sample_types:
-            if "_" in sample_type:  # meaning it has a subtype?
+        organiser = cls(data_dir=None, output_dir=output_dir, disk_cache=False, report=report, files=files)
+        with organiser.report.stage("merge"):
+            file_order = [path.name for sample_files in organiser.organised_samples.values()
+                          for path in sample_files.values() if path is not None]
+            hit_store = HitStore.merge(hit_stores, file_order)
+        organiser._hit_store = hit_store
 
-                corrected_types.remove(sample_type)  # removing from subtype list
-                corrected_type, subtype = sample_type.rsplit("_", maxsplit=1)
+        return organiser
 
-                if corrected_type not in subtype_dict.keys():
-                    corrected_types.append(corrected_type)  # adds the correct type to the list
-                    subtype_dict[corrected_type] = []  # starts creating subtype dictionary
+    def save_partial(self, partial_file):
+        """
+        Writes the parsed hits of the indexed files as a partial, see from_partials
 
-                subtype_dict[corrected_type].append(subtype)  # adds subtype to dict
+        :param partial_file: Path, npz
+        """
+        hit_store = self._get_hit_store()
 
-        return corrected_types, subtype_dict
+        with self.report.stage("write_partial"):
+            write_partial(partial_file, hit_store, self.samples)
 
-    def _create_data_frame(self, filter_name):
+    def _get_hit_store(self):
         """
-        Generates a data frame dictionary by
-        - getting all genes from the samples
-        - filtering all samples required.
-        - add all to the dict
+        Builds the hit store of all files once, all comparisons are build from it.
+        The parsed files are dropped from memory once they are in the store,
+        a rebuild reads them from the disk cache
+
+        :return: HitStore
+        """
+        if self._hit_store is None:
+            self._parse_all_files()
+
+            with self.report.stage("hit_store"):
+                hit_store = HitStore()
+                for sample_name, files in self.organised_samples.items():
+                    for sample_type, path in files.items():
+                        if path is not None:
+                            hit_store.add_file(path.name, sample_name, sample_type, self._get_genes(path))
+
+            if self._gene_normaliser is not None:
+                with self.report.stage("normalise_genes"):
+                    hit_store.normalise_genes(self._gene_normaliser)
+
+            self._hit_store = hit_store
+            self._hit_cache.clear()
 
-        :param filter_name: str: what must be in the name
+        return self._hit_store
 
+    def _select_codes(self, filter_name):
         """
-        genes = self._get_all_genes(filter_name)
+        Selects the samples and genes of a comparison by
+        - filtering all samples required.
+        - getting all genes from the samples
+
+        :param filter_name: str: what must be in the sample name or type
+        :return: tuple: numpy array file codes, numpy array gene codes
+        """
+        hit_store = self._get_hit_store()
 
-        # generate data structure
-        data = {}
-        for gene in genes:
-            data[gene] = {}
+        # samples with hits of real genes, not only the '-' placeholder, and the filter in the name or type
+        filtered_codes = hit_store.gene_codes(GENES_TO_FILER)
+        file_codes = np.flatnonzero((hit_store.hit_counts(excluded_gene_codes=filtered_codes) > 0) &
+                                    self._file_mask(hit_store, filter_name=filter_name)).astype(np.int32)
 
-        for sample_name, file in self.organised_samples.items():
-            for sample_type, path in file.items():
-                if filter_name is None and path is not None:
-                    for gene, identity in self._exstract_genes_from_file(path).items():
-                        if gene not in data.keys():
-                            data[gene] = {}
+        gene_codes = np.setdiff1d(hit_store.genes_of_files(file_codes), filtered_codes)
 
-                        data[gene][path.name] = identity
-                elif str(filter_name) in (sample_name or sample_type) and path is not None:
-                    for gene, identity in self._exstract_genes_from_file(path).items():
-                        if gene not in data.keys():
-                            data[gene] = {}
+        return file_codes, gene_codes
+
+    @classmethod
+    def _file_mask(cls, hit_store, samples=None, workflows=None, subtypes=None, sample_types=None,
+                   filter_name=None):
+        """
+        Selects the files of the hit store, every selection given must match.
+        Matched once per sample and per type, then spread over the files
+
+        :param samples: list: str, sample names
+        :param workflows: list: str, workflow types without subtype, eg WF2
+        :param subtypes: list: str, subtypes, eg AMR of WF2_AMR
+        :param sample_types: list: str, workflow types with subtype, eg WF2_AMR
+        :param filter_name: str, what must be in the sample name or in the sample type
+        :return: numpy array bool, per file
+        """
+        split_types = [sample_type.rsplit("_", maxsplit=1) for sample_type in hit_store.sample_types]
+        type_mask = np.ones(len(hit_store.sample_types), dtype=bool)
+        if workflows is not None:
+            type_mask &= np.array([split_type[0] in workflows for split_type in split_types], dtype=bool)
+        if subtypes is not None:
+            type_mask &= np.array([len(split_type) > 1 and split_type[1] in subtypes for split_type in split_types],
+                                  dtype=bool)
+        if sample_types is not None:
+            type_mask &= np.isin(np.array(hit_store.sample_types, dtype=object), list(sample_types))
+
+        sample_mask = np.ones(len(hit_store.sample_names), dtype=bool)
+        if samples is not None:
+            sample_mask &= np.isin(np.array(hit_store.sample_names, dtype=object), list(samples))
+
+        mask = sample_mask[hit_store.file_samples] & type_mask[hit_store.file_types]
+        if filter_name is not None:
+            in_name = np.array([str(filter_name) in name for name in hit_store.sample_names], dtype=bool)
+            in_type = np.array([str(filter_name) in name for name in hit_store.sample_types], dtype=bool)
+            mask &= in_name[hit_store.file_samples] | in_type[hit_store.file_types]
+
+        return mask
+
+    def _create_data_frame(self, filter_name):
+        """
+        Generates the gene x sample data frame,
+        the hits of the samples are pivoted into the data frame, missing genes are 0
 
-                        data[gene][path.name] = identity
+        :param filter_name: str: what must be in the sample name or type
+        :return: panda dataframe
+        """
+        hit_store = self._get_hit_store()
 
-        return data
+        with self.report.stage("data_frame"):
+            file_codes, gene_codes = self._select_codes(filter_name)
+            return hit_store.to_frame(file_codes, gene_codes)
 
     def _identity_to_binary(self, dataframe):
         """
-        changes all identity
+        changes all identity to 1 when at or above the identity cutoff, else 0
         :param dataframe:
         :return:
         """
+        return (dataframe >= self.identity_cutoff).astype(int)
 
-        def threshold_function(value, treshold=self.identity_cutoff):
-            return 0 if value < treshold else 1
-
-        # Apply the threshold function to each element in the DataFrame
-        return dataframe.map(lambda x: threshold_function(x, treshold=self.identity_cutoff))
-
-    @classmethod
-    def _cluster_dataframe(cls, dataframe):
+    def _cluster_dataframe(self, dataframe):
         """
-        Clusters the dataframe to gain more over view
+        Clusters the dataframe to gain more over view,
+        see CLUSTER_METHOD, CLUSTER_METRIC and CLUSTER_OPTIMAL_ORDERING in defines.py
 
         :param dataframe: panda dataframe
         :return: panda dataframe clusterd
         """
         numeric_columns = dataframe.select_dtypes(include=['int', 'float']).columns
-        clustered_heatmap = sns.clustermap(dataframe[numeric_columns],
-                                           method='ward', cmap='viridis', annot=True,
-                                           fmt='.1f')
 
-        # Extract row and column order from the clustered heatmap
-        row_order = clustered_heatmap.dendrogram_row.reordered_ind
-        col_order = clustered_heatmap.dendrogram_col.reordered_ind
+        # Extract row and column order from the clustering
+        with self.report.stage("cluster"):
+            row_order, col_order = cluster_order(dataframe[numeric_columns].values,
+                                                 method=CLUSTER_METHOD,
+                                                 metric=CLUSTER_METRIC,
+                                                 optimal_ordering=CLUSTER_OPTIMAL_ORDERING)
 
-        df_clustered = dataframe.iloc[row_order].iloc[:, col_order]
+        df_clustered = dataframe.iloc[row_order, col_order]
 
         return df_clustered
 
@@ -138,38 +317,306 @@ class SampleOrganiser:
         :param dataframe:
         :return:
         """
-        new_index = []
-        for i in dataframe.index:
-            if str(i).startswith('('):
-                new_index.append(str(i).split(')', maxsplit=1)[1])
-            else:
-                new_index.append(str(i))
-
-        dataframe.index = new_index
+        dataframe.index = dataframe.index.astype(str).str.replace(PREFIX_PATTERN, '', regex=True)
         return dataframe
 
     def create_comparison(self, sheet_name, excel_writer, filter_name=None, binary=True, cluster=True, typing=True,
-                          corr=False, remove_front_parahentis=True, sort_columns=False):
+                          corr=False, remove_front_parahentis=True, sort_columns=False, heatmap_file=None):
+        """
+        Writes a gene x sample comparison to an Excel sheet, see build_comparison for the options
 
-        data_dict = self._create_data_frame(filter_name=filter_name)
-        try:
-            del data_dict['-']
-        except:
-            pass
+        :param sheet_name: str, name of the sheet
+        :param excel_writer: panda ExcelWriter
+        """
+        df = self.build_comparison(filter_name=filter_name, binary=binary, cluster=cluster, typing=typing,
+                                   corr=corr, remove_front_parahentis=remove_front_parahentis,
+                                   sort_columns=sort_columns, heatmap_file=heatmap_file)
 
-        # correct to dataframe
-        df = pd.DataFrame.from_dict(data_dict).transpose()
-        df = df.fillna(0)
+        # write out to excel
+        with self.report.stage("write_excel"):
+            df.to_excel(excel_writer=excel_writer,
+                        sheet_name=sheet_name,
+                        index=True)
+
+    def build_comparison(self, filter_name=None, binary=True, cluster=True, typing=True, corr=False,
+                         remove_front_parahentis=True, sort_columns=False, heatmap_file=None, similarity=None):
+        """
+        Builds a gene x sample comparison, write it out with lib.exporters
+
+        :param filter_name: str, what must be in the sample name or type, None uses all samples
+        :param binary: bool, converts the identities to present (1) / absent (0), see IDENTITY_CUTOFF
+        :param cluster: bool, orders the genes and samples on their clustering
+        :param typing: bool, adds a row with the sample type
+        :param corr: bool, writes the sample correlation instead of the genes
+        :param remove_front_parahentis: bool, removes the leading (something) of the gene names
+        :param sort_columns: bool, sorts the samples on name
+        :param heatmap_file: Path, also plots the clustered heatmap to this image, needs seaborn
+        :param similarity: str, jaccard, dice or hamming: writes the sample x sample similarity instead of the genes,
+                           counted on the bit packed binary comparison
+        :return: panda dataframe
+        """
+        df = self._create_data_frame(filter_name=filter_name)
 
         # converts the idenity values to binary data (true / false )
         if binary:
             df = self._identity_to_binary(dataframe=df)
 
+        return self._finish_comparison(df, cluster=cluster, corr=corr, typing=typing,
+                                       remove_front_parahentis=remove_front_parahentis, sort_columns=sort_columns,
+                                       heatmap_file=heatmap_file, similarity=similarity)
+
+    def create_cutoff_sweep(self, excel_writer, cutoffs, filter_name=None, cluster=True, typing=True,
+                            remove_front_parahentis=True, sort_columns=False, sheet_prefix="binary"):
+        """
+        Writes a binary comparison for every identity cutoff to its own Excel sheet,
+        see build_cutoff_sweep for the options
+
+        :param excel_writer: panda ExcelWriter
+        :return: panda dataframe, genes, samples and hits present per cutoff
+        """
+        views = self.build_cutoff_sweep(cutoffs=cutoffs, filter_name=filter_name, cluster=cluster, typing=typing,
+                                        remove_front_parahentis=remove_front_parahentis,
+                                        sort_columns=sort_columns, sheet_prefix=sheet_prefix)
+
+        with self.report.stage("write_excel"):
+            for sheet_name, df in views.items():
+                df.to_excel(excel_writer=excel_writer,
+                            sheet_name=sheet_name,
+                            index=True)
+
+        return views[f"{sheet_prefix}_summary"]
+
+    def build_cutoff_sweep(self, cutoffs, filter_name=None, cluster=True, typing=True,
+                           remove_front_parahentis=True, sort_columns=False, sheet_prefix="binary"):
+        """
+        Builds a binary comparison for every identity cutoff, all cutoffs are computed in one pass.
+        The number of present genes, samples and hits per cutoff are added as summary
+
+        :param cutoffs: list: identity cutoffs, eq [80, 90, 95, 98, 100]
+        :param filter_name: str, what must be in the sample name or type, None uses all samples
+        :param cluster: bool, orders the genes and samples on their clustering
+        :param typing: bool, adds a row with the sample type
+        :param remove_front_parahentis: bool, removes the leading (something) of the gene names
+        :param sort_columns: bool, sorts the samples on name
+        :param sheet_prefix: str, views are named <sheet_prefix>_<cutoff> and <sheet_prefix>_summary
+        :return: dict: name: panda dataframe
+        """
+        hit_store = self._get_hit_store()
+        with self.report.stage("cutoff_sweep"):
+            file_codes, gene_codes = self._select_codes(filter_name)
+            matrices = hit_store.binary_matrices(file_codes, gene_codes, cutoffs)
+
+        genes = [hit_store.genes[code] for code in gene_codes]
+        file_names = [hit_store.file_names[code] for code in file_codes]
+
+        views = {}
+        for cutoff, matrix in zip(cutoffs, matrices):
+            df = pd.DataFrame(matrix.astype(int), index=genes, columns=file_names)
+            views[f"{sheet_prefix}_{cutoff}"] = self._finish_comparison(df, cluster=cluster, corr=False,
+                                                                        typing=typing,
+                                                                        remove_front_parahentis=remove_front_parahentis,
+                                                                        sort_columns=sort_columns)
+
+        views[f"{sheet_prefix}_summary"] = pd.DataFrame({"genes": matrices.any(axis=2).sum(axis=1),
+                                                         "samples": matrices.any(axis=1).sum(axis=1),
+                                                         "hits": matrices.sum(axis=(1, 2))},
+                                                        index=pd.Index(cutoffs, name="identity cutoff"))
+
+        return views
+
+    def view_selections(self, by="workflow"):
+        """
+        A view selection per workflow type, subtype or workflow type with subtype, to pass to build_views
+
+        :param by: str, workflow (eg WF2), subtype (eg AMR) or sample_type (eg WF2_AMR)
+        :return: dict: name: dict selection
+        """
+        hit_store = self._get_hit_store()
+        split_types = [sample_type.rsplit("_", maxsplit=1) for sample_type in hit_store.sample_types]
+
+        if by == "workflow":
+            names = sorted({split_type[0] for split_type in split_types})
+            return {name: {"workflows": [name]} for name in names}
+        if by == "subtype":
+            names = sorted({split_type[1] for split_type in split_types if len(split_type) > 1})
+            return {name: {"subtypes": [name]} for name in names}
+        if by == "sample_type":
+            return {name: {"sample_types": [name]} for name in sorted(hit_store.sample_types)}
+
+        raise ValueError(f"unknown view selection {by}, use workflow, subtype or sample_type")
+
+    def build_views(self, views, **options):
+        """
+        Builds many gene x sample comparisons at once. The identity matrix of all files is build once,
+        every view selects its samples and genes from it instead of building its own matrix.
+        A view only holds the genes hit in its samples, as build_comparison does
+
+        :param views: dict: name: dict, the selection of the view: samples, workflows, subtypes, sample_types
+                      (see view_selections) and filter_name, and the options of build_comparison: binary, cutoff
+                      (identity a binary hit is present at, defaults to IDENTITY_CUTOFF), cluster, typing, corr,
+                      similarity, remove_front_parahentis, sort_columns
+        :param options: default options of every view
+        :return: dict: name: panda dataframe
+        """
+        hit_store = self._get_hit_store()
+
+        with self.report.stage("view_matrix"):
+            file_codes, gene_codes = self._select_codes(filter_name=None)
+            values = hit_store.matrix(file_codes, gene_codes)
+            hits = hit_store.hit_matrix(file_codes, gene_codes)  # also hits at identity 0 or without identity
+            genes = np.array([hit_store.genes[code] for code in gene_codes], dtype=object)
+            file_names = np.array([hit_store.file_names[code] for code in file_codes], dtype=object)
+
+        dataframes = {}
+        for name, view in views.items():
+            view = {**options, **view}
+            selection = {key: view.pop(key) for key in ['samples', 'workflows', 'subtypes', 'sample_types',
+                                                         'filter_name'] if key in view}
+            binary = view.pop("binary", True)
+            cutoff = view.pop("cutoff", self.identity_cutoff)
+            finish = {option: view.pop(option, default)
+                      for option, default in [("cluster", True), ("corr", False), ("typing", True),
+                                              ("remove_front_parahentis", True), ("sort_columns", False),
+                                              ("similarity", None)]}
+            if view:
+                raise ValueError(f"unknown options of view {name}: {sorted(view)}")
+
+            with self.report.stage("view_select"):
+                columns = np.flatnonzero(self._file_mask(hit_store, **selection)[file_codes])
+                rows = np.flatnonzero(hits[:, columns].any(axis=1))
+                df = pd.DataFrame(values[np.ix_(rows, columns)], index=list(genes[rows]),
+                                  columns=list(file_names[columns]))
+                if binary:
+                    df = (df >= cutoff).astype(int)
+
+            # a view without samples is left empty
+            dataframes[name] = df if df.empty else self._finish_comparison(df, **finish)
+
+        return dataframes
+
+    def _workflow_presence(self, cutoff, filter_name, merge_subtypes):
+        """
+        The presence of the genes per workflow and sample, files without hits included
+
+        :return: tuple: list: str workflows, numpy array bool workflows x genes x samples,
+                        numpy array bool workflows x samples, True when the workflow has a file of the sample
+        """
+        cutoff = self.identity_cutoff if cutoff is None else cutoff
+        hit_store = self._get_hit_store()
+
+        with self.report.stage("workflow_presence"):
+            file_codes = np.flatnonzero(self._file_mask(hit_store, filter_name=filter_name)).astype(np.int32)
+            gene_codes = np.setdiff1d(hit_store.genes_of_files(file_codes), hit_store.gene_codes(GENES_TO_FILER))
+            present = hit_store.binary_matrices(file_codes, gene_codes, [cutoff])[0]
+
+            file_types = [hit_store.sample_types[code] for code in hit_store.file_types[file_codes]]
+            if merge_subtypes:
+                file_types = [sample_type.rsplit("_", maxsplit=1)[0] for sample_type in file_types]
+            workflows, file_workflows = np.unique(np.array(file_types, dtype=object), return_inverse=True)
+            samples, file_samples = np.unique(hit_store.file_samples[file_codes], return_inverse=True)
+
+            cube, has_file = presence_cube(present, file_workflows, file_samples, len(workflows), len(samples))
+
+        self._gene_codes = gene_codes
+        return list(workflows), cube, has_file
+
+    def build_concordance(self, cutoff=None, filter_name=None, reference=None, merge_subtypes=False,
+                          remove_front_parahentis=True):
+        """
+        Compares every pair of workflows per gene over all samples:
+        -1 when a workflow found the gene in a sample the other did not, 1 when both found it in the same samples
+        and 0 when neither found it. Only the samples both workflows have a result file of are compared,
+        files without hits included. All pairs are computed at once from the presence per workflow and sample
+
+        :param cutoff: identity cutoff a hit is present at, None uses IDENTITY_CUTOFF
+        :param filter_name: str, what must be in the sample name or type, None uses all samples
+        :param reference: str, only compares this workflow to the others (eg WF1, as WF1_Vs_all.csv), None all pairs
+        :param merge_subtypes: bool, compares the types (WF2) instead of the subtypes (WF2_AMR), a gene found by
+                               any subtype is found by the type
+        :param remove_front_parahentis: bool, removes the leading (something) of the gene names
+        :return: dict: name: panda dataframe
+                 table, genes x pairs. counts, the samples per pair and gene.
+                 figure4, the AMR, WF, Value layout of Figure4_script.py
+        """
+        workflows, cube, has_file = self._workflow_presence(cutoff, filter_name, merge_subtypes)
+        hit_store = self._get_hit_store()
+
+        with self.report.stage("concordance"):
+            both, found_first = pair_counts(cube, has_file)
+            values = concordance_values(both, found_first)
+
+            # genes no workflow found are left out
+            found = cube.any(axis=(0, 2))
+            both, found_first, values = both[:, :, found], found_first[:, :, found], values[:, :, found]
+
+            pairs = workflow_pairs(workflows, reference=reference)
+            table = concordance_table(values, workflows, [hit_store.genes[code] for code in self._gene_codes[found]],
+                                      pairs)
+            if remove_front_parahentis:
+                table = self._update_row_names(table).rename_axis("type")
+            counts = concordance_counts(both, found_first, values, workflows, list(table.index), pairs)
+
+        return {"table": table,
+                "counts": counts,
+                "figure4": figure4_layout(table)}
+
+    def _similarity_frame(self, dataframe, metric):
+        """
+        The similarity of every pair of samples (columns) of a binary comparison
+
+        :param dataframe: panda dataframe, genes x samples with 0 / 1
+        :param metric: str, jaccard, dice or hamming
+        :return: panda dataframe, samples x samples
+        """
+        if not is_binary(dataframe.values):
+            raise ValueError(f"the {metric} similarity needs a binary comparison")
+
+        with self.report.stage("similarity"):
+            bits = BitMatrix(dataframe.values.T)
+            return pd.DataFrame(bits.similarity(metric=metric), index=dataframe.columns, columns=dataframe.columns)
+
+    def build_workflow_similarity(self, metric='jaccard', cutoff=None, filter_name=None, merge_subtypes=False):
+        """
+        The similarity of every pair of workflows over all genes and samples, on bit packed presence.
+        Only the samples both workflows have a result file of are compared
+
+        :param metric: str, jaccard, dice or hamming
+        :param cutoff: identity cutoff a hit is present at, None uses IDENTITY_CUTOFF
+        :param filter_name: str, what must be in the sample name or type, None uses all samples
+        :param merge_subtypes: bool, compares the types (WF2) instead of the subtypes (WF2_AMR)
+        :return: panda dataframe, workflows x workflows
+        """
+        workflows, cube, has_file = self._workflow_presence(cutoff, filter_name, merge_subtypes)
+
+        with self.report.stage("workflow_similarity"):
+            n_genes = cube.shape[1]
+            found = BitMatrix(cube.reshape(len(workflows), -1))
+            files = BitMatrix(np.repeat(has_file[:, np.newaxis, :], n_genes, axis=1).reshape(len(workflows), -1))
+
+            first = found.intersections(files)  # found by the first where the second has a file
+            distances = distance_from_counts(found.intersections(), first, first.T, files.intersections(), metric)
+
+        return pd.DataFrame(1 - distances, index=workflows, columns=workflows)
+
+    def _finish_comparison(self, df, cluster, corr, typing, remove_front_parahentis, sort_columns,
+                           heatmap_file=None, similarity=None):
+        """
+        Post processes a gene x sample comparison, see create_comparison for the options
+
+        :param df: panda dataframe, genes x samples
+        :return: panda dataframe
+        """
         if cluster:
             df = self._cluster_dataframe(dataframe=df)
 
+        if heatmap_file is not None:
+            self._create_directory(Path(heatmap_file))
+            plot_clustermap(df, file_name=heatmap_file, method=CLUSTER_METHOD, metric=CLUSTER_METRIC)
+
         if corr:
             df = df.corr()
+        elif similarity is not None:
+            df = self._similarity_frame(df, metric=similarity)
 
         # post processing adding the sub type and types?
         if typing:
@@ -180,118 +627,120 @@ class SampleOrganiser:
 
         if sort_columns:
             df = df.sort_index(axis=1)
-        # write out to excel
-        df.to_excel(excel_writer=excel_writer,
-                    sheet_name=sheet_name,
-                    index=True)
-
-    @classmethod
-    def _find_delimiter(cls, filename):
-        sniffer = csv.Sniffer()
-        with open(filename) as fp:
-            try:
-                delimiter = sniffer.sniff(fp.read(5000)).delimiter
-            except:
-                delimiter = "\\t"
 
-        return delimiter
+        return df
 
-    def _exstract_genes_from_file(self, file):
+    def _get_genes(self, file):
         """
-        Estracts the genes and identities present from a csv file
-        :param file: str: path to file
+        Retrieves the genes and identities of a file, the file is only parsed the first time
+        :param file: Path: path to file
         :return: dict: gene: identity
         """
-        df = pd.read_csv(file,
-                         on_bad_lines='skip',
-                         sep=self._find_delimiter(file))
-
-        if "Locus" in list(df.columns):
-            if "% Identity" in list(df.columns):
-                data = (dict(zip(list(df["Locus"]), list(df["% Identity"]))))
-            elif "ID" in list(df.columns):
-                data = (dict(zip(list(df["Locus"]), ([self._quality_passed] * len(list(df["Locus"]))))))
-            elif "Identity" in list(df.columns):
-                data = (dict(zip(list(df["Locus"]), list(df["Identity"]))))
-            else:
-                raise NotImplemented("identity locus not implemented")
+        genes = self._hit_cache.get(file)
+        if genes is not None:
+            return genes
 
+        if self._disk_cache is not None:
+            genes = self._disk_cache.get(file)
 
-        elif '"Locus' in list(df.columns):
-            data = (dict(zip(list(df['"Locus']), ([self._quality_passed] * len(list(df['"Locus']))))))
+        if genes is None:
+            genes = self._exstract_genes_from_file(file)
+            if self._disk_cache is not None:
+                self._disk_cache.put(file, genes)
 
-        elif "Gene symbol" in list(df.columns):
-            data = (dict(zip(list(df["Gene symbol"]), list(df["% Identity to reference sequence"]))))
+        self._hit_cache.put(file, genes)
 
-        elif "Allele" in list(df.columns):
-            data = (dict(zip(list(df["Allele"]), list(df["% Identity"]))))
+        return genes
 
-        elif "Genotype" in list(df.columns):
-            status = df["Quality Module"][0]
-
-            data = {}
-            for gene in str(df["Genotype"][0]).split(","):
-                if status == "Passed":
-                    data[gene] = self._quality_passed
-                elif status == "Failed":
-                    data[gene] = self._quality_failed
-                else:
-                    raise NotImplemented(status)
+    def _parse_all_files(self):
+        """
+        Parses all files not cached yet at once over a process pool,
+        see PARSE_WORKERS and PARSE_CHUNKSIZE in defines.py
+        """
+        to_parse = []
+        with self.report.stage("parse_cache_lookup"):
+            for file in self.samples:
+                if file in self._hit_cache:
+                    continue
 
-        elif "Best_Hit_ARO" in list(df.columns):
-            data = (dict(zip(list(df["Best_Hit_ARO"]), list(df["Best_Identities"]))))
+                genes = None
+                if self._disk_cache is not None:
+                    genes = self._disk_cache.get(file)
 
-        elif "Gene" in list(df.columns):
-            data = (dict(zip(list(df["Gene"]), list(df["%Identity"]))))
+                if genes is None:
+                    to_parse.append(file)
+                else:
+                    self._hit_cache.put(file, genes)
 
-        else:
-            raise ValueError(f"Correct column names not found in {file}"
-                             f"{df.columns}")
+        with self.report.stage("parse"):
+            parsed = parse_files(to_parse,
+                                 quality_passed=self._quality_passed,
+                                 quality_failed=self._quality_failed,
+                                 workers=PARSE_WORKERS,
+                                 chunksize=PARSE_CHUNKSIZE,
+                                 with_times=True)
 
-        return data
+        for file, (genes, seconds) in zip(to_parse, parsed):
+            self.report.record_file(file, seconds)
+            if self._disk_cache is not None:
+                self._disk_cache.put(file, genes)
+            self._hit_cache.put(file, genes)
 
-    def _get_all_genes(self, filter_name):
+    def write_hit_database(self, database_file, engine='sqlite'):
         """
-        Retrieves the genes from all files
+        Writes all parsed hits to an embedded database, see query_hits.py
 
-        :return:
+        :param database_file: Path, replaced when it exists
+        :param engine: str, sqlite or duckdb
         """
-        gene_list = []
-        for sample_name, data in self.organised_samples.items():
-            for sub_type, file in data.items():
+        hit_store = self._get_hit_store()
 
-                if filter_name is not None:
-                    if filter_name not in sub_type:
-                        continue
+        with self.report.stage("hit_database"):
+            database = HitDatabase(database_file, engine=engine)
+            database.load(hit_store, genes_to_filter=GENES_TO_FILER)
+            database.close()
 
-                if file is not None:
-                    genes = self._exstract_genes_from_file(file)
+    def parse(self):
+        """
+        Parses all indexed files not cached yet, without building the hit store
+        """
+        self._parse_all_files()
 
-                    gene_list.extend(genes.keys())
+    def save_cache(self):
+        """
+        Writes the parsed genes to the on disk cache, so a rerun only parses new or changed files
+        """
+        if self._disk_cache is not None:
+            with self.report.stage("save_cache"):
+                self._disk_cache.save()
 
-        # only unique values
-        gene_list = list(set(gene_list))
-        # filter values
-        for item in GENES_TO_FILER:
-            try:
-                gene_list.remove(item)
-            except ValueError:
-                pass
+    def write_report(self):
+        """
+        Writes the time and memory per stage and the slowest files to output_dir/run_report.json
+        """
+        self.report.write(self.output_dir / 'run_report.json')
 
-        return gene_list
+    def _exstract_genes_from_file(self, file):
+        """
+        Estracts the genes and identities present from a csv file
+        :param file: str: path to file
+        :return: dict: gene: identity
+        """
+        return extract_genes_from_file(file, quality_passed=self._quality_passed,
+                                       quality_failed=self._quality_failed)
 
     def write_out_sample_overview(self):
         """
         Writes out the overview of samples to an Excel page
         :return:
         """
-        file_name = Path.joinpath(OUTPUT_DIR / Path('overview_samples.xlsx'))
+        file_name = Path.joinpath(self.output_dir / Path('overview_samples.xlsx'))
         self._create_directory(file_name)
 
         if file_name.exists():
             file_name.unlink()  # deletes file if it exists
 
-        with pd.ExcelWriter(file_name) as excel_writer:
+        with self.report.stage("write_overview"), pd.ExcelWriter(file_name) as excel_writer:
             self.overview_samples.to_excel(excel_writer,
                                            sheet_name="overview samples",
                                            index=True)
@@ -306,31 +755,6 @@ class SampleOrganiser:
 
         pathname.parent.mkdir(parents=True, exist_ok=True)
 
-    def _generate_overview(self):
-
-        df = pd.DataFrame(self.organised_samples)  # convert to data frame
-        # convert to binary
-        binary_dict = {col: {idx: 1 if pd.notna(value) else 0 for idx, value in df[col].items()} for col in df.columns}
-
-        # add column of sum
-        binary_dict["sum"] = {}
-        for sample_type in self.sample_types:
-            binary_dict["sum"][sample_type] = 0
-
-        # adding values
-        for sample, data in binary_dict.items():
-
-            if sample == "sum":  # we do not need the sum we already calculated
-                continue
-            for sample_type, value in data.items():
-                binary_dict["sum"][sample_type] += value
-
-        # sorting values
-        dataframe = pd.DataFrame(binary_dict)
-        dataframe_sorted = dataframe.sort_values(by="sum", ascending=False)
-
-        return dataframe_sorted
-
     @classmethod
     def _validate_dir(cls, path):
         """
@@ -342,84 +766,3 @@ class SampleOrganiser:
         if not Path.is_dir(path):
             raise FileNotFoundError
         return path
-
-    def _load_all_samples(self):
-        """
-        Retrieves all file paths and check if it is a file
-        :return: list: file_path
-
-        """
-        file_filtered = []
-        files = list(self.sample_dir.rglob('*'))
-        for file in files:
-            if file.is_file():  # we do  not need any directory's
-                file_filtered.append(file)
-
-        return file_filtered
-
-    def _get_sample_names(self):
-        sample_names = []
-        for sample in self.samples:
-            sample_names.append(self._extract_sample_name(sample))
-
-        return list(set(sample_names))
-
-    @classmethod
-    def _extract_sample_name(cls, sample):
-        """
-        Extracts the sample name,
-        Eq SRX6855211_SRR10127028
-
-        :param sample: Path, sample
-        :return:
-        """
-        name_parts = sample.name.split("_")
-        return f"{name_parts[0]}_{name_parts[1]}"
-
-    def _organise_samples(self):
-        """
-        organises the sample paths based on sample name and sample type
-
-        :return: dict, {[sample_name][type]: path
-        """
-
-        data_dict = {}
-
-        for sample in self.sample_names:
-            data_dict[sample] = {}
-            for sample_type in self.sample_types:
-                data_dict[sample][sample_type] = None
-
-        for sample in self.samples:
-            sample_name = self._extract_sample_name(sample)
-            sample_type = self._get_sample_type(sample.name, sample_name)
-
-            data_dict[sample_name][sample_type] = sample
-
-        return data_dict
-
-    @classmethod
-    def _get_sample_type(cls, sample, sample_name):
-        """
-        retrieves the sample type.
-        uses the sample name to filter correctly
-        :param sample: name of sample (path.name)
-        :param sample_name: first name of the sample
-        :return:
-        """
-        return sample.replace(sample_name, '')[1:].split(".")[0]
-
-    def _get_all_sample_types(self):
-        """
-        retrieves the sample type
-
-        :return: list, all sample types in data set
-        """
-        sample_types = []
-        for sample in self.samples:
-            sample_name = self._extract_sample_name(sample)
-            sample_type = self._get_sample_type(sample.name, sample_name)
-            # removing sample name and extension
-            sample_types.append(sample_type)
-
-        return list(set(sample_types))
@@ -0,0 +1,71 @@
+from pathlib import Path
+import zlib
+
+import numpy as np
+
+from lib.hit_store import HitStore
+from lib.sample_index import extract_sample_name
+
+PARTIAL_VERSION = 1  # bumped when the partial layout changes, older partials are refused
+
+
+def select_shard(files, prefixes=None, file_list=None, shard_index=None, shard_count=None):
+    """
+    Selects the files of one shard. All files of a sample always end up in the same shard
+
+    :param files: list: Path, all result files
+    :param prefixes: list: str, samples starting with one of these, eg SRX1
+    :param file_list: list: str, names of the files of the shard
+    :param shard_index: int, with shard_count: the samples hashed into this shard
+    :param shard_count: int, number of shards
+    :return: list: Path
+    """
+    if prefixes is not None:
+        prefixes = tuple(prefixes)
+        return [file for file in files if extract_sample_name(file.name).startswith(prefixes)]
+
+    if file_list is not None:
+        names = {Path(name).name for name in file_list}
+        return [file for file in files if file.name in names]
+
+    if shard_count is not None:
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard index {shard_index} is not in 0 - {shard_count - 1}")
+        return [file for file in files
+                if zlib.crc32(extract_sample_name(file.name).encode()) % shard_count == shard_index]
+
+    return list(files)
+
+
+def write_partial(partial_file, hit_store, files):
+    """
+    Writes the mergeable result of a shard: the hit store as label and code arrays
+    and the names of all files of the shard, also the ones without hits
+
+    :param partial_file: Path, npz
+    :param hit_store: HitStore
+    :param files: list: Path, indexed files of the shard
+    """
+    partial_file = Path(partial_file)
+    partial_file.parent.mkdir(parents=True, exist_ok=True)
+
+    arrays = hit_store.to_arrays()
+    arrays['index_files'] = np.array([file.name for file in files], dtype=str)
+    arrays['version'] = np.array(PARTIAL_VERSION)
+
+    tmp_file = partial_file.with_name(partial_file.name + '.tmp')
+    with open(tmp_file, 'wb') as handle:  # a file handle, else numpy adds .npz to the tmp name
+        np.savez_compressed(handle, **arrays)
+    tmp_file.replace(partial_file)
+
+
+def read_partial(partial_file):
+    """
+    :param partial_file: Path, written by write_partial
+    :return: tuple: HitStore, list: str names of the files of the shard
+    """
+    with np.load(partial_file, allow_pickle=False) as arrays:
+        if int(arrays['version']) != PARTIAL_VERSION:
+            raise ValueError(f"{partial_file} has partial version {int(arrays['version'])}, "
+                             f"expected {PARTIAL_VERSION}")
+        return HitStore.from_arrays(arrays), [str(name) for name in arrays['index_files']]
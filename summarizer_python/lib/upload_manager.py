@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import json
+import threading
+import time
+
+MANIFEST_WRITE_INTERVAL = 10  # seconds
+
+
+class UploadManager():
+    """
+    Uploads reads to a Galaxy data library once and links them into histories.
+
+    Files are identified by the sha256 of their content. A local manifest keeps the hash of every
+    file (so unchanged files are not hashed again) and the library dataset of every hash.
+    Library datasets are named <sha256>_<file name>, so an existing copy is also found when
+    the manifest is lost.
+
+    :param galaxy_api: GalaxyApi, its instance and rate limit are used
+    :param manifest_file: Path, json manifest, created when missing
+    :param library_name: str, data library the reads are stored in, created when missing
+    :param max_workers: int, number of files hashed and uploaded at the same time
+    """
+
+    def __init__(self, galaxy_api, manifest_file: Path, library_name: str = 'BenchAMRking reads',
+                 max_workers: int = 4) -> None:
+        self._galaxy_api = galaxy_api
+        self._manifest_file = Path(manifest_file)
+        self._library_name = library_name
+
+        self._hash_executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._upload_executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = {}  # sha256: future of the library dataset id
+
+        self._library_id = None
+        self._library_datasets = None  # name: library dataset id
+
+        self._manifest_written = time.monotonic()
+        self._manifest = {'files': {}, 'uploads': {}}
+        if self._manifest_file.exists():
+            with open(self._manifest_file) as fp:
+                self._manifest = json.load(fp)
+
+    def add_to_history(self, history_id: str, sample_paths: list[Path]) -> list[str]:
+        """
+        Makes the files available in the history, only files not in the library yet are uploaded
+
+        :param history_id: str
+        :param sample_paths: list: Path
+        :return: list: str, dataset ids in the history, in the order of sample_paths
+        """
+        sample_paths = [Path(sample_path) for sample_path in sample_paths]
+        hashes = list(self._hash_executor.map(self._hash_file, sample_paths))
+
+        futures = [self._library_dataset_id(sha256, sample_path) for sha256, sample_path in zip(hashes, sample_paths)]
+
+        dataset_ids = []
+        for future in futures:
+            result = self._galaxy_api.call(self._galaxy_api.galaxy_instance.histories.upload_dataset_from_library,
+                                           history_id=history_id,
+                                           lib_dataset_id=future.result())
+            dataset_ids.append(result['id'])
+
+        return dataset_ids
+
+    def close(self):
+        self._hash_executor.shutdown()
+        self._upload_executor.shutdown()
+        with self._lock:
+            self._write_manifest(force=True)
+
+    def _library_dataset_id(self, sha256: str, sample_path: Path):
+        """
+        Retrieves the library dataset of a file, uploads it when there is none.
+        The same content requested by several threads is only uploaded once,
+        a failed upload is forgotten so the next request uploads it again
+
+        :param sha256: str, hash of the file content
+        :param sample_path: Path
+        :return: future of the library dataset id
+        """
+        with self._lock:
+            future = self._in_flight.get(sha256)
+            if future is not None:
+                return future
+            future = self._upload_executor.submit(self._find_or_upload, sha256, sample_path)
+            self._in_flight[sha256] = future
+
+        # outside the lock, the callback runs right away when the upload already finished
+        future.add_done_callback(lambda done: self._forget_failed(sha256, done))
+        return future
+
+    def _forget_failed(self, sha256: str, future):
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if self._in_flight.get(sha256) is future:
+                    del self._in_flight[sha256]
+
+    def _find_or_upload(self, sha256: str, sample_path: Path) -> str:
+        library_datasets = self._get_library_datasets()
+        name = f"{sha256}_{sample_path.name}"
+
+        upload = self._manifest['uploads'].get(sha256)
+        if upload is not None and upload['library_dataset_id'] in library_datasets.values():
+            return upload['library_dataset_id']
+
+        if name in library_datasets:  # uploaded before, but not in this manifest
+            library_dataset_id = library_datasets[name]
+        else:
+            galaxy_instance = self._galaxy_api.galaxy_instance
+            result = self._galaxy_api.call(galaxy_instance.libraries.upload_file_from_local_path,
+                                           library_id=self._library_id,
+                                           file_local_path=str(sample_path))
+            library_dataset_id = result[0]['id']
+            self._galaxy_api.call(galaxy_instance.libraries.update_library_dataset,
+                                  dataset_id=library_dataset_id,
+                                  name=name)
+
+        with self._lock:
+            library_datasets[name] = library_dataset_id
+            self._manifest['uploads'][sha256] = {'library_dataset_id': library_dataset_id, 'name': name}
+            self._write_manifest()
+
+        return library_dataset_id
+
+    def _get_library_datasets(self) -> dict:
+        """
+        Finds or creates the library and lists its datasets, once
+
+        :return: dict: name: library dataset id
+        """
+        with self._lock:
+            if self._library_datasets is not None:
+                return self._library_datasets
+
+            libraries = self._galaxy_api.galaxy_instance.libraries
+            found = self._galaxy_api.call(libraries.get_libraries, name=self._library_name)
+            if found:
+                self._library_id = found[0]['id']
+            else:
+                self._library_id = self._galaxy_api.call(libraries.create_library, name=self._library_name)['id']
+
+            contents = self._galaxy_api.call(libraries.show_library, library_id=self._library_id, contents=True)
+            self._library_datasets = {item['name'].lstrip('/'): item['id']
+                                      for item in contents if item['type'] == 'file'}
+
+            return self._library_datasets
+
+    def _hash_file(self, sample_path: Path) -> str:
+        """
+        Hashes the file content, unchanged files (same size and mtime) reuse the hash of the manifest
+
+        :param sample_path: Path
+        :return: str, sha256 hex digest
+        """
+        stat = sample_path.stat()
+        key = str(sample_path.resolve())
+
+        known = self._manifest['files'].get(key)
+        if known is not None and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+
+        sha256 = hashlib.sha256()
+        with open(sample_path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(8 * 1024 * 1024), b''):
+                sha256.update(chunk)
+
+        with self._lock:
+            self._manifest['files'][key] = {'size': stat.st_size,
+                                            'mtime_ns': stat.st_mtime_ns,
+                                            'sha256': sha256.hexdigest()}
+            self._write_manifest()
+
+        return sha256.hexdigest()
+
+    def _write_manifest(self, force: bool = False):
+        """
+        Writes the manifest, through a temporary file so a crash never leaves half a manifest.
+        Without force at most every MANIFEST_WRITE_INTERVAL seconds, uploads missing after a crash
+        are found again by their name in the library. Called with the lock held
+        """
+        if not force and time.monotonic() - self._manifest_written < MANIFEST_WRITE_INTERVAL:
+            return
+
+        self._manifest_written = time.monotonic()
+        self._manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = self._manifest_file.with_suffix('.tmp')
+        with open(temporary_file, 'w') as fp:
+            json.dump(self._manifest, fp, indent=1)
+        temporary_file.replace(self._manifest_file)
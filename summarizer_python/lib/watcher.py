@@ -0,0 +1,112 @@
+import os
+import time
+from pathlib import Path
+
+
+def snapshot_files(directory):
+    """
+    The size and modification time of all files below the directory, in one os.scandir pass
+
+    :param directory: Path
+    :return: dict: Path: tuple: size, mtime_ns
+    """
+    files = {}
+    directories = [str(directory)]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+
+    return files
+
+
+class DirectoryWatcher():
+    """
+    Polls a directory for new, changed and removed files.
+    A new or changed file is only reported once its size and modification time stayed the same for a poll,
+    so a result that is still being downloaded is not read half written
+
+    :param directory: Path
+    :param known: dict: Path: tuple: size, mtime_ns, files already read, eg by the first summary.
+                  None takes them from a snapshot now
+    """
+
+    def __init__(self, directory: Path, known: dict = None) -> None:
+        self.directory = Path(directory)
+        self._known = snapshot_files(self.directory) if known is None else dict(known)  # files reported so far
+        self._settling = {}  # path: (size, mtime_ns) of changed files seen once
+
+    def poll(self) -> tuple[list[Path], list[Path]]:
+        """
+        :return: tuple: list: Path new or changed files, list: Path removed files, both sorted
+        """
+        current = snapshot_files(self.directory)
+
+        changed = []
+        settling = {}
+        for path, key in current.items():
+            if self._known.get(path) == key:
+                continue
+            if self._settling.get(path) == key:
+                changed.append(path)
+                self._known[path] = key
+            else:
+                settling[path] = key
+        self._settling = settling
+
+        removed = [path for path in self._known if path not in current]
+        for path in removed:
+            del self._known[path]
+
+        return sorted(changed), sorted(removed)
+
+
+def watch(organiser, publish, interval: float = 2, debounce: float = 5, max_delay: float = 60,
+          stop=None, sleep=time.sleep, snapshot=None):
+    """
+    Keeps the organiser up to date with the files landing in its sample directory.
+    Every poll the changed files are parsed into the hit store right away, publish (clustering and export)
+    runs once no file changed for debounce seconds or max_delay seconds after the first unpublished change.
+    Files the organiser did not index, eg landed during the first summary, are reported as new
+
+    :param organiser: SampleOrganiser
+    :param publish: function called with the organiser to build and write the comparisons
+    :param interval: float, seconds between polls
+    :param debounce: float, quiet seconds before publishing
+    :param max_delay: float, longest seconds a change waits to be published while files keep arriving
+    :param stop: function returning True to end the watch, None watches until interrupted
+    :param sleep: function used to wait, replaceable for tests
+    :param snapshot: dict, snapshot_files of the sample directory taken before the organiser indexed it,
+                     so a file changed since is read again, None takes it when the watch starts
+    """
+    if snapshot is None:
+        snapshot = snapshot_files(organiser.sample_dir)
+    indexed = set(organiser.samples)
+    watcher = DirectoryWatcher(organiser.sample_dir,
+                               known={path: key for path, key in snapshot.items() if path in indexed})
+    first_change = last_change = None
+
+    while stop is None or not stop():
+        changed, removed = watcher.poll()
+        now = time.monotonic()
+
+        if changed or removed:
+            print(f"{len(changed)} new or changed, {len(removed)} removed files")
+            failed = organiser.update(changed, removed)  # a file that failed is read again when it changes
+            if failed:
+                print(f"{len(failed)} files could not be parsed")
+            last_change = now
+            first_change = now if first_change is None else first_change
+
+        if first_change is not None and (now - last_change >= debounce or now - first_change >= max_delay):
+            try:
+                publish(organiser)
+            except (OSError, ValueError) as error:  # published again at the next change
+                print(f"publish failed: {error}")
+            first_change = last_change = None
+
+        sleep(interval)
@@ -0,0 +1,67 @@
+"""
+Queries the hit database sample_summarizer.py writes (HIT_DATABASE in OUTPUT_DIR), without parsing the files again.
+
+run from the summarizer_python directory:
+    python query_hits.py --only-in WF2_AMR --cutoff 90
+    python query_hits.py --identity-distribution
+    python query_hits.py "SELECT workflow, COUNT(DISTINCT gene) FROM hit_view GROUP BY workflow"
+
+the tables are samples, workflows, files, genes and hits, hit_view joins them into one row per hit with
+file_name, sample_name, sample_type, workflow, subtype, gene and identity
+"""
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from defines import OUTPUT_DIR, HIT_DATABASE, HIT_DATABASE_ENGINE
+from lib.hit_database import HitDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="queries the parsed AMR hits")
+    parser.add_argument('sql', nargs='?', help="query on the tables or hit_view")
+    parser.add_argument('--database', type=Path, default=None, help="database file, defaults to HIT_DATABASE")
+    parser.add_argument('--engine', default=HIT_DATABASE_ENGINE, help="sqlite or duckdb")
+    parser.add_argument('--build', action='store_true', help="parses DATA_DIR into the database first")
+    parser.add_argument('--only-in', metavar='SAMPLE_TYPE', help="genes only this workflow type found")
+    parser.add_argument('--identity-distribution', action='store_true', help="hits per workflow type and identity")
+    parser.add_argument('--prevalence', action='store_true', help="samples per gene and workflow type")
+    parser.add_argument('--cutoff', type=float, default=0, help="identity a hit is found at")
+    parser.add_argument('--bin-width', type=float, default=5, help="identity bin width of the distribution")
+    parser.add_argument('--output', type=Path, default=None, help="writes the result to this csv")
+    args = parser.parse_args()
+
+    database_file = args.database or Path(OUTPUT_DIR) / HIT_DATABASE
+
+    if args.build:
+        from lib.sample_organiser import SampleOrganiser  # only parsing needs the organiser
+        samples = SampleOrganiser()
+        samples.write_hit_database(database_file, engine=args.engine)
+        samples.save_cache()
+    elif not database_file.exists():
+        parser.error(f"{database_file} does not exist, run sample_summarizer.py or use --build")
+
+    database = HitDatabase(database_file, engine=args.engine)
+    if args.only_in:
+        result = database.genes_only_in(args.only_in, cutoff=args.cutoff)
+    elif args.identity_distribution:
+        result = database.identity_distribution(bin_width=args.bin_width)
+    elif args.prevalence:
+        result = database.gene_prevalence(cutoff=args.cutoff)
+    elif args.sql:
+        result = database.query(args.sql)
+    else:
+        result = database.query("SELECT workflow, subtype, COUNT(*) AS hits, COUNT(DISTINCT gene) AS genes "
+                                "FROM hit_view GROUP BY workflow, subtype ORDER BY workflow, subtype")
+    database.close()
+
+    if args.output is not None:
+        result.to_csv(args.output, index=False)
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', None):
+            print(result.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
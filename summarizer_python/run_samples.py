@@ -1,12 +1,13 @@
 from pathlib import Path
 from lib.galaxy_api_client import GalaxyApi
+from lib.orchestrator import Orchestrator
 import os
 
 
 def organise_illumina_samples(samples:list[str]) -> dict:
 
     samples_organized = {}
-    for sample in samples:
+    for sample in sorted(samples):  # sorted, so the forward read comes before the reverse read
         tmp = sample.rsplit('_', 1)
         if tmp[0] not in samples_organized.keys():
             samples_organized[tmp[0]] = []
@@ -20,19 +21,44 @@ if __name__ == '__main__':
     apikey = 'GET YOUR APIKEY HERE'
     galaxy_server = 'https://galaxy.sciensano.be'
     path_samples_directory = Path('PATH/TO/DATA')
+    max_concurrent_samples = 8  # samples submitted at the same time
+    max_requests_per_second = 10  # requests to the galaxy server, over all samples
+    upload_manifest = Path('galaxy_uploads.json')  # reads in this manifest are not uploaded again, None disables
+    max_concurrent_uploads = 4
+    min_poll_interval = 5  # seconds between job status polls, grows up to max_poll_interval while nothing changes
+    max_poll_interval = 120
+    result_directory = Path('PATH/TO/RESULTS')  # the DATA_DIR of the summarizer
+    workflow_name = 'WF1'  # workflow part of the result file names
+    run_manifest = Path('galaxy_run.sqlite')  # rerunning with the same manifest resumes the run
+    max_concurrent_downloads = 4
+    cohort_name = None  # eg 'cohort_1': submits all samples as one list:paired collection in one history
 
     organized_samples = organise_illumina_samples(os.listdir(path_samples_directory))
 
     galaxy_instance = GalaxyApi(url=galaxy_server,
-                                api_key=apikey)
+                                api_key=apikey,
+                                max_requests_per_second=max_requests_per_second,
+                                upload_manifest=upload_manifest,
+                                max_concurrent_uploads=max_concurrent_uploads)
 
+    samples = {}
     for sample_name, sample_list in organized_samples.items():
-        sample_paths = []
+        samples[sample_name] = [path_samples_directory / sample for sample in sample_list]
 
-        for sample in sample_list:
-            sample_paths.append(path_samples_directory / sample)
+    orchestrator = Orchestrator(galaxy_api=galaxy_instance,
+                                manifest_file=run_manifest,
+                                data_dir=result_directory,
+                                workflow=workflow_name,
+                                max_workers=max_concurrent_samples,
+                                download_workers=max_concurrent_downloads)
 
-        galaxy_instance.run_sample(sample_name=sample_name,
-                                   sample_paths=sample_paths)
+    states = orchestrator.run(samples=samples,
+                              min_interval=min_poll_interval,
+                              max_interval=max_poll_interval,
+                              on_sample_done=lambda sample_name, state: print(f"{sample_name}: {state}"),
+                              cohort_name=cohort_name)
+    orchestrator.close()
+    galaxy_instance.close()
 
-        exit()
\ No newline at end of file
+    failed = [sample_name for sample_name, state in states.items() if state != 'done']
+    print(f"{len(states) - len(failed)} samples done, {len(failed)} not done: {', '.join(failed)}")
@@ -1,29 +1,85 @@
 from lib.sample_organiser import SampleOrganiser
-import pandas as pd
-from pathlib import Path
+from lib.exporters import export_views
+from lib.watcher import snapshot_files, watch
 from defines import *
 
 
-if __name__ == '__main__':
-
-    # organises files and samples
-    samples = SampleOrganiser()
+def summarize(samples):
+    """
+    Builds and writes the overview, comparisons, concordance and hit database
 
+    :param samples: SampleOrganiser
+    """
     # writes out sample overview to see if any are missing or wrongly typed/ named
     samples.write_out_sample_overview()
 
-    file_name = Path.joinpath(OUTPUT_DIR / Path('comparison_all.xlsx'))
+    write_comparisons(samples)
+
+    # all hits for ad hoc questions, see query_hits.py
+    if HIT_DATABASE is not None:
+        samples.write_hit_database(samples.output_dir / HIT_DATABASE, engine=HIT_DATABASE_ENGINE)
+
+    # stores the parsed files, a next run only parses new or changed files
+    samples.save_cache()
+
+    # time and memory per stage, see run_report.json in the output directory
+    samples.write_report()
+
+
+def write_comparisons(samples, export_formats=EXPORT_FORMATS):
+    """
+    Builds the comparisons and the concordance and writes them in the export formats
 
-    if file_name.exists():
-        file_name.unlink()  # deletes file if it exists
+    :param samples: SampleOrganiser
+    :param export_formats: list: str, see EXPORT_FORMATS in defines.py
+    """
+    comparisons = {
+        "all": samples.build_comparison(cluster=True, binary=False, typing=True, corr=False,
+                                        remove_front_parahentis=False),
+        "all_binary": samples.build_comparison(cluster=True, binary=True, typing=True, corr=False,
+                                               remove_front_parahentis=False),
+    }
 
-    with pd.ExcelWriter(file_name) as excel_engine:
-        samples.create_comparison(excel_writer=excel_engine,
-                                  sheet_name=f"all",
-                                  cluster=True, binary=False, typing=True, corr=False, remove_front_parahentis=False)
+    # binary comparison for every identity cutoff
+    comparisons.update(samples.build_cutoff_sweep(cutoffs=IDENTITY_CUTOFFS,
+                                                  cluster=True, typing=True, remove_front_parahentis=False))
+    print(comparisons["binary_summary"])
 
-        samples.create_comparison(excel_writer=excel_engine,
-                                  sheet_name=f"all_binary",
-                                  cluster=True, binary=True, typing=True, corr=False, remove_front_parahentis=False)
+    # binary comparison per workflow type or subtype, all from one matrix
+    if COMPARISON_VIEWS_BY is not None:
+        comparisons.update(samples.build_views(samples.view_selections(by=COMPARISON_VIEWS_BY),
+                                               binary=True, cluster=True, typing=True, remove_front_parahentis=False))
 
+    # csv / parquet for the R scripts, Excel is an optional last step
+    for export_format in export_formats:
+        with samples.report.stage(f"export_{export_format}"):
+            export_views(comparisons, output_dir=samples.output_dir, name="comparison", fmt=export_format,
+                         workers=EXPORT_WORKERS)
+
+    # -1/0/1 agreement between the workflows per gene, concordance_figure4.csv is the input of Figure4_script.py
+    concordance = samples.build_concordance(reference=CONCORDANCE_REFERENCE,
+                                            merge_subtypes=CONCORDANCE_MERGE_SUBTYPES,
+                                            remove_front_parahentis=False)
+    for export_format in export_formats:
+        with samples.report.stage(f"export_{export_format}"):
+            export_views(concordance, output_dir=samples.output_dir, name="concordance", fmt=export_format,
+                         workers=EXPORT_WORKERS)
+    concordance["figure4"].to_csv(samples.output_dir / "concordance_figure4.csv", index=False)
+
+
+if __name__ == '__main__':
+
+    # taken before indexing, so the watch reads the files that change during the first summary
+    snapshot = snapshot_files(DATA_DIR) if WATCH_DATA_DIR else None
+
+    # organises files and samples
+    samples = SampleOrganiser()
+    summarize(samples)
 
+    # keeps the outputs up to date with the results landing in DATA_DIR, until interrupted
+    if WATCH_DATA_DIR:
+        try:
+            watch(samples, publish=summarize, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE,
+                  max_delay=WATCH_MAX_DELAY, snapshot=snapshot)
+        except KeyboardInterrupt:
+            samples.save_cache()
@@ -0,0 +1,69 @@
+"""
+Splits the summary of a large DATA_DIR over several machines.
+
+every node indexes and parses its own shard of the samples into a partial, run from the summarizer_python directory:
+    python summarize_shards.py shard --index 0 --count 4 --partial partials/shard_0.npz
+    python summarize_shards.py shard --prefix SRX10 SRX11 --partial partials/srx10.npz
+    python summarize_shards.py shard --files shard_files.txt --partial partials/listed.npz
+
+one node merges the partials into the outputs sample_summarizer.py writes, without the result files:
+    python summarize_shards.py merge partials/*.npz
+
+nodes sharing a file system should each pass their own --output-dir, it holds the parse cache of the shard
+"""
+import argparse
+from pathlib import Path
+
+from defines import DATA_DIR, OUTPUT_DIR, DISK_CACHE
+from lib.sample_index import scan_files
+from lib.sample_organiser import SampleOrganiser
+from lib.sharding import select_shard
+from sample_summarizer import summarize
+
+
+def shard(args):
+    data_dir = Path(args.data_dir)
+    file_list = None
+    if args.files is not None:
+        file_list = args.files.read_text().split()
+
+    files = select_shard(scan_files(data_dir), prefixes=args.prefix, file_list=file_list,
+                         shard_index=args.index, shard_count=args.count)
+    print(f"{len(files)} files in the shard")
+
+    samples = SampleOrganiser(data_dir=data_dir, output_dir=args.output_dir, disk_cache=DISK_CACHE, files=files)
+    samples.save_partial(args.partial)
+    samples.save_cache()
+
+
+def merge(args):
+    samples = SampleOrganiser.from_partials(args.partials, output_dir=args.output_dir)
+    summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="summarizes the samples in shards and merges the shards")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    shard_parser = subparsers.add_parser('shard', help="parses one shard of the samples into a partial")
+    shard_parser.add_argument('--partial', type=Path, required=True, help="npz the partial is written to")
+    shard_parser.add_argument('--data-dir', default=DATA_DIR, help="defaults to DATA_DIR")
+    shard_parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help="parse cache, defaults to OUTPUT_DIR")
+    selection = shard_parser.add_mutually_exclusive_group()
+    selection.add_argument('--prefix', nargs='+', help="samples starting with one of these")
+    selection.add_argument('--files', type=Path, help="text file with the file names of the shard")
+    selection.add_argument('--count', type=int, help="number of shards the samples are hashed over")
+    shard_parser.add_argument('--index', type=int, default=0, help="shard of --count, from 0")
+    shard_parser.set_defaults(function=shard)
+
+    merge_parser = subparsers.add_parser('merge', help="writes the outputs of all partials")
+    merge_parser.add_argument('partials', type=Path, nargs='+', help="npz files of the shards")
+    merge_parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help="defaults to OUTPUT_DIR")
+    merge_parser.set_defaults(function=merge)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the tests import lib and defines the way the scripts do, from the summarizer_python directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic_data import generate_dataset  # noqa: E402
+
+
+def write_result(directory, file_name, rows, header=("Locus", "% Identity", "% Coverage")):
+    """
+    Writes a tab separated result file, rows are tuples in the order of the header
+
+    :return: Path
+    """
+    path = Path(directory) / file_name
+    path.write_text("".join("\t".join(map(str, row)) + "\n" for row in [header, *rows]))
+    return path
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """
+    A small data set of every result format
+    """
+    directory = tmp_path / "data"
+    generate_dataset(directory, n_samples=8, n_genes=40, hit_density=0.15, seed=1)
+    return directory
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from conftest import write_result
+from lib.result_parser import extract_genes_from_file
+from lib.sample_organiser import SampleOrganiser
+
+
+def baseline_comparison(organiser):
+    """
+    The identity comparison the way the summarizer built it before the hit store:
+    a gene: file: identity dict of every file, without the '-' placeholder
+    """
+    data = {}
+    for files in organiser.organised_samples.values():
+        for path in files.values():
+            if path is None:
+                continue
+            genes = extract_genes_from_file(path, quality_passed=organiser._quality_passed,
+                                            quality_failed=organiser._quality_failed)
+            for gene, identity in genes.items():
+                data.setdefault(gene, {})[path.name] = identity
+    data.pop('-', None)
+
+    return pd.DataFrame.from_dict(data).transpose().fillna(0)
+
+
+@pytest.fixture
+def organiser(data_dir, tmp_path):
+    # a file without hits, only the '-' placeholder
+    write_result(data_dir, "SRX1000000_SRR2000000_WF1_resfinder.tsv", [("-", "", "")])
+    return SampleOrganiser(data_dir=data_dir, output_dir=tmp_path / "out", disk_cache=False)
+
+
+def test_comparison_equals_baseline(organiser):
+    comparison = organiser.build_comparison(binary=False, cluster=False, typing=False,
+                                            remove_front_parahentis=False)
+
+    expected = baseline_comparison(organiser)
+    pd.testing.assert_frame_equal(comparison.sort_index().sort_index(axis=1),
+                                  expected.sort_index().sort_index(axis=1), check_dtype=False)
+
+
+def test_file_with_only_placeholder_is_left_out(organiser):
+    comparison = organiser.build_comparison(cluster=False, typing=False)
+
+    assert "SRX1000000_SRR2000000_WF1_resfinder.tsv" not in comparison.columns
+    assert "-" not in comparison.index
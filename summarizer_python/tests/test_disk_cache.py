@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import lib.disk_cache
+from conftest import write_result
+from lib.disk_cache import DiskCache
+
+SETTINGS = {'identity_cutoff': 80, 'quality_passed': 95, 'quality_failed': 50}
+GENES = {"blaTEM-1": 99.5, "blaNAN-1": float('nan')}
+
+
+@pytest.fixture
+def result_file(tmp_path):
+    return write_result(tmp_path, "SRX1000000_SRR2000000_WF1_resfinder.tsv", [("blaTEM-1", "99.5", "100")])
+
+
+def saved_cache(cache_dir, file, settings=SETTINGS):
+    cache = DiskCache(cache_dir=cache_dir, settings=settings)
+    cache.put(file, GENES)
+    cache.save()
+    return cache
+
+
+def test_unchanged_file_is_read_back(tmp_path, result_file):
+    saved_cache(tmp_path / "cache", result_file)
+
+    genes = DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).get(result_file)
+    assert genes.keys() == GENES.keys()
+    assert genes["blaTEM-1"] == 99.5
+
+
+def test_file_without_genes_is_read_back(tmp_path):
+    empty = write_result(tmp_path, "empty.tsv", [])
+    cache = DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS)
+    cache.put(empty, {})
+    cache.save()
+
+    assert DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).get(empty) == {}
+
+
+def test_changed_size_invalidates(tmp_path, result_file):
+    saved_cache(tmp_path / "cache", result_file)
+    stat = result_file.stat()
+    result_file.write_text(result_file.read_text() + "blaOXA-48\t98\t100\n")
+    os.utime(result_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # only the size differs
+
+    assert DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).get(result_file) is None
+
+
+def test_changed_mtime_invalidates(tmp_path, result_file):
+    saved_cache(tmp_path / "cache", result_file)
+    stat = result_file.stat()
+    os.utime(result_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).get(result_file) is None
+
+
+def test_changed_content_invalidates_when_hashing(tmp_path, result_file):
+    cache = DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS, hash_content=True)
+    cache.put(result_file, GENES)
+    stat = result_file.stat()
+    result_file.write_text(result_file.read_text().replace("99.5", "98.5"))
+    os.utime(result_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # same size and mtime
+
+    assert cache.get(result_file) is None
+
+
+def test_changed_settings_invalidate(tmp_path, result_file):
+    saved_cache(tmp_path / "cache", result_file)
+
+    cache = DiskCache(cache_dir=tmp_path / "cache", settings={**SETTINGS, 'identity_cutoff': 90})
+    assert cache.get(result_file) is None
+
+
+def test_changed_parser_version_invalidates(tmp_path, result_file, monkeypatch):
+    saved_cache(tmp_path / "cache", result_file)
+    monkeypatch.setattr(lib.disk_cache, "PARSER_VERSION", lib.disk_cache.PARSER_VERSION + 1)
+
+    assert DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).get(result_file) is None
+
+
+def test_removed_file_is_dropped_on_save(tmp_path, result_file):
+    saved_cache(tmp_path / "cache", result_file)
+    result_file.unlink()
+    DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS).save()
+
+    assert DiskCache(cache_dir=tmp_path / "cache", settings=SETTINGS)._entries == {}
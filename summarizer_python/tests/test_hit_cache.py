@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from lib.hit_cache import HitCache
+from lib.sample_organiser import SampleOrganiser
+
+
+def test_least_recently_used_file_is_evicted():
+    cache = HitCache(max_entries=2)
+    cache.put(Path("a"), {"blaTEM-1": 99.0})
+    cache.put(Path("b"), {})
+    cache.get(Path("a"))
+    cache.put(Path("c"), {})
+
+    assert Path("a") in cache and Path("c") in cache
+    assert Path("b") not in cache
+    assert cache.get(Path("b")) is None
+    assert len(cache) == 2
+
+
+def test_discard_and_clear():
+    cache = HitCache(max_entries=2)
+    cache.put(Path("a"), {})
+    cache.put(Path("b"), {})
+
+    cache.discard(Path("a"))
+    cache.discard(Path("missing"))
+    assert list(cache._hits) == [Path("b")]
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_needs_an_entry():
+    with pytest.raises(ValueError):
+        HitCache(max_entries=0)
+
+
+def test_cleared_once_the_hit_store_is_built(data_dir, tmp_path):
+    organiser = SampleOrganiser(data_dir=data_dir, output_dir=tmp_path / "out", disk_cache=True)
+    expected = organiser.build_comparison(cluster=False)
+    assert len(organiser._hit_cache) == 0
+
+    # a changed file is parsed again, the others come from the disk cache
+    changed = sorted(organiser.samples)[0]
+    changed.write_text(changed.read_text())
+    organiser.update(changed_files=[changed])
+    assert len(organiser._hit_cache) == 0
+
+    organiser._hit_store = None
+    assert organiser.build_comparison(cluster=False).equals(expected)
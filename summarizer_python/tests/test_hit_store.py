@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from lib.hit_store import HitStore
+
+FILES = [
+    ("a_WF1.tsv", "a", "WF1_resfinder", {"blaTEM-1": 99.0, "-": 0.0}),
+    ("b_WF1.tsv", "b", "WF1_resfinder", {"blaOXA-48": 95.0, "blaTEM-1": float('nan')}),
+    ("a_WF2.tsv", "a", "WF2_AMR", {"blaKPC-2": 100.0}),
+    ("c_WF2.tsv", "c", "WF2_AMR", {}),
+    ("b_WF2.tsv", "b", "WF2_AMR", {"blaKPC-2": 98.0, "blaCTX-M-15": 97.0}),
+]
+
+
+def store_of(files):
+    hit_store = HitStore()
+    for file in files:
+        hit_store.add_file(*file)
+    return hit_store
+
+
+def assert_stores_equal(hit_store, expected):
+    arrays, expected_arrays = hit_store.to_arrays(), expected.to_arrays()
+    assert arrays.keys() == expected_arrays.keys()
+    for name in expected_arrays:
+        np.testing.assert_array_equal(arrays[name], expected_arrays[name], err_msg=name)
+
+
+def test_merge_equals_single_store():
+    shards = [store_of(FILES[::2]), store_of(FILES[1::2])]
+    file_order = [file_name for file_name, *_ in FILES]
+
+    assert_stores_equal(HitStore.merge(shards, file_order), store_of(FILES))
+
+
+def test_merge_of_partials_equals_single_store():
+    shards = [HitStore.from_arrays(store_of(files).to_arrays()) for files in (FILES[:3], FILES[3:])]
+    file_order = [file_name for file_name, *_ in reversed(FILES)]
+
+    assert_stores_equal(HitStore.merge(shards, file_order), store_of(FILES[::-1]))
+
+
+def test_merge_leaves_out_files_not_in_the_order():
+    shards = [store_of(FILES[:2]), store_of(FILES[2:])]
+
+    assert_stores_equal(HitStore.merge(shards, ["b_WF2.tsv", "a_WF1.tsv"]), store_of([FILES[4], FILES[0]]))
+
+
+def test_merge_refuses_a_file_in_two_stores():
+    with pytest.raises(ValueError):
+        HitStore.merge([store_of(FILES[:2]), store_of(FILES[1:3])], [file_name for file_name, *_ in FILES[:3]])
+
+
+def test_merge_refuses_duplicate_order():
+    with pytest.raises(ValueError):
+        HitStore.merge([store_of(FILES)], ["a_WF1.tsv", "a_WF1.tsv"])
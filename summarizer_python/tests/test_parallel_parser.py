@@ -0,0 +1,21 @@
+from lib.parallel_parser import parse_files
+from lib.result_parser import extract_genes_from_file
+from lib.sample_index import scan_files
+
+
+def test_pool_equals_serial_parse(data_dir):
+    files = scan_files(data_dir)
+    assert len(files) > 4
+
+    parsed = parse_files(files, quality_passed=95, quality_failed=50, workers=2, chunksize=2)
+
+    assert parsed == [extract_genes_from_file(file, quality_passed=95, quality_failed=50) for file in files]
+
+
+def test_pool_keeps_file_order_with_times(data_dir):
+    files = scan_files(data_dir)[::-1]
+
+    parsed = parse_files(files, quality_passed=95, quality_failed=50, workers=3, chunksize=1, with_times=True)
+
+    assert [genes for genes, _ in parsed] == parse_files(files, quality_passed=95, quality_failed=50, workers=1)
+    assert all(seconds >= 0 for _, seconds in parsed)
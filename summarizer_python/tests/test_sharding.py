@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+import lib.sample_organiser
+from conftest import write_result
+from lib.gene_names import GeneNormaliser
+from lib.hit_store import HitStore
+from lib.sample_index import scan_files
+from lib.sample_organiser import SampleOrganiser
+from lib.sharding import select_shard
+
+# (Bla)blaOXA-48_1_2 normalises to blaOXA-48_1, normalising that again would give blaOXA-48
+NORMALISED_FILES = {
+    "SRX9000000_SRR9000000_WF1_resfinder.tsv": [("blaKPC-2_1", "99.0", "100"), ("(Bla)blaOXA-48_1_2", "98.0", "100")],
+    "SRX9000001_SRR9000001_WF1_resfinder.tsv": [("(Bla)blaKPC-2", "97.0", "100"), ("blaOXA-48", "90.0", "100")],
+    "SRX1000000_SRR2000000_WF1_resfinder.tsv": [("blaOXA-48_1", "95.0", "100"), ("blaOXA-48", "91.0", "100")],
+}
+
+
+@pytest.fixture
+def normalised_data_dir(data_dir, monkeypatch):
+    for file_name, rows in NORMALISED_FILES.items():
+        write_result(data_dir, file_name, rows)
+    monkeypatch.setattr(lib.sample_organiser, "NORMALISE_GENE_NAMES", True)
+    return data_dir
+
+
+def comparison(organiser):
+    df = organiser.build_comparison(binary=False, cluster=False, typing=False, remove_front_parahentis=False)
+    return df.sort_index().sort_index(axis=1)
+
+
+def test_merged_shards_equal_single_node(normalised_data_dir, tmp_path):
+    files = scan_files(normalised_data_dir)
+    shard_files = select_shard(files, prefixes=["SRX9"])
+    shards = [shard_files, [file for file in files if file not in shard_files]]
+
+    partial_files = []
+    for shard_index, files_of_shard in enumerate(shards):
+        shard = SampleOrganiser(data_dir=normalised_data_dir, output_dir=tmp_path / f"shard_{shard_index}",
+                                disk_cache=False, files=files_of_shard)
+        partial_files.append(tmp_path / f"shard_{shard_index}.npz")
+        shard.save_partial(partial_files[-1])
+
+    merged = SampleOrganiser.from_partials(partial_files, output_dir=tmp_path / "merged")
+    single = SampleOrganiser(data_dir=normalised_data_dir, output_dir=tmp_path / "single", disk_cache=False)
+
+    expected = comparison(single)
+    assert {"blaKPC-2", "blaOXA-48_1", "blaOXA-48"} <= set(expected.index)
+    pd.testing.assert_frame_equal(comparison(merged), expected)
+
+
+def test_normalise_genes_twice_keeps_canonical_names():
+    hit_store = HitStore()
+    hit_store.add_file("a.tsv", "a", "WF1_resfinder", {"(Bla)blaOXA-48_1_2": 98.0})
+    normaliser = GeneNormaliser()
+
+    hit_store.normalise_genes(normaliser)
+    hit_store.add_file("b.tsv", "b", "WF1_resfinder", {"blaOXA-48": 90.0})
+    hit_store.normalise_genes(normaliser)
+
+    assert hit_store.genes == ["blaOXA-48", "blaOXA-48_1"]
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from conftest import write_result
+from lib.sample_organiser import SampleOrganiser
+
+
+@pytest.fixture
+def organiser(data_dir, tmp_path):
+    # a hit without identity, in a gene no other file hits
+    write_result(data_dir, "SRX1000000_SRR2000000_WF1_resfinder.tsv",
+                 [("blaTEM-1", "99.5", "100"), ("blaNAN-1", "", "100")])
+    return SampleOrganiser(data_dir=data_dir, output_dir=tmp_path / "out", disk_cache=False)
+
+
+@pytest.mark.parametrize("binary", [True, False])
+@pytest.mark.parametrize("filter_name", [None, "WF1", "SRX1000000"])
+def test_view_equals_comparison(organiser, filter_name, binary):
+    views = organiser.build_views({"view": {"filter_name": filter_name}}, binary=binary, cluster=False)
+
+    expected = organiser.build_comparison(filter_name=filter_name, binary=binary, cluster=False)
+    pd.testing.assert_frame_equal(views["view"], expected)
+
+
+def test_view_keeps_hit_without_identity(organiser):
+    view = organiser.build_views({"view": {"sample_types": ["WF1_resfinder"]}}, binary=False, cluster=False,
+                                 typing=False)["view"]
+
+    assert view.loc["blaNAN-1", "SRX1000000_SRR2000000_WF1_resfinder.tsv"] == 0